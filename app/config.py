@@ -0,0 +1,101 @@
+"""
+Runtime settings read from environment variables.
+
+Values can be set in the shell or in the `.env` file loaded by `app.main`.
+"""
+import os
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Storage
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "knowledge_base")
+# Partitioning into collections: "none" (one collection), "domain" (one per site, files in "local") or "source"
+SHARD_BY = os.getenv("SHARD_BY", "none")
+
+# Chunking: sizes in "chars" or whitespace-delimited "tokens"
+CHUNK_SIZE = _int("CHUNK_SIZE", 1000)
+CHUNK_OVERLAP = _int("CHUNK_OVERLAP", 0)
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")
+
+# Crawling: "lxml" keeps headings as Markdown; "bs4" is the original plain-text extractor
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+# Sitemaps of a sitemap index read at once
+SITEMAP_CONCURRENCY = _int("SITEMAP_CONCURRENCY", 4)
+
+# Near-duplicate filter for crawled chunks (SimHash; distance in bits, at most 3)
+NEAR_DUP_FILTER = _bool("NEAR_DUP_FILTER", False)
+NEAR_DUP_MAX_DISTANCE = _int("NEAR_DUP_MAX_DISTANCE", 3)
+NEAR_DUP_MIN_WORDS = _int("NEAR_DUP_MIN_WORDS", 20)
+
+# Embedding pipeline
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = _int("EMBEDDING_BATCH_SIZE", 128)
+EMBEDDING_WORKERS = _int("EMBEDDING_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+EMBEDDING_EXECUTOR = os.getenv("EMBEDDING_EXECUTOR", "thread")  # "thread" or "process"
+EMBEDDING_MAX_WAIT = _float("EMBEDDING_MAX_WAIT", 0.02)
+
+# Query caches (query embeddings and retrieval results)
+QUERY_CACHE_SIZE = _int("QUERY_CACHE_SIZE", 1024)
+QUERY_CACHE_TTL = _float("QUERY_CACHE_TTL", 300.0)
+
+# Query micro-batching: concurrent searches share one forward pass and one Chroma call
+QUERY_BATCH_SIZE = _int("QUERY_BATCH_SIZE", 32)
+QUERY_BATCH_WAIT = _float("QUERY_BATCH_WAIT", 0.002)
+
+# LLM answers
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+ANSWER_CACHE_SIZE = _int("ANSWER_CACHE_SIZE", 512)
+ANSWER_CACHE_TTL = _float("ANSWER_CACHE_TTL", 3600.0)
+# Retrieved chunks are deduplicated and trimmed to this many (estimated) tokens
+CONTEXT_PACKING = _bool("CONTEXT_PACKING", True)
+CONTEXT_TOKEN_BUDGET = _int("CONTEXT_TOKEN_BUDGET", 1500)
+
+# data/ re-indexing
+INDEX_CONCURRENCY = _int("INDEX_CONCURRENCY", 4)
+
+# Blue/green rebuilds: share of the embedding model a rebuild may use, longest
+# wait for in-flight searches before each batch, and seconds before the old
+# generation is dropped after the switch
+REINDEX_DUTY_CYCLE = _float("REINDEX_DUTY_CYCLE", 0.5)
+REINDEX_MAX_PAUSE = _float("REINDEX_MAX_PAUSE", 1.0)
+REINDEX_GC_DELAY = _float("REINDEX_GC_DELAY", 5.0)
+
+# Background sitemap ingestion jobs
+INGEST_JOB_WORKERS = _int("INGEST_JOB_WORKERS", 2)
+INGEST_JOB_QUEUE_SIZE = _int("INGEST_JOB_QUEUE_SIZE", 16)
+
+# Startup
+WARMUP_ON_STARTUP = _bool("WARMUP_ON_STARTUP", False)
+# Snapshot (scripts/snapshot.py export) loaded at startup when the knowledge base is empty
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+ENABLE_GRADIO = _bool("ENABLE_GRADIO", True)
+
+# Diagnostics: per-request stage timings in a Server-Timing response header
+SERVER_TIMING = _bool("SERVER_TIMING", False)
+
+# Hybrid retrieval: BM25 keyword index fused with vector search
+HYBRID_SEARCH = _bool("HYBRID_SEARCH", True)
+RRF_K = _int("RRF_K", 60)
+
+# Re-ranking and latency budget
+RERANKER = os.getenv("RERANKER", "version")  # "none", "version" or "cross-encoder"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+LATENCY_BUDGET_MS = _float("LATENCY_BUDGET_MS", 300.0)
+MIN_CANDIDATES = _int("MIN_CANDIDATES", 10)
+MAX_CANDIDATES = _int("MAX_CANDIDATES", 50)
+RERANK_SPREAD_MARGIN = _float("RERANK_SPREAD_MARGIN", 0.3)
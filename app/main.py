@@ -1,60 +1,83 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
-import gradio as gr
-import requests
 
 load_dotenv()
 
+from app import config
 from app.routers import rag, ingest
+from app.services.ingestion_service import ingestion_service
+from app.services.jobs import ingestion_jobs
+from app.services.metrics import REGISTRY, ServerTimingMiddleware
+from app.services.rag_service import rag_service
+from app.services.reindexing import reindexer
+from app.services.snapshot import bootstrap_from_snapshot
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models and the Chroma client load lazily; optionally start loading them
+    # in the background so the first request doesn't pay for it.
+    if config.WARMUP_ON_STARTUP:
+        rag_service.start_warmup()
+    # A new replica loads a snapshot instead of re-crawling and re-embedding
+    if config.SNAPSHOT_PATH:
+        try:
+            result = await bootstrap_from_snapshot(rag_service, config.SNAPSHOT_PATH)
+            if result:
+                print(f"Imported {result['imported']} chunks from {config.SNAPSHOT_PATH} in {result['seconds']:.1f}s")
+        except Exception as e:
+            print(f"Error importing snapshot {config.SNAPSHOT_PATH}: {e}")
+    # Resume ingestion jobs interrupted by the last shutdown
+    await ingestion_jobs.start()
+    yield
+    await ingestion_jobs.stop()
+    await reindexer.stop()
+    await ingestion_service.crawler.aclose()
+    rag_service.close()
 
 app = FastAPI(
     title="FastAPI RAG Practice",
     description="A minimal project to learn RAG with FastAPI.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up, whether or not the models are loaded."""
     return {"status": "ok"}
 
-app.include_router(rag.router)
-app.include_router(ingest.router)
-
-# Gradio Chat Interface
-def predict(message, history):
+@app.get("/ready")
+async def readiness_check():
     """
-    Sends the user's message to the RAG API and returns the answer.
+    Readiness: 200 once the Chroma collection and embedding model are loaded.
+    Until then returns 503 and makes sure a background warmup is running.
     """
-    try:
-        response = requests.get("http://127.0.0.1:8001/rag/search", params={"q": message})
-        response.raise_for_status()
-        data = response.json()
-
-        answer = data.get("answer", "No answer found.")
-        results = data.get("results", [])
-
-        # Format sources
-        sources_text = "\n\n**Sources:**\n"
-        for i, res in enumerate(results):
-            score = res.get("score", 0)
-            text = res.get("text", "").strip()
-            # Truncate text if it's too long for display
-            display_text = text[:200] + "..." if len(text) > 200 else text
-            sources_text += f"{i+1}. (Score: {score:.4f}) {display_text}\n"
-
-        return answer + sources_text
-
-    except requests.exceptions.RequestException as e:
-        return f"Error communicating with RAG API: {str(e)}"
-    except Exception as e:
-        return f"An unexpected error occurred: {str(e)}"
-
-# Create the Gradio Chat Interface
-demo = gr.ChatInterface(
-    fn=predict,
-    title="RAG Chatbot",
-    description="Ask questions about your knowledge base.",
-)
+    status = rag_service.readiness()
+    if status["ready"]:
+        return status
+    rag_service.start_warmup()
+    return JSONResponse(status_code=503, content=status)
+
+@app.post("/warmup")
+async def warmup():
+    """Loads the Chroma collection and embedding model now and reports how long it took."""
+    seconds = await rag_service.warmup()
+    return {"status": "ready", "warmup_seconds": seconds}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Stage timings, crawl/chunk/embedding/cache/LLM counters in the Prometheus text format."""
+    return Response(REGISTRY.render(), media_type=REGISTRY.content_type)
+
+if config.SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+
+app.include_router(rag.router)
+app.include_router(ingest.router)
 
-# Mount Gradio app to FastAPI
-app = gr.mount_gradio_app(app, demo, path="/gradio")
+if config.ENABLE_GRADIO:
+    from app.ui import mount_chat_ui
+    app = mount_chat_ui(app)
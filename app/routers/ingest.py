@@ -1,6 +1,7 @@
-from fastapi import APIRouter
-from app.schemas import UrlRequest, SitemapRequest
+from fastapi import APIRouter, HTTPException
+from app.schemas import UrlRequest, SitemapRequest, SitemapIngestResponse, IngestJobResponse, IngestJobStatus
 from app.services.ingestion_service import ingestion_service
+from app.services.jobs import JobQueueFull, ingestion_jobs
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
@@ -12,7 +13,49 @@ async def ingest_url(request: UrlRequest):
     else:
         return {"message": f"Failed to ingest {request.url}", "status": "error"}
 
-@router.post("/sitemap")
+@router.post("/sitemap", response_model=SitemapIngestResponse)
 async def ingest_sitemap(request: SitemapRequest):
-    count = await ingestion_service.ingest_sitemap(request.sitemap_url, request.filter_pattern)
-    return {"message": f"Successfully ingested {count} URLs from {request.sitemap_url}"}
+    results = await ingestion_service.ingest_sitemap(
+        request.sitemap_url,
+        request.filter_pattern,
+        concurrency=request.concurrency,
+    )
+    count = sum(1 for r in results if r["success"])
+    return {
+        "message": f"Successfully ingested {count} URLs from {request.sitemap_url}",
+        "succeeded": count,
+        "failed": len(results) - count,
+        "results": results,
+    }
+
+@router.post("/jobs", response_model=IngestJobResponse, status_code=202)
+async def create_ingest_job(request: SitemapRequest):
+    """
+    Queues a sitemap ingestion and returns its job ID right away.
+    Responds 429 when too many jobs are already waiting.
+    """
+    try:
+        job_id = await ingestion_jobs.submit(
+            request.sitemap_url,
+            request.filter_pattern,
+            concurrency=request.concurrency,
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status_url": f"/ingest/jobs/{job_id}"}
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(job_id: str):
+    """Reports a job's state and how many of its URLs are done, failed or pending."""
+    status = await ingestion_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+@router.delete("/jobs/{job_id}", response_model=IngestJobStatus)
+async def cancel_ingest_job(job_id: str):
+    """Cancels a queued or running job. URLs already ingested are kept."""
+    status = await ingestion_jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
@@ -1,76 +1,214 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional
+import json
 import os
+import time
 
 from app.services.rag_service import rag_service
+from app.services.indexing_service import indexing_service
+from app.services.reindexing import RebuildInProgress, reindexer
 
 router = APIRouter(prefix="/rag", tags=["rag"])
 
-from app.schemas import SearchResponse, SearchResult
+from app.schemas import RebuildStatus, SearchResponse, SearchResult
 
 
 @router.post("/index")
 async def index_knowledge_base():
     """
     Triggers the loading and indexing of the knowledge base.
-    Scans all .txt and .md files in the data/ directory.
+    Scans all .txt and .md files in the data/ directory; only new or
+    modified files are re-indexed and chunks of deleted files are removed.
     """
     try:
         data_dir = "data"
         if not os.path.exists(data_dir):
              raise HTTPException(status_code=404, detail="Data directory not found.")
 
-        total_chunks = 0
-        indexed_files = []
-
-        for filename in os.listdir(data_dir):
-            if filename.endswith(".txt") or filename.endswith(".md"):
-                file_path = os.path.join(data_dir, filename)
-                chunks = await rag_service.load_and_chunk(file_path)
-                await rag_service.embed_and_store(chunks)
-                total_chunks += len(chunks)
-                indexed_files.append(filename)
-        
+        summary = await indexing_service.index_directory(data_dir)
+        indexed_files = [os.path.basename(path) for path in summary["indexed"]]
+
         return {
-            "message": f"Successfully indexed {total_chunks} chunks from {len(indexed_files)} files.",
-            "files": indexed_files
+            "message": (
+                f"Successfully indexed {summary['chunks']} chunks from {len(indexed_files)} files "
+                f"({len(summary['unchanged'])} unchanged, {len(summary['removed'])} removed)."
+            ),
+            "files": indexed_files,
+            "unchanged": [os.path.basename(path) for path in summary["unchanged"]],
+            "removed": [os.path.basename(path) for path in summary["removed"]],
+            "embedded_chunks": summary["embedded_chunks"],
+            "deleted_chunks": summary["deleted_chunks"],
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/search", response_model=SearchResponse)
-async def search_knowledge_base(q: str = Query(..., description="The search query")):
+async def search_knowledge_base(
+    q: str = Query(..., description="The search query"),
+    budget_ms: Optional[float] = Query(None, gt=0, description="Retrieval latency budget; defaults to LATENCY_BUDGET_MS"),
+    shard: Optional[str] = Query(None, description="Only search this shard (see /rag/shards); all by default"),
+):
     """
     Searches the knowledge base for relevant information and generates an answer.
+    Per-stage retrieval timings (ms) are returned alongside the results, with
+    the estimated context tokens sent to the LLM and saved by context packing.
     """
     try:
-        results = await rag_service.query(q)
+        search = await rag_service.search(q, budget_ms=budget_ms, shard=shard)
+        results = search["results"]
         # Extract just the text for the LLM context
         context_chunks = [r["text"] for r in results]
-        answer = await rag_service.generate_answer(q, context_chunks)
-        return {"results": results, "answer": answer}
+        pack_started = time.perf_counter()
+        context = rag_service.prepare_context(q, context_chunks)
+        llm_started = time.perf_counter()
+        answer = await rag_service.generate_answer(q, context.chunks, pack=False)
+        timings = {
+            **search["timings"],
+            "pack": (llm_started - pack_started) * 1000,
+            "llm": (time.perf_counter() - llm_started) * 1000,
+        }
+        return {
+            "results": results,
+            "answer": answer,
+            "timings": timings,
+            "candidates": search.get("candidates"),
+            "reranked": search.get("reranked"),
+            "context_tokens": context.tokens,
+            "context_tokens_saved": context.saved_tokens,
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_event(event: str, data: dict) -> str:
+    """Formats one server-sent event; data is JSON so newlines in tokens are safe."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/search/stream")
+async def stream_search_knowledge_base(
+    q: str = Query(..., description="The search query"),
+    shard: Optional[str] = Query(None, description="Only search this shard (see /rag/shards); all by default"),
+):
+    """
+    Searches the knowledge base and streams the answer as server-sent events.
+
+    Emits a `sources` event with the retrieved results as soon as retrieval
+    finishes, then one `token` event per answer delta, then `done`.
+    Failures are reported as an `error` event.
+    """
+    async def events():
+        try:
+            results = await rag_service.query(q, shard=shard)
+            yield _sse_event("sources", {"results": results})
+
+            context_chunks = [r["text"] for r in results]
+            async for token in rag_service.stream_answer(q, context_chunks):
+                yield _sse_event("token", {"text": token})
+            yield _sse_event("done", {})
+        except Exception as e:
+            yield _sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/reset")
-async def reset_knowledge_base():
+async def reset_knowledge_base(
+    shard: Optional[str] = Query(None, description="Only delete this shard's data, leaving the others untouched"),
+):
     """
-    Resets the knowledge base by deleting all data.
+    Resets the knowledge base by deleting all data, or the data of one shard.
+    Responds 409 while a rebuild is running.
     """
+    if reindexer.running:
+        raise HTTPException(status_code=409, detail="A rebuild is running; reset once it has finished.")
     try:
-        await rag_service.reset_database()
+        if not await rag_service.reset_database(shard):
+            raise HTTPException(status_code=404, detail=f"Shard {shard!r} not found.")
+        if shard is not None:
+            return {"message": f"Shard {shard!r} reset successfully."}
         return {"message": "Knowledge base reset successfully."}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/inspect")
-async def inspect_knowledge_base():
+@router.get("/shards")
+async def list_shards():
     """
-    Returns all documents stored in the knowledge base.
+    Lists the collections the knowledge base is partitioned into (SHARD_BY)
+    with their chunk counts. The base collection has the empty key.
     """
     try:
-        return await rag_service.get_all_documents()
+        return {
+            "shard_by": rag_service.shard_by,
+            "generation": rag_service.collection_base,
+            "shards": await rag_service.list_shards(),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/rebuild", response_model=RebuildStatus, status_code=202)
+async def rebuild_knowledge_base(
+    recrawl: bool = Query(False, description="Crawl stored pages again instead of re-embedding their stored chunks"),
+):
+    """
+    Rebuilds the knowledge base into a new versioned collection in the
+    background. Searches keep using the current one until the rebuild is
+    complete and switched to. Responds 409 if a rebuild is already running.
+    """
+    try:
+        return await reindexer.start("data", recrawl=recrawl)
+    except RebuildInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/rebuild", response_model=RebuildStatus)
+async def rebuild_status():
+    """Reports the state of the current or last rebuild."""
+    return reindexer.status()
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """
+    Returns hit/miss counters of the query-embedding and retrieval caches.
+    """
+    return rag_service.cache_stats()
+
+@router.get("/inspect")
+async def inspect_knowledge_base(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (100 by default)"),
+    offset: Optional[int] = Query(None, ge=0, description="Position of the first chunk: the previous page's next_offset"),
+    source: Optional[str] = Query(None, description="Only chunks whose source metadata matches"),
+    fields: List[Literal["documents", "metadatas"]] = Query(["documents", "metadatas"]),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams every page from offset on"),
+):
+    """
+    Returns the documents stored in the knowledge base.
+
+    With `limit` or `offset`, one page is returned as {items, offset, limit,
+    next_offset}. Without either, every chunk is returned at once in the
+    original {ids, documents, metadatas} shape. With format=ndjson, all chunks
+    from `offset` onwards are streamed as one JSON object per line, reading
+    the collection `limit` chunks at a time.
+    """
+    paged = limit is not None or offset is not None
+    limit = limit or 100
+    offset = offset or 0
+    try:
+        if format == "ndjson":
+            async def lines():
+                async for item in rag_service.iter_documents(limit, offset, source, fields):
+                    yield json.dumps(item) + "\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        if not paged:
+            return await rag_service.get_all_documents(source, fields)
+        return await rag_service.get_documents(limit, offset, source, fields)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 class UrlRequest(BaseModel):
     url: str
@@ -7,11 +7,73 @@ class UrlRequest(BaseModel):
 class SitemapRequest(BaseModel):
     sitemap_url: str
     filter_pattern: Optional[str] = None
+    concurrency: int = Field(8, ge=1, le=64)
+
+class UrlIngestResult(BaseModel):
+    url: str
+    success: bool
+    unchanged: bool = False
+    error: Optional[str] = None
+
+class SitemapIngestResponse(BaseModel):
+    message: str
+    succeeded: int
+    failed: int
+    results: List[UrlIngestResult]
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status_url: str
+
+class UrlFailure(BaseModel):
+    url: str
+    error: Optional[str] = None
+
+class IngestJobStatus(BaseModel):
+    id: str
+    sitemap_url: str
+    status: str
+    error: Optional[str] = None
+    total: Optional[int] = None
+    pending: int
+    done: int
+    unchanged: int
+    failed: int
+    failures: List[UrlFailure]
 
 class SearchResult(BaseModel):
     text: str
-    score: float
+    score: float = Field(
+        ...,
+        description="Fused relevance (reciprocal rank fusion of vector and keyword ranks); higher is better",
+    )
+    distance: Optional[float] = Field(
+        None,
+        description="Embedding distance to the question (lower is better); null for keyword-only hits",
+    )
+    id: Optional[str] = None
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     answer: str
+    timings: Dict[str, float] = {}
+    candidates: Optional[int] = None
+    reranked: Optional[int] = None
+    context_tokens: Optional[int] = None
+    context_tokens_saved: Optional[int] = None
+
+class RebuildStatus(BaseModel):
+    status: str
+    generation: Optional[str] = None
+    previous_generation: Optional[str] = None
+    data_dir: Optional[str] = None
+    files: Optional[int] = None
+    recrawled: Optional[int] = None
+    copied_sources: Optional[int] = None
+    copied_chunks: Optional[int] = None
+    replayed_sources: Optional[int] = None
+    paused_seconds: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    seconds: Optional[float] = None
+    error: Optional[str] = None
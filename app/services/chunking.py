@@ -0,0 +1,185 @@
+import io
+import re
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from app import config
+
+# A Markdown header line: 1-6 '#' followed by whitespace and a title
+HEADER_PATTERN = re.compile(r'#{1,6}\s.+')
+# A word plus the whitespace after it; the unit of "tokens" sizes
+TOKEN_PATTERN = re.compile(r'\S+\s*')
+UNITS = ("chars", "tokens")
+
+# How much of a file is read at once
+READ_SIZE = 1 << 16
+
+
+def count_units(text: str, unit: str) -> int:
+    """Size of a text in characters or whitespace-delimited tokens."""
+    return len(text) if unit == "chars" else len(TOKEN_PATTERN.findall(text))
+
+
+class ChunkSplitter:
+    """
+    Cuts text fed to it piece by piece into chunks of `size` units, with
+    `overlap` units repeated at the start of each following chunk.
+
+    Units are characters or whitespace-delimited tokens. Only the chunk being
+    filled is buffered, so memory doesn't grow with the length of the input.
+    With character units and no overlap the chunks are exactly the slices
+    `text[i:i + size]`.
+    """
+
+    def __init__(self, size: int, overlap: int = 0, unit: str = "chars"):
+        if unit not in UNITS:
+            raise ValueError(f"Unknown chunk unit {unit!r}; expected one of {UNITS}")
+        if size < 1 or not 0 <= overlap < size:
+            raise ValueError(f"Invalid chunk size {size} with overlap {overlap}")
+        self.size = size
+        self.overlap = overlap
+        self.unit = unit
+        self._reset()
+
+    def _reset(self):
+        self._text = ""  # chars: the unfinished chunk; tokens: a token that may continue
+        self._tokens: List[str] = []
+        # Units at the start of the buffer that already ended the previous chunk
+        self._carried = 0
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Adds text and yields the chunks it completes."""
+        step = self.size - self.overlap
+        if self.unit == "chars":
+            buffer, start = self._text + text, 0
+            while len(buffer) - start >= self.size:
+                yield buffer[start:start + self.size]
+                start += step
+                self._carried = self.overlap
+            self._text = buffer[start:]
+            return
+
+        tokens = TOKEN_PATTERN.findall(self._text + text)
+        if tokens and not text[-1:].isspace():
+            # The last word may continue in the next piece of text
+            self._text = tokens.pop()
+        else:
+            self._text = ""
+        self._tokens.extend(tokens)
+        start = 0
+        while len(self._tokens) - start >= self.size:
+            yield "".join(self._tokens[start:start + self.size])
+            start += step
+            self._carried = self.overlap
+        del self._tokens[:start]
+
+    def finish(self) -> Iterator[str]:
+        """Yields the last, possibly shorter, chunk and resets the splitter."""
+        if self.unit == "chars":
+            rest, size = self._text, len(self._text)
+        else:
+            if self._text:
+                self._tokens.append(self._text)
+            rest, size = "".join(self._tokens), len(self._tokens)
+        if size > self._carried:
+            yield rest
+        self._reset()
+
+
+def iter_blocks(f: IO[str], block_size: int = READ_SIZE) -> Iterator[str]:
+    """Reads a text file in blocks."""
+    for block in iter(lambda: f.read(block_size), ""):
+        yield block
+
+
+def iter_lines(f: IO[str], max_length: int = READ_SIZE) -> Iterator[Tuple[str, bool]]:
+    """
+    Reads a text file line by line, yielding (text, starts_line) pairs.
+
+    Lines longer than `max_length` come in several pieces; only the first one
+    has `starts_line` set.
+    """
+    starts_line = True
+    for piece in iter(lambda: f.readline(max_length), ""):
+        yield piece, starts_line
+        starts_line = piece.endswith("\n")
+
+
+def iter_text_chunks(
+    blocks: Iterable[str],
+    size: int = config.CHUNK_SIZE,
+    overlap: int = config.CHUNK_OVERLAP,
+    unit: str = config.CHUNK_UNIT,
+) -> Iterator[str]:
+    """Splits a stream of text into fixed-size chunks."""
+    splitter = ChunkSplitter(size, overlap, unit)
+    for block in blocks:
+        yield from splitter.feed(block)
+    yield from splitter.finish()
+
+
+def iter_markdown_chunks(
+    lines: Iterable[Tuple[str, bool]],
+    size: int = config.CHUNK_SIZE,
+    overlap: int = config.CHUNK_OVERLAP,
+    unit: str = config.CHUNK_UNIT,
+) -> Iterator[str]:
+    """
+    Splits Markdown by headers to preserve semantic context.
+
+    Every header starts a new chunk holding the header and the text under it.
+    Sections larger than `size` are split further, and each piece repeats the
+    section's header so it keeps its context (e.g. the version of a changelog
+    entry).
+    """
+    header = ""
+    splitter = ChunkSplitter(size, overlap, unit)
+    emitted = False
+
+    def with_header(pieces: Iterable[str]) -> Iterator[str]:
+        nonlocal emitted
+        for piece in pieces:
+            chunk = (header + "\n\n" + piece if header else piece).strip()
+            if chunk:
+                emitted = True
+                yield chunk
+
+    def end_section() -> Iterator[str]:
+        yield from with_header(splitter.finish())
+        if header and not emitted:
+            # A header with nothing under it is still a chunk
+            yield header.strip()
+
+    for line, starts_line in lines:
+        if starts_line and HEADER_PATTERN.match(line):
+            yield from end_section()
+            header = line.rstrip("\n")
+            emitted = False
+            body_size = max(size - count_units(header, unit), overlap + 1)
+            splitter = ChunkSplitter(body_size, overlap, unit)
+            continue
+        yield from with_header(splitter.feed(line))
+    yield from end_section()
+
+
+def iter_file_chunks(
+    file_path: str,
+    size: int = config.CHUNK_SIZE,
+    overlap: int = config.CHUNK_OVERLAP,
+    unit: str = config.CHUNK_UNIT,
+) -> Iterator[str]:
+    """Reads a .txt or .md file incrementally and yields its chunks as they are produced."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.endswith(".md"):
+            yield from iter_markdown_chunks(iter_lines(f), size, overlap, unit)
+        else:
+            yield from iter_text_chunks(iter_blocks(f), size, overlap, unit)
+
+
+def chunk_markdown_text(
+    text: str,
+    size: int = config.CHUNK_SIZE,
+    overlap: int = config.CHUNK_OVERLAP,
+    unit: str = config.CHUNK_UNIT,
+) -> List[str]:
+    """Header-aware chunks of a Markdown string."""
+    return list(iter_markdown_chunks(iter_lines(io.StringIO(text)), size, overlap, unit))
@@ -0,0 +1,169 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+# Words, punctuation marks and runs of extra whitespace each count as about
+# one token for the chat models' BPE tokenizers (no tokenizer is bundled)
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s{2,}")
+WORD = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=\S)")
+SPACES = re.compile(r"[ \t\f\v]+")
+
+# Sentences shorter than this are not deduplicated ("Bug fixes" legitimately repeats)
+MIN_DEDUP_WORDS = 5
+
+STOPWORDS = frozenset("""
+a an and are as at be by can could did do does for from has have how i in is it its
+of on or should that the this to was were what when where which who why will with would you
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count of a text."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+@dataclass
+class PackedContext:
+    chunks: List[str]
+    tokens: int
+    original_tokens: int
+    dropped_chunks: int = 0
+    dropped_sentences: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+@dataclass
+class _Unit:
+    chunk: int
+    line: int
+    position: int
+    text: str
+    header: bool
+    tokens: int
+    score: float = 0.0
+    words: List[str] = field(default_factory=list)
+
+
+def _split_units(chunk_index: int, chunk: str) -> List[_Unit]:
+    """Splits a chunk into sentences, remembering their line; Markdown headers stay whole."""
+    units = []
+    line_no = 0
+    for raw_line in chunk.splitlines():
+        line = SPACES.sub(" ", raw_line).strip()
+        if not line:
+            continue
+        header = line.startswith("#")
+        for sentence in [line] if header else SENTENCE_END.split(line):
+            units.append(_Unit(
+                chunk=chunk_index,
+                line=line_no,
+                position=len(units),
+                text=sentence,
+                header=header,
+                tokens=estimate_tokens(sentence),
+                words=WORD.findall(sentence.lower()),
+            ))
+        line_no += 1
+    return units
+
+
+def _score(units: List[_Unit], question: str):
+    """Scores sentences by the question terms they contain, rarer terms weighing more (IDF)."""
+    terms = {word for word in WORD.findall(question.lower()) if word not in STOPWORDS and len(word) > 1}
+    if not terms:
+        return
+    document_frequency: Dict[str, int] = {}
+    for unit in units:
+        for term in terms.intersection(unit.words):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+    for unit in units:
+        unit.score = sum(
+            math.log(1 + len(units) / document_frequency[term]) for term in terms.intersection(unit.words)
+        )
+
+
+def _assemble(units: List[_Unit], chunk_count: int) -> List[str]:
+    lines: Dict[Tuple[int, int], List[str]] = {}
+    for unit in units:
+        lines.setdefault((unit.chunk, unit.line), []).append(unit.text)
+    chunks: List[List[str]] = [[] for _ in range(chunk_count)]
+    for (chunk, _), parts in sorted(lines.items()):
+        chunks[chunk].append(" ".join(parts))
+    return ["\n".join(chunk) for chunk in chunks if chunk]
+
+
+def pack_context(question: str, chunks: List[str], budget_tokens: int) -> PackedContext:
+    """
+    Prepares retrieved chunks (best first) for the LLM prompt.
+
+    - whitespace is normalised;
+    - sentences already present in a better-ranked chunk (chunk overlap,
+      repeated boilerplate) are dropped, and so are chunks left with nothing new;
+    - if the rest exceeds `budget_tokens`, the sentences sharing the most
+      question terms are kept, ties going to better-ranked chunks, along with
+      the Markdown headers of the chunks they come from.
+
+    Kept sentences stay in their original order within their chunk.
+    """
+    original_tokens = estimate_tokens("\n\n".join(chunks))
+
+    units: List[_Unit] = []
+    seen: Set[Tuple[str, ...]] = set()
+    dropped = 0
+    for index, chunk in enumerate(chunks):
+        for unit in _split_units(index, chunk):
+            key = tuple(unit.words)
+            if not unit.header and len(key) >= MIN_DEDUP_WORDS:
+                if key in seen:
+                    dropped += 1
+                    continue
+                seen.add(key)
+            units.append(unit)
+
+    # A chunk reduced to its headers adds nothing
+    with_content = {unit.chunk for unit in units if not unit.header}
+    units = [unit for unit in units if unit.chunk in with_content]
+
+    # Chunks are joined by a blank line, about one token each
+    separators = max(0, len(with_content) - 1)
+    if sum(unit.tokens for unit in units) + separators > budget_tokens:
+        _score(units, question)
+        headers: Dict[int, List[_Unit]] = {}
+        for unit in units:
+            if unit.header:
+                headers.setdefault(unit.chunk, []).append(unit)
+
+        kept: List[_Unit] = []
+        opened: Set[int] = set()
+        used = 0
+        candidates = sorted(
+            (unit for unit in units if not unit.header),
+            key=lambda unit: (-unit.score, unit.chunk, unit.position),
+        )
+        for unit in candidates:
+            cost = unit.tokens
+            if unit.chunk not in opened:
+                cost += sum(header.tokens for header in headers.get(unit.chunk, [])) + (1 if opened else 0)
+            if used + cost > budget_tokens:
+                continue
+            if unit.chunk not in opened:
+                opened.add(unit.chunk)
+                kept.extend(headers.get(unit.chunk, []))
+            kept.append(unit)
+            used += cost
+        dropped += len(candidates) - sum(not unit.header for unit in kept)
+        units = sorted(kept, key=lambda unit: (unit.chunk, unit.position))
+
+    packed = _assemble(units, len(chunks))
+    return PackedContext(
+        chunks=packed,
+        tokens=estimate_tokens("\n\n".join(packed)),
+        original_tokens=original_tokens,
+        dropped_chunks=len(chunks) - len(packed),
+        dropped_sentences=dropped,
+    )
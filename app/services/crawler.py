@@ -1,72 +1,294 @@
-import requests
-from bs4 import BeautifulSoup
-from typing import Optional, List
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from lxml import etree
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.services.extraction import EXTRACTORS
+from app.services.metrics import CRAWL_BYTES, CRAWL_REQUESTS, timed
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Parsed sitemap URLs waiting for the consumer; readers pause when it is full
+SITEMAP_BUFFER_SIZE = 1000
+
+
+class PageNotModified(Exception):
+    """Raised when a conditional GET reports that a page is unchanged (HTTP 304)."""
+
+
+@dataclass
+class CrawledPage:
+    """Extracted text of a page plus the validators needed to re-crawl it conditionally."""
+    url: str
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
 
 class WebCrawler:
-    def __init__(self):
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_connections_per_host: int = 4,
+        timeout: float = 10.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        extractor: str = config.HTML_EXTRACTOR,
+    ):
+        if extractor not in EXTRACTORS:
+            raise ValueError(f"Unknown HTML extractor {extractor!r}; expected one of {sorted(EXTRACTORS)}")
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self._transport = transport
+        self._extract = EXTRACTORS[extractor]
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Returns the shared connection pool, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        # Pooled connections are bound to the event loop that opened them,
+        # so a new loop (e.g. a new TestClient portal) gets a fresh pool.
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self._transport,
+            )
+            self._client_loop = loop
+            self._host_limits = {}
+        return self._client
 
-    def crawl(self, url: str) -> Optional[str]:
+    async def aclose(self):
+        """Closes the shared connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return limit
+
+    async def _get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """Issues a GET through the shared pool, honouring the per-host connection limit."""
+        client = self._get_client()
+        async with self._host_limit(url):
+            try:
+                with timed("fetch"):
+                    response = await client.get(url, headers=headers)
+            except Exception:
+                CRAWL_REQUESTS.inc(status="error")
+                raise
+        CRAWL_REQUESTS.inc(status=str(response.status_code))
+        CRAWL_BYTES.inc(len(response.content))
+        return response
+
+    @asynccontextmanager
+    async def _stream(self, url: str) -> AsyncIterator[httpx.Response]:
+        """
+        Like _get, but the body is left unread for the caller to stream.
+
+        Streams don't take a per-host slot: a sitemap reader waiting for its
+        consumer would otherwise hold a slot the pages being crawled need.
+        Callers bound their own streams instead.
+        """
+        client = self._get_client()
+        try:
+            response = await client.send(client.build_request("GET", url), stream=True)
+        except Exception:
+            CRAWL_REQUESTS.inc(status="error")
+            raise
+        CRAWL_REQUESTS.inc(status=str(response.status_code))
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def crawl(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> Optional[CrawledPage]:
         """
         Fetches the content of a URL and extracts the text.
+
+        When validators from a previous crawl are given, the request is made
+        conditional and PageNotModified is raised if the server answers 304.
         """
+        conditional_headers = {}
+        if etag:
+            conditional_headers["If-None-Match"] = etag
+        if last_modified:
+            conditional_headers["If-Modified-Since"] = last_modified
+
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = await self._get(url, headers=conditional_headers)
+            if response.status_code == 304:
+                raise PageNotModified(url)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-                
-            # Get text
-            text = soup.get_text()
-            
-            # Break into lines and remove leading/trailing space on each
-            lines = (line.strip() for line in text.splitlines())
-            # Break multi-headlines into a line each
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            # Drop blank lines
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            return text
-            
+
+            # Parsing is CPU-bound, keep it off the event loop
+            with timed("parse"):
+                text = await run_in_threadpool(self.extract_text, response.content)
+
+            return CrawledPage(
+                url=url,
+                text=text,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+
+        except PageNotModified:
+            raise
         except Exception as e:
             print(f"Error crawling {url}: {e}")
             return None
 
-    def get_sitemap_urls(self, sitemap_url: str) -> List[str]:
+    def extract_text(self, content: bytes) -> str:
+        """
+        Extracts readable text from an HTML document.
+
+        The default lxml extractor keeps headings as Markdown headers; the
+        "bs4" extractor returns plain text.
+        """
+        return self._extract(content)
+
+    async def get_sitemap_urls(self, sitemap_url: str) -> List[str]:
         """
         Fetches a sitemap and returns all URLs found in it.
         Handles nested sitemaps (sitemapindex).
         """
-        urls = []
+        return [url async for url in self.iter_sitemap_urls(sitemap_url)]
+
+    async def iter_sitemap_urls(
+        self,
+        sitemap_url: str,
+        concurrency: int = config.SITEMAP_CONCURRENCY,
+        buffer_size: int = SITEMAP_BUFFER_SIZE,
+    ) -> AsyncIterator[str]:
+        """
+        Yields the page URLs of a sitemap as they are parsed.
+
+        Sitemaps are streamed and parsed incrementally (gzipped ones are
+        decompressed on the fly). At most `buffer_size` parsed URLs wait for
+        the consumer: when they pile up, reading pauses (leaving the rest of
+        the response unread), so memory use doesn't grow with sitemap size.
+        Sitemaps listed in a sitemap index are read as soon as they are
+        found, up to `concurrency` at a time, and their URLs are interleaved.
+        A sitemap that fails is reported and skipped.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer_size))
+        limit = asyncio.Semaphore(max(1, concurrency))
+        seen: Set[str] = {sitemap_url}
+        readers: Set[asyncio.Task] = set()
+        finished = object()
+
+        async def read(url: str):
+            try:
+                async with limit:
+                    async for kind, loc in self._iter_sitemap_entries(url):
+                        if kind == "url":
+                            await queue.put(loc)
+                        elif loc not in seen:
+                            seen.add(loc)
+                            start(loc)
+            except Exception as e:
+                print(f"Error fetching sitemap {url}: {e}")
+            # Not reached when cancelled, so a full queue can't block the cleanup
+            await queue.put(finished)
+
+        running = 0
+
+        def start(url: str):
+            # Nested sitemaps are counted before their parent reports finished
+            nonlocal running
+            running += 1
+            readers.add(asyncio.ensure_future(read(url)))
+
+        start(sitemap_url)
         try:
-            response = requests.get(sitemap_url, headers=self.headers, timeout=10)
+            while running:
+                item = await queue.get()
+                if item is finished:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            for task in readers:
+                task.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+    async def _iter_sitemap_entries(self, url: str) -> AsyncIterator[Tuple[str, str]]:
+        """Streams one sitemap, yielding ("url" | "sitemap", loc) pairs as they are parsed."""
+        async with self._stream(url) as response:
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'xml')
-            
-            # Check for sitemap index
-            sitemap_tags = soup.find_all("sitemap")
-            if sitemap_tags:
-                for sitemap in sitemap_tags:
-                    loc = sitemap.find("loc")
-                    if loc:
-                        urls.extend(self.get_sitemap_urls(loc.text.strip()))
-            else:
-                # Regular sitemap
-                url_tags = soup.find_all("url")
-                for url_tag in url_tags:
-                    loc = url_tag.find("loc")
-                    if loc:
-                        urls.append(loc.text.strip())
-                        
-            return urls
-            
-        except Exception as e:
-            print(f"Error fetching sitemap {sitemap_url}: {e}")
-            return []
+            parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True)
+            decompressor = None
+            head = b""
+            async for data in response.aiter_bytes():
+                CRAWL_BYTES.inc(len(data))
+                if decompressor is None and head is not None:
+                    # .xml.gz files are usually served without a Content-Encoding
+                    head += data
+                    if len(head) < len(GZIP_MAGIC):
+                        continue
+                    if head.startswith(GZIP_MAGIC):
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data, head = head, None
+                if decompressor is not None:
+                    data = decompressor.decompress(data)
+                # lxml parsers can't move between threads, and one network chunk
+                # parses in well under a millisecond, so this stays on the loop
+                with timed("parse_sitemap"):
+                    entries = _feed_sitemap(parser, data)
+                for entry in entries:
+                    yield entry
+            tail = decompressor.flush() if decompressor is not None else head or b""
+            for entry in _feed_sitemap(parser, tail, close=True):
+                yield entry
+
+
+def _feed_sitemap(parser: "etree.XMLPullParser", data: bytes, close: bool = False) -> List[Tuple[str, str]]:
+    """
+    Feeds sitemap XML to an incremental parser and returns the completed
+    ("url" | "sitemap", loc) entries. Finished entries are removed from the
+    tree, so only the element being parsed is kept in memory.
+    """
+    if data:
+        parser.feed(data)
+    if close:
+        parser.close()
+    entries = []
+    for _, element in parser.read_events():
+        name = etree.QName(element).localname
+        if name == "loc":
+            parent = element.getparent()
+            kind = etree.QName(parent).localname if parent is not None else None
+            if kind in ("url", "sitemap") and element.text and element.text.strip():
+                entries.append((kind, element.text.strip()))
+        elif name in ("url", "sitemap"):
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    return entries
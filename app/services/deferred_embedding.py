@@ -0,0 +1,60 @@
+"""
+Embedding function the Chroma collections are opened with.
+
+Imported lazily by RAGService: importing it loads chromadb.
+"""
+from typing import Any, Callable, Dict
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import (
+    SentenceTransformerEmbeddingFunction,
+)
+
+
+class DeferredSentenceTransformer(SentenceTransformerEmbeddingFunction):
+    """
+    Chroma's SentenceTransformerEmbeddingFunction, with the same name and
+    config (so existing collections open with it), that doesn't load the model
+    when it is constructed. Calls go to the embedding function returned by
+    `load`, which loads the model the first time it is needed.
+
+    Every write passes its own vectors, so opening the collections and storing
+    precomputed embeddings (e.g. a snapshot import) never loads the model.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], EmbeddingFunction],
+        model_name: str,
+        device: str = "cpu",
+        normalize_embeddings: bool = False,
+        **kwargs: Any,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = normalize_embeddings
+        self.kwargs = kwargs
+        self._load = load
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._load()(input)
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "DeferredSentenceTransformer":
+        # Chroma rebuilds the function from its config when opening a collection,
+        # only to check that it round-trips, and registers this class under the
+        # same name for collections it reopens; neither may load the model
+        settings = {
+            "model_name": config["model_name"],
+            "device": config["device"],
+            "normalize_embeddings": config["normalize_embeddings"],
+            **config.get("kwargs", {}),
+        }
+        loaded = []
+
+        def load() -> EmbeddingFunction:
+            if not loaded:
+                loaded.append(SentenceTransformerEmbeddingFunction(**settings))
+            return loaded[0]
+
+        return DeferredSentenceTransformer(load, **settings)
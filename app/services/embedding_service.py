@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from app import config
+from app.services.batching import MicroBatcher
+from app.services.metrics import EMBEDDING_BATCH_SIZE
+
+Embedding = List[float]
+
+# Model loaded once per worker process (process executor only)
+_worker_model = None
+
+
+def _load_worker_model(model_name: str):
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_in_worker(texts: List[str]) -> List[Embedding]:
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True).tolist()
+
+
+class EmbeddingPipeline:
+    """
+    Explicit embedding stage used before writing to ChromaDB.
+
+    Texts submitted by concurrent callers (e.g. chunks of many documents being
+    ingested at once) are pooled into one window of up to
+    `batch_size * workers` texts. The window is sorted by length so each batch
+    holds similarly sized texts (less padding), split into batches of
+    `batch_size`, and encoded on a pool of CPU workers in parallel.
+
+    With the "thread" executor the batches are encoded by `embedding_function`
+    in this process; with "process" every worker loads its own copy of
+    `model_name`, which sidesteps the GIL at the cost of extra memory.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+        model_name: str = config.EMBEDDING_MODEL,
+        batch_size: int = config.EMBEDDING_BATCH_SIZE,
+        workers: int = config.EMBEDDING_WORKERS,
+        executor: str = config.EMBEDDING_EXECUTOR,
+        max_wait: float = config.EMBEDDING_MAX_WAIT,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown embedding executor: {executor}")
+        if executor == "thread" and embedding_function is None:
+            raise ValueError("The thread executor needs an embedding_function")
+
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self._batcher = MicroBatcher(
+            self._embed_window,
+            max_batch_size=self.batch_size * self.workers,
+            max_wait=max_wait,
+        )
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # spawn, not fork: forking a process that already runs torch threads can deadlock
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_worker_model,
+                    initargs=(self.model_name,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="embedding",
+                )
+        return self._executor
+
+    def _encode_batch(self, texts: List[str]) -> List[Embedding]:
+        """Encodes one batch in a worker thread."""
+        return [list(map(float, embedding)) for embedding in self.embedding_function(texts)]
+
+    async def embed(self, texts: List[str]) -> List[Embedding]:
+        """Returns one embedding per text, batched together with other callers' texts."""
+        return await self._batcher.submit_many(list(texts))
+
+    async def _embed_window(self, texts: List[str]) -> List[Embedding]:
+        """Sorts a window by length, encodes it in parallel batches and restores the order."""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        for batch in batches:
+            EMBEDDING_BATCH_SIZE.observe(len(batch), kind="chunks")
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        encode = _encode_in_worker if self.executor_kind == "process" else self._encode_batch
+        encoded = await asyncio.gather(*(
+            loop.run_in_executor(executor, encode, [texts[i] for i in batch])
+            for batch in batches
+        ))
+
+        embeddings: List[Optional[Embedding]] = [None] * len(texts)
+        for batch, batch_embeddings in zip(batches, encoded):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        return embeddings
+
+    def close(self):
+        """Shuts down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,151 @@
+import re
+from typing import List, Optional
+
+import lxml.html
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# Elements whose whole subtree is never content. Forms and asides are kept:
+# some frameworks (ASP.NET WebForms) wrap the whole page in a <form>, and docs
+# put notes and callouts in <aside>; only the form controls themselves are dropped
+SKIPPED_TAGS = frozenset({
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object",
+    "head", "nav", "footer", "dialog", "input", "button", "select", "textarea",
+})
+# ARIA landmarks that mark site chrome rather than page content
+SKIPPED_ROLES = frozenset({"navigation", "banner", "contentinfo", "search", "complementary", "dialog"})
+# Elements that start a new line of text
+BLOCK_TAGS = frozenset({
+    "address", "article", "blockquote", "body", "br", "caption", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li",
+    "main", "ol", "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+})
+HEADING_LEVELS = {f"h{level}": level for level in range(1, 7)}
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class _Lines:
+    """Accumulates text into lines; headings are rendered as Markdown headers."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.parts: List[str] = []
+        self.heading: Optional[int] = None
+        self.preformatted = 0
+
+    def add(self, text: Optional[str]):
+        if not text:
+            return
+        if self.preformatted:
+            # Keep the line structure of <pre> blocks
+            first, *rest = text.split("\n")
+            self.parts.append(first)
+            for line in rest:
+                self.break_line()
+                self.parts.append(line)
+        else:
+            self.parts.append(WHITESPACE.sub(" ", text))
+
+    def break_line(self):
+        line = "".join(self.parts)
+        # Indentation is meaningful inside <pre>
+        line = line.rstrip() if self.preformatted else line.strip()
+        self.parts = []
+        if not line:
+            return
+        if self.heading:
+            line = "#" * self.heading + " " + line
+        self.lines.append(line)
+
+
+def _is_boilerplate(element) -> bool:
+    if element.tag in SKIPPED_TAGS:
+        return True
+    if element.get("role") in SKIPPED_ROLES or element.get("aria-hidden") == "true":
+        return True
+    return element.get("hidden") is not None
+
+
+def extract_text(content: bytes) -> str:
+    """
+    Extracts readable text from an HTML document with lxml.
+
+    Scripts, styles, navigation, sidebars (role="complementary"), footers,
+    form controls and other page chrome are dropped in the same pass that collects the text. When the page has a
+    <main> (or a single <article>) only that part is used. Headings become
+    Markdown headers (`## Title`) so the Markdown chunker can split on them.
+    """
+    if not content or not content.strip():
+        return ""
+    try:
+        root = lxml.html.fromstring(content)
+    except (etree.ParserError, ValueError):
+        return ""
+
+    main = root.find(".//main")
+    if main is None:
+        articles = root.findall(".//article")
+        main = articles[0] if len(articles) == 1 else root
+
+    out = _Lines()
+    # Iterative walk: (element, closing) pairs, so deep pages can't hit the recursion limit
+    stack = [(main, False)]
+    while stack:
+        element, closing = stack.pop()
+        tag = element.tag if isinstance(element.tag, str) else None
+
+        if closing:
+            if tag in BLOCK_TAGS:
+                out.break_line()
+            if tag in HEADING_LEVELS:
+                out.heading = None
+            if tag == "pre":
+                out.preformatted -= 1
+            if element is not main:
+                out.add(element.tail)
+            continue
+
+        # Comments and processing instructions only contribute their tail
+        if tag is None or _is_boilerplate(element):
+            if element is not main:
+                out.add(element.tail)
+            continue
+
+        if tag in BLOCK_TAGS:
+            out.break_line()
+        if tag in HEADING_LEVELS:
+            out.heading = HEADING_LEVELS[tag]
+        if tag == "pre":
+            out.preformatted += 1
+        out.add(element.text)
+        stack.append((element, True))
+        stack.extend((child, False) for child in reversed(element))
+
+    out.break_line()
+    return "\n".join(out.lines)
+
+
+def extract_text_bs4(content: bytes) -> str:
+    """The original BeautifulSoup (html.parser) extractor: all text, no structure."""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Get text
+    text = soup.get_text()
+
+    # Break into lines and remove leading/trailing space on each
+    lines = (line.strip() for line in text.splitlines())
+    # Break multi-headlines into a line each
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    # Drop blank lines
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+EXTRACTORS = {
+    "lxml": extract_text,
+    "bs4": extract_text_bs4,
+}
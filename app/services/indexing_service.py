@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.services.metrics import CHUNKS_PRODUCED
+from app.services.rag_service import RAGService, chunk_id, rag_service
+
+INDEXED_EXTENSIONS = (".txt", ".md")
+
+
+def _sha256_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexingService:
+    """
+    Incrementally indexes the .txt/.md files of a directory.
+
+    A JSON manifest next to the Chroma data records, for every indexed file,
+    its size, mtime, content hash and the IDs of the chunks it produced.
+    Files whose size and mtime are unchanged are skipped without being read;
+    files whose content hash is unchanged are skipped without being chunked.
+    New and modified files are streamed through the chunker in parallel and
+    only their new chunks are embedded; chunks that only belonged to modified
+    or deleted files are removed.
+    """
+
+    def __init__(
+        self,
+        rag_service: RAGService = rag_service,
+        manifest_path: Optional[str] = None,
+        concurrency: int = config.INDEX_CONCURRENCY,
+    ):
+        self.rag_service = rag_service
+        self._manifest_path = manifest_path
+        self.concurrency = max(1, concurrency)
+        self._lock = asyncio.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        """The given manifest path, or the one kept with the live generation's collections."""
+        return self._manifest_path or self.rag_service.storage_path("index_manifest.json")
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        """Returns the manifest entries, or nothing if they describe another collection."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # A reset recreates the collection with a new ID, invalidating the manifest
+        if manifest.get("collection_id") != str(self.rag_service.collection.id):
+            return {}
+        # Likewise for files whose shard was reset, or that now route to another shard.
+        # Shards aren't created here: a missing one just invalidates the entry.
+        return {
+            path: entry for path, entry in manifest.get("files", {}).items()
+            if entry.get("collection_id", manifest["collection_id"]) == self._shard_collection_id(path)
+        }
+
+    def _shard_collection_id(self, file_path: str) -> Optional[str]:
+        """ID of the collection a file's chunks are stored in, or None if that shard doesn't exist (yet)."""
+        collection = self.rag_service.shard(self.rag_service.shard_key_for(file_path), create=False)
+        return str(collection.id) if collection is not None else None
+
+    def _save_manifest(self, files: Dict[str, dict]):
+        """Writes the manifest atomically."""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection_id": str(self.rag_service.collection.id), "files": files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _scan(self, data_dir: str, manifest: Dict[str, dict]) -> tuple:
+        """Splits the files of a directory into changed ones and unchanged ones."""
+        changed: Dict[str, dict] = {}
+        unchanged: Dict[str, dict] = {}
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(INDEXED_EXTENSIONS):
+                    continue
+                file_path = os.path.join(data_dir, entry.name)
+                stat = entry.stat()
+                previous = manifest.get(file_path)
+                state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+                if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                    unchanged[file_path] = previous
+                    continue
+
+                state["sha256"] = _sha256_file(file_path)
+                if previous and previous["sha256"] == state["sha256"]:
+                    # Touched but not modified: just remember the new mtime
+                    unchanged[file_path] = {**previous, **state}
+                else:
+                    changed[file_path] = state
+        return changed, unchanged
+
+    async def _index_file(self, file_path: str, state: dict, previous: Optional[dict]) -> dict:
+        """Chunks a file and embeds the chunks it didn't have before, returning its manifest entry."""
+        known_ids = set(previous["chunk_ids"]) if previous else set()
+        chunk_ids = set()
+        embedded = 0
+
+        # Chunks are read and embedded a batch at a time, so large files never
+        # have to fit in memory
+        async for chunks in self.rag_service.iter_chunk_batches(file_path):
+            CHUNKS_PRODUCED.inc(len(chunks), origin="file")
+            new_chunks = []
+            for chunk in chunks:
+                cid = chunk_id(chunk)
+                if cid not in known_ids and cid not in chunk_ids:
+                    new_chunks.append(chunk)
+                chunk_ids.add(cid)
+            metadatas = [{"source": file_path} for _ in new_chunks]
+            await self.rag_service.embed_and_store(new_chunks, metadatas)
+            embedded += len(new_chunks)
+
+        return {
+            **state,
+            "chunk_ids": sorted(chunk_ids),
+            "embedded": embedded,
+            "collection_id": self._shard_collection_id(file_path),
+        }
+
+    async def index_directory(self, data_dir: str = "data") -> dict:
+        """Brings the index up to date with the files in a directory."""
+        async with self._lock:
+            await self.rag_service.ensure_loaded()
+            manifest = await run_in_threadpool(self._load_manifest)
+            changed, unchanged = await run_in_threadpool(self._scan, data_dir, manifest)
+            removed = [path for path in manifest if path not in changed and path not in unchanged]
+
+            limit = asyncio.Semaphore(self.concurrency)
+
+            async def index_one(file_path: str) -> dict:
+                async with limit:
+                    return await self._index_file(file_path, changed[file_path], manifest.get(file_path))
+
+            indexed = await asyncio.gather(*(index_one(path) for path in changed))
+            embedded = sum(entry.pop("embedded") for entry in indexed)
+            files = {**unchanged, **dict(zip(changed, indexed))}
+
+            # Drop chunks that no current file produces any more. IDs are content
+            # hashes, so a chunk shared with another file must be kept.
+            live_ids = {cid for entry in files.values() for cid in entry["chunk_ids"]}
+            stale_ids = {
+                cid
+                for path in list(changed) + removed
+                if path in manifest
+                for cid in manifest[path]["chunk_ids"]
+            } - live_ids
+            await self.rag_service.delete_ids(sorted(stale_ids))
+
+            await run_in_threadpool(self._save_manifest, files)
+
+            return {
+                "indexed": sorted(changed),
+                "unchanged": sorted(unchanged),
+                "removed": sorted(removed),
+                "chunks": sum(len(entry["chunk_ids"]) for entry in indexed),
+                "embedded_chunks": embedded,
+                "deleted_chunks": len(stale_ids),
+            }
+
+indexing_service = IndexingService()
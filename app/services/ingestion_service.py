@@ -1,45 +1,141 @@
-from app.services.crawler import WebCrawler
-from app.services.rag_service import rag_service
-from starlette.concurrency import run_in_threadpool
-from typing import List
+import asyncio
+from app.services.chunking import chunk_markdown_text
+from app.services.crawler import CrawledPage, PageNotModified, WebCrawler
+from app.services.metrics import CHUNKS_PRODUCED, timed
+from app.services.rag_service import RAGService, rag_service
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Union
+
+DEFAULT_SITEMAP_CONCURRENCY = 8
 
 class IngestionService:
-    def __init__(self):
-        self.crawler = WebCrawler()
+    def __init__(self, rag_service: RAGService = rag_service, crawler: Optional[WebCrawler] = None):
+        self.crawler = crawler or WebCrawler()
         self.rag_service = rag_service
 
     async def ingest_url(self, url: str) -> bool:
-        """Crawls a URL and indexes the content."""
-        text = await run_in_threadpool(self.crawler.crawl, url)
-        if not text:
+        """Crawls a URL and indexes the content. Unchanged pages are left as they are."""
+        try:
+            page = await self._fetch(url)
+        except PageNotModified:
+            return True
+        if page is None or not page.text:
             return False
-            
-        # Delete existing documents for this source
-        # Accessing collection directly from rag_service might be a bit leaky, 
-        # but for now it's the quickest way without adding delete method to RAGService interface explicitly for this.
-        # Ideally RAGService should expose a delete_by_source method.
-        await run_in_threadpool(self.rag_service.collection.delete, where={"source": url})
-            
-        # Chunk the text (simple chunking for now, could be smarter for HTML)
-        chunks = [text[i:i+1000] for i in range(0, len(text), 1000)]
-        
-        # Create metadata for each chunk
-        metadatas = [{"source": url} for _ in chunks]
-        
-        await self.rag_service.embed_and_store(chunks, metadatas)
+        await self._index_page(page)
         return True
 
-    async def ingest_sitemap(self, sitemap_url: str, filter_pattern: str = None) -> int:
-        """Ingests all URLs from a sitemap, optionally filtering by a pattern."""
-        urls = await run_in_threadpool(self.crawler.get_sitemap_urls, sitemap_url)
-        
-        if filter_pattern:
-            urls = [url for url in urls if filter_pattern in url]
-            
-        count = 0
-        for url in urls:
-            if await self.ingest_url(url):
-                count += 1
-        return count
+    async def _fetch(self, url: str) -> Optional[CrawledPage]:
+        """
+        Crawls a URL conditionally, using the validators stored with its chunks.
+        Raises PageNotModified when the page hasn't changed since it was indexed.
+        """
+        stored = await self.rag_service.get_source_metadata(url) or {}
+        return await self.crawler.crawl(
+            url,
+            etag=stored.get("etag"),
+            last_modified=stored.get("last_modified"),
+        )
+
+    async def _index_page(self, page: CrawledPage) -> dict:
+        """Syncs the stored chunks of a page with its new text, embedding only new chunks."""
+        url, text = page.url, page.text
+
+        # Extracted pages keep their headings as Markdown headers, so split on them
+        with timed("chunk"):
+            chunks = chunk_markdown_text(text)
+        CHUNKS_PRODUCED.inc(len(chunks), origin="url")
+
+        # Create metadata for each chunk, keeping the validators for the next conditional crawl
+        metadata = {"source": url}
+        if page.etag:
+            metadata["etag"] = page.etag
+        if page.last_modified:
+            metadata["last_modified"] = page.last_modified
+        metadatas = [dict(metadata) for _ in chunks]
+
+        return await self.rag_service.sync_source(url, chunks, metadatas)
+
+    async def iter_urls(self, sitemap_url: str, filter_pattern: str = None) -> AsyncIterator[str]:
+        """Yields the URLs of a sitemap containing `filter_pattern` as the sitemap is parsed."""
+        async for url in self.crawler.iter_sitemap_urls(sitemap_url):
+            if not filter_pattern or filter_pattern in url:
+                yield url
+
+    async def discover_urls(self, sitemap_url: str, filter_pattern: str = None) -> List[str]:
+        """Returns the URLs listed in a sitemap, keeping only those containing `filter_pattern`."""
+        return [url async for url in self.iter_urls(sitemap_url, filter_pattern)]
+
+    async def ingest_urls(
+        self,
+        urls: Union[Iterable[str], AsyncIterable[str]],
+        concurrency: int = DEFAULT_SITEMAP_CONCURRENCY,
+        on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> List[dict]:
+        """
+        Ingests URLs concurrently and returns one result per URL.
+
+        At most `concurrency` pages are fetched and at most `concurrency` pages
+        are embedded at any moment, so crawling one page overlaps with
+        embedding another. Pages the server reports as unchanged are skipped
+        and marked as such. `on_result` is awaited with each result as soon as
+        its URL is done.
+
+        `urls` may be an async iterable, such as iter_urls: each URL is started
+        as it arrives, with at most 2 x `concurrency` waiting, so ingestion
+        begins before the sitemap has been read to the end.
+        """
+        concurrency = max(1, concurrency)
+        fetch_limit = asyncio.Semaphore(concurrency)
+        embed_limit = asyncio.Semaphore(concurrency)
+
+        async def ingest_one(url: str) -> dict:
+            try:
+                async with fetch_limit:
+                    page = await self._fetch(url)
+                if page is None or not page.text:
+                    result = {"url": url, "success": False, "error": "No content fetched"}
+                else:
+                    async with embed_limit:
+                        await self._index_page(page)
+                    result = {"url": url, "success": True, "error": None}
+            except PageNotModified:
+                result = {"url": url, "success": True, "unchanged": True, "error": None}
+            except Exception as e:
+                print(f"Error ingesting {url}: {e}")
+                result = {"url": url, "success": False, "error": str(e)}
+            if on_result is not None:
+                await on_result(result)
+            return result
+
+        if not hasattr(urls, "__aiter__"):
+            return await asyncio.gather(*(ingest_one(url) for url in urls))
+
+        in_flight = asyncio.Semaphore(2 * concurrency)
+        tasks: List[asyncio.Task] = []
+
+        async def start(url: str) -> dict:
+            try:
+                return await ingest_one(url)
+            finally:
+                in_flight.release()
+
+        try:
+            async for url in urls:
+                await in_flight.acquire()
+                tasks.append(asyncio.ensure_future(start(url)))
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def ingest_sitemap(
+        self,
+        sitemap_url: str,
+        filter_pattern: str = None,
+        concurrency: int = DEFAULT_SITEMAP_CONCURRENCY,
+    ) -> List[dict]:
+        """Ingests all URLs from a sitemap, optionally filtering by a pattern (see ingest_urls)."""
+        return await self.ingest_urls(self.iter_urls(sitemap_url, filter_pattern), concurrency)
 
 ingestion_service = IngestionService()
@@ -0,0 +1,335 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.services.ingestion_service import IngestionService, ingestion_service
+
+# Jobs in these states still have work to do and are resumed after a restart
+UNFINISHED = ("queued", "running")
+# Discovered URLs are recorded in batches of this many
+DISCOVERY_BATCH_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    sitemap_url TEXT NOT NULL,
+    filter_pattern TEXT,
+    concurrency INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    discovered INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_urls (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    PRIMARY KEY (job_id, url)
+);
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised when no more ingestion jobs can be queued."""
+
+
+class JobStore:
+    """
+    SQLite record of ingestion jobs and the state of each of their URLs.
+
+    URL outcomes are written as they complete, so an interrupted job can be
+    resumed with only its pending URLs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def create(self, sitemap_url: str, filter_pattern: Optional[str], concurrency: int) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, sitemap_url, filter_pattern, concurrency, status, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, sitemap_url, filter_pattern, concurrency, now, now),
+                )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (status, error, time.time(), job_id),
+                )
+
+    def add_urls(self, job_id: str, urls: List[str]) -> List[str]:
+        """Records URLs a job has to ingest and returns those of them still pending."""
+        if not urls:
+            return []
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO job_urls (job_id, url) VALUES (?, ?)",
+                    ((job_id, url) for url in urls),
+                )
+                conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            rows = conn.execute(
+                f"SELECT url FROM job_urls WHERE job_id = ? AND status = 'pending' AND url IN ({','.join('?' * len(urls))})",
+                (job_id, *urls),
+            ).fetchall()
+        pending = {row["url"] for row in rows}
+        return [url for url in urls if url in pending]
+
+    def mark_discovered(self, job_id: str):
+        """Records that all of a job's URLs are known, so a resumed job doesn't read its sitemap again."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE jobs SET discovered = 1, updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def pending_urls(self, job_id: str) -> List[str]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT url FROM job_urls WHERE job_id = ? AND status = 'pending' ORDER BY rowid", (job_id,)
+            ).fetchall()
+        return [row["url"] for row in rows]
+
+    def record_result(self, job_id: str, result: dict):
+        """Stores the outcome of one URL."""
+        if not result["success"]:
+            status = "failed"
+        else:
+            status = "unchanged" if result.get("unchanged") else "done"
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE job_urls SET status = ?, error = ? WHERE job_id = ? AND url = ?",
+                    (status, result.get("error"), job_id, result["url"]),
+                )
+                conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        """Counts a job's URLs by state."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT status, COUNT(*) AS n FROM job_urls WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        counts = {"pending": 0, "done": 0, "unchanged": 0, "failed": 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def failures(self, job_id: str, limit: int = 100) -> List[dict]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT url, error FROM job_urls WHERE job_id = ? AND status = 'failed' ORDER BY rowid LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(UNFINISHED))}) ORDER BY created_at",
+                UNFINISHED,
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class IngestionJobQueue:
+    """
+    Runs sitemap ingestions in the background.
+
+    Submitted jobs wait in a bounded queue (JobQueueFull when it is full) and
+    are processed by a fixed number of workers, each ingesting one job's URLs
+    with the job's own concurrency. Progress is persisted in a JobStore, and
+    jobs that were queued or running when the process stopped are picked up
+    again on start, skipping URLs that were already ingested.
+    """
+
+    def __init__(
+        self,
+        ingestion_service: IngestionService = ingestion_service,
+        store: Optional[JobStore] = None,
+        workers: int = config.INGEST_JOB_WORKERS,
+        max_queued: int = config.INGEST_JOB_QUEUE_SIZE,
+    ):
+        self.ingestion_service = ingestion_service
+        self.store = store or JobStore(os.path.join(config.CHROMA_PATH, "ingest_jobs.sqlite3"))
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._queued: Set[str] = set()
+
+    def _ensure_started(self):
+        """Starts the workers on the running loop and re-queues unfinished jobs."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._running = {}
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        for job_id in self.store.unfinished():
+            self._enqueue(job_id)
+
+    def _enqueue(self, job_id: str):
+        self._queued.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def start(self):
+        """Starts the workers, resuming jobs left unfinished by a previous run."""
+        self._ensure_started()
+
+    async def stop(self):
+        """Stops the workers; interrupted jobs stay unfinished and resume on the next start."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+
+    async def submit(self, sitemap_url: str, filter_pattern: Optional[str] = None, concurrency: int = 8) -> str:
+        """Queues an ingestion job and returns its ID."""
+        self._ensure_started()
+        if len(self._queued) >= self.max_queued:
+            raise JobQueueFull(f"{len(self._queued)} ingestion jobs are already queued")
+        job_id = await run_in_threadpool(self.store.create, sitemap_url, filter_pattern, concurrency)
+        self._enqueue(job_id)
+        return job_id
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancels a queued or running job; URLs not yet ingested stay pending."""
+        job = await run_in_threadpool(self.store.get, job_id)
+        if job is None:
+            return None
+        if job["status"] in UNFINISHED:
+            await run_in_threadpool(self.store.set_status, job_id, "cancelled")
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+        return await self.status(job_id)
+
+    async def status(self, job_id: str) -> Optional[dict]:
+        """Returns a job with its URL counts, or None if it doesn't exist."""
+        job = await run_in_threadpool(self.store.get, job_id)
+        if job is None:
+            return None
+        progress = await run_in_threadpool(self.store.progress, job_id)
+        failures = await run_in_threadpool(self.store.failures, job_id)
+        return {
+            "id": job["id"],
+            "sitemap_url": job["sitemap_url"],
+            "status": job["status"],
+            "error": job["error"],
+            "total": sum(progress.values()) if job["discovered"] else None,
+            **progress,
+            "failures": failures,
+        }
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            task = asyncio.ensure_future(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                # wait() doesn't raise when the job alone is cancelled, so the worker survives it
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._running.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await run_in_threadpool(self.store.get, job_id)
+        if job is None or job["status"] not in UNFINISHED:
+            return
+        await run_in_threadpool(self.store.set_status, job_id, "running")
+        try:
+            if job["discovered"]:
+                pending = await run_in_threadpool(self.store.pending_urls, job_id)
+            else:
+                pending = self._discover(job_id, job)
+
+            async def record(result: dict):
+                await run_in_threadpool(self.store.record_result, job_id, result)
+
+            await self.ingestion_service.ingest_urls(pending, job["concurrency"], on_result=record)
+            await run_in_threadpool(self.store.set_status, job_id, "completed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error running ingestion job {job_id}: {e}")
+            await run_in_threadpool(self.store.set_status, job_id, "failed", str(e))
+
+    async def _discover(self, job_id: str, job: dict) -> AsyncIterator[str]:
+        """
+        Streams a job's sitemap, recording its URLs in batches and yielding
+        those not yet ingested, so ingestion starts while discovery goes on.
+        """
+        seen: Set[str] = set()
+        batch: List[str] = []
+
+        async def flush() -> List[str]:
+            pending = await run_in_threadpool(self.store.add_urls, job_id, batch)
+            batch.clear()
+            return pending
+
+        async for url in self.ingestion_service.iter_urls(job["sitemap_url"], job["filter_pattern"]):
+            if url in seen:
+                continue
+            seen.add(url)
+            batch.append(url)
+            if len(batch) >= DISCOVERY_BATCH_SIZE:
+                for pending in await flush():
+                    yield pending
+        for pending in await flush():
+            yield pending
+        await run_in_threadpool(self.store.mark_discovered, job_id)
+
+
+ingestion_jobs = IngestionJobQueue()
@@ -0,0 +1,180 @@
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Words too common to help ranking; dropping them keeps OR queries selective
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it of on or that the this
+to was what when where which who why will with you
+""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    rowid INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    source TEXT,
+    shard TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='rowid', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+"""
+
+
+def build_match_query(question: str) -> Optional[str]:
+    """
+    Turns a free-text question into an FTS5 query: every informative token
+    becomes a quoted phrase and the phrases are OR-ed together.
+
+    Quoting keeps tokens like `1.0.23` or `--dangerously-skip-permissions`
+    intact: the tokenizer splits them into consecutive terms and the phrase
+    only matches them in that exact order.
+    """
+    phrases = []
+    for token in re.findall(r"[\w][\w.\-/]*", question.lower()):
+        token = token.strip(".-/")
+        if not token or token in STOPWORDS:
+            continue
+        phrase = '"' + token.replace('"', '""') + '"'
+        if phrase not in phrases:
+            phrases.append(phrase)
+    return " OR ".join(phrases) or None
+
+
+class LexicalIndex:
+    """
+    Persistent BM25 keyword index over the stored chunks (SQLite FTS5).
+
+    It is kept alongside the Chroma collection by RAGService: chunks are added
+    when they are upserted and removed when they are deleted, so keyword hits
+    are looked up through the inverted index instead of scanning candidates.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Indexes created before collections were sharded
+            if "shard" not in {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}:
+                conn.execute("ALTER TABLE chunks ADD COLUMN shard TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_shard ON chunks(shard)")
+            self._conn = conn
+        return self._conn
+
+    def upsert(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        shards: Optional[List[str]] = None,
+    ):
+        """Adds chunks, replacing the text, source and shard of IDs that already exist."""
+        sources = [(m or {}).get("source") for m in metadatas] if metadatas else [None] * len(ids)
+        shards = shards or [""] * len(ids)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO chunks (chunk_id, source, shard, text) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(chunk_id) DO UPDATE
+                    SET source = excluded.source, shard = excluded.shard, text = excluded.text
+                    WHERE chunks.text != excluded.text OR chunks.source IS NOT excluded.source
+                        OR chunks.shard != excluded.shard
+                    """,
+                    zip(ids, sources, shards, texts),
+                )
+
+    def delete(self, ids: Iterable[str]):
+        """Removes chunks by ID."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", ((i,) for i in ids))
+
+    def delete_source(self, source: str):
+        """Removes every chunk of a source."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+
+    def delete_shard(self, shard: str):
+        """Removes every chunk of a shard."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE shard = ?", (shard,))
+
+    def clear(self):
+        """Removes every chunk."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM chunks")
+
+    def sources(self) -> List[str]:
+        """Every distinct source with chunks in the index."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT DISTINCT source FROM chunks WHERE source IS NOT NULL ORDER BY source"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(
+        self, question: str, limit: int = 50, shards: Optional[Sequence[str]] = None
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Returns (chunk_id, text, score) of the best keyword matches; higher
+        scores are better. `shards` limits the matches to those shards.
+        """
+        match = build_match_query(question)
+        if match is None or (shards is not None and not shards):
+            return []
+        shard_filter = ""
+        params: list = [match]
+        if shards is not None:
+            shard_filter = f"AND chunks.shard IN ({','.join('?' * len(shards))})"
+            params.extend(shards)
+        with self._lock:
+            rows = self._connection().execute(
+                f"""
+                SELECT chunks.chunk_id, chunks.text, bm25(chunks_fts) AS rank
+                FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid
+                WHERE chunks_fts MATCH ? {shard_filter}
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+        # SQLite's bm25() is negative, lower meaning more relevant
+        return [(chunk_id, text, -rank) for chunk_id, text, rank in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
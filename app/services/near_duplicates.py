@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set
+
+import numpy as np
+
+BITS = 64
+# Four 16-bit bands: by pigeonhole, signatures differing in at most 3 bits
+# share at least one band, so band lookups find every such near-duplicate
+BANDS = 4
+BAND_BITS = BITS // BANDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    chunk_id TEXT PRIMARY KEY,
+    source TEXT,
+    shard TEXT NOT NULL DEFAULT '',
+    simhash INTEGER NOT NULL,
+    band0 INTEGER NOT NULL,
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signatures_band0 ON signatures(band0);
+CREATE INDEX IF NOT EXISTS signatures_band1 ON signatures(band1);
+CREATE INDEX IF NOT EXISTS signatures_band2 ON signatures(band2);
+CREATE INDEX IF NOT EXISTS signatures_band3 ON signatures(band3);
+CREATE INDEX IF NOT EXISTS signatures_source ON signatures(source);
+"""
+
+WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Overlapping word n-grams of a text (the whole text if it is shorter)."""
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word shingles; similar texts differ in few bits."""
+    features = shingles(text)
+    if not features:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "little") for f in features],
+        dtype=np.uint64,
+    )
+    # One row of 64 bits per shingle; each bit votes +1 / -1
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    return int(np.packbits(votes > 0, bitorder="little").view(np.uint64)[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(signature: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(signature >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def _to_sql(signature: int) -> int:
+    # SQLite integers are signed 64-bit
+    return signature - (1 << BITS) if signature >= 1 << (BITS - 1) else signature
+
+
+def _from_sql(value: int) -> int:
+    return value + (1 << BITS) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """
+    Persistent SimHash signatures of stored chunks (SQLite), banded so that
+    near-duplicates of a new chunk are found with indexed lookups.
+
+    RAGService consults it before embedding crawled chunks and keeps it in
+    step with the collection as chunks are stored and deleted.
+    """
+
+    def __init__(self, path: str, max_distance: int = 3, min_words: int = 20):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for band lookups to be exhaustive")
+        self.path = path
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Signatures recorded before collections were sharded
+            if "shard" not in {row[1] for row in conn.execute("PRAGMA table_info(signatures)")}:
+                conn.execute("ALTER TABLE signatures ADD COLUMN shard TEXT NOT NULL DEFAULT ''")
+            self._conn = conn
+        return self._conn
+
+    def is_comparable(self, text: str) -> bool:
+        """Short chunks differ in too few shingles for SimHash to tell them apart reliably."""
+        return len(WORD.findall(text)) >= self.min_words
+
+    def _stored_match(self, signature: int, exclude: Set[str], shard: str) -> Optional[str]:
+        rows = self._connection().execute(
+            "SELECT chunk_id, simhash FROM signatures"
+            " WHERE (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?) AND shard = ?",
+            (*_bands(signature), shard),
+        ).fetchall()
+        for chunk_id, stored in rows:
+            if chunk_id not in exclude and hamming(signature, _from_sql(stored)) <= self.max_distance:
+                return chunk_id
+        return None
+
+    def filter(self, ids: List[str], texts: List[str], exclude: Iterable[str] = (), shard: str = "") -> List[int]:
+        """
+        Returns the positions of the chunks that are not near-duplicates of a
+        chunk stored in the same shard or of an earlier chunk in the list.
+        Stored chunks listed in `exclude` (e.g. about to be deleted) don't count.
+        """
+        exclude = set(exclude)
+        kept: List[int] = []
+        kept_signatures: List[int] = []
+        with self._lock:
+            for i, (cid, text) in enumerate(zip(ids, texts)):
+                if not self.is_comparable(text):
+                    kept.append(i)
+                    continue
+                signature = simhash(text)
+                if any(hamming(signature, other) <= self.max_distance for other in kept_signatures):
+                    continue
+                if self._stored_match(signature, exclude | {cid}, shard) is not None:
+                    continue
+                kept.append(i)
+                kept_signatures.append(signature)
+        return kept
+
+    def add(self, ids: List[str], texts: List[str], sources: List[Optional[str]], shard: str = ""):
+        """Records the signatures of chunks stored in a shard."""
+        rows = []
+        for cid, text, source in zip(ids, texts, sources):
+            if self.is_comparable(text):
+                signature = simhash(text)
+                rows.append((cid, source, shard, _to_sql(signature), *_bands(signature)))
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO signatures (chunk_id, source, shard, simhash, band0, band1, band2, band3)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("DELETE FROM signatures WHERE chunk_id = ?", ((i,) for i in ids))
+
+    def delete_source(self, source: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM signatures WHERE source = ?", (source,))
+
+    def delete_shard(self, shard: str):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM signatures WHERE shard = ?", (shard,))
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM signatures")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
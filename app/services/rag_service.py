@@ -1,78 +1,483 @@
+import asyncio
+import hashlib
+import json
 import os
-from typing import List
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from starlette.concurrency import run_in_threadpool
 
-from openai import AsyncOpenAI
+from app import config
+from app.services.batching import MicroBatcher
+from app.services.cache import TTLCache
+from app.services.chunking import chunk_markdown_text, iter_file_chunks
+from app.services.context_packing import PackedContext, estimate_tokens, pack_context
+from app.services.embedding_service import EmbeddingPipeline
+from app.services.lexical_index import LexicalIndex
+from app.services.metrics import (
+    CONTEXT_TOKENS,
+    EMBEDDING_BATCH_SIZE,
+    LLM_TOKENS,
+    NEAR_DUPLICATES_SKIPPED,
+    record_stage,
+    timed,
+)
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.reranking import create_reranker, plan_candidate_depth, rerank_window
+from app.services.sharding import BASE_SHARD, SHARD_SEPARATOR, collection_name, shard_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Names the live generation's base collection once a rebuild has switched to a new one
+ALIAS_FILE = "collection_alias.json"
+
+def chunk_id(chunk: str) -> str:
+    """Deterministic chunk ID based on the content hash, so re-indexing doesn't duplicate chunks."""
+    return hashlib.md5(chunk.encode()).hexdigest()
+
+@dataclass
+class ChangeLog:
+    """Sources written and chunk IDs deleted while a rebuild is running, to replay onto the new generation."""
+    sources: Set[str] = field(default_factory=set)
+    deleted_ids: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.sources or self.deleted_ids)
 
 class RAGService:
-    def __init__(self):
-        # Initialize ChromaDB client with persistence
-        self.client = chromadb.PersistentClient(path="./chroma_db")
-        
-        # Use a lightweight model for local embedding
-        self.model_name = "all-MiniLM-L6-v2"
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
-        
-        # Create or get a collection
-        self.collection = self.client.get_or_create_collection(
-            name="knowledge_base",
-            embedding_function=self.embedding_function
+    """
+    Retrieval and answer generation over the Chroma knowledge base.
+
+    Constructing the service is cheap: the Chroma client, the embedding model
+    and the OpenAI client are created on first use (or by warmup()), so
+    importing the app doesn't pay for them.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = config.CHROMA_PATH,
+        embedding_function=None,
+        openai_client: Optional["AsyncOpenAI"] = None,
+    ):
+        self.persist_directory = persist_directory
+        self.model_name = config.EMBEDDING_MODEL
+        self.llm_model = config.OPENAI_MODEL
+        self.context_token_budget = config.CONTEXT_TOKEN_BUDGET
+        self._client = None
+        self._collection_base: Optional[str] = None
+        self._collection = None
+        self._shards: Optional[Dict[str, object]] = None
+        # How chunks are partitioned into collections (SHARD_BY)
+        self.shard_by = config.SHARD_BY
+        shard_key(None, self.shard_by)
+        self._embedding_function = embedding_function
+        self._deferred_embedding_function = None
+        self._openai_client = openai_client
+        self._init_lock = threading.RLock()
+        self._warmup_task: Optional[asyncio.Task] = None
+        self.warmup_seconds: Optional[float] = None
+
+        # Explicit embedding stage: batches chunks across documents on a worker pool
+        self.embedder = EmbeddingPipeline(self._embed_texts, model_name=self.model_name)
+
+        # Concurrent searches are embedded and queried against Chroma together
+        self._query_batcher = MicroBatcher(
+            self._vector_search_batch,
+            max_batch_size=config.QUERY_BATCH_SIZE,
+            max_wait=config.QUERY_BATCH_WAIT,
         )
-        
-        # Initialize Async OpenAI Client (expects OPENAI_API_KEY in env)
-        self.openai_client = AsyncOpenAI()
 
-    async def load_and_chunk(self, file_path: str, chunk_size: int = 1000) -> List[str]:
+        # Keyword index maintained next to the collection for hybrid retrieval
+        self._lexical_index: Optional[LexicalIndex] = None
+
+        # SimHash signatures of crawled chunks, to skip near-copies before embedding
+        self._near_duplicates: Optional[NearDuplicateIndex] = None
+
+        # Pluggable re-ranking stage; candidate depth adapts to its measured cost
+        self.reranker = create_reranker()
+        self._retrieval_seconds = 0.0
+        self._count = 0
+        self._count_generation = -1
+
+        # Caches for repeated questions. Embeddings only depend on the model;
+        # retrieval results are dropped whenever the collection changes.
+        self.query_embedding_cache = TTLCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL, name="query_embeddings")
+        self.retrieval_cache = TTLCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL, name="retrieval")
+        self._collection_generation = 0
+
+        # Answers are keyed on the exact context, so they never need invalidating
+        self.answer_cache = TTLCache(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL, name="answers")
+        self._answers_in_flight: Dict[str, asyncio.Future] = {}
+
+        # Read by a running rebuild: it yields to searches and replays writes
+        self.searches_in_flight = 0
+        self.writes_in_flight = 0
+        self._changes: Optional[ChangeLog] = None
+
+    @property
+    def client(self):
+        """ChromaDB client with persistence, opened on first use."""
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=self.persist_directory)
+        return self._client
+
+    @property
+    def embedding_function(self):
+        """Local embedding model, loaded on first use."""
+        if self._embedding_function is None:
+            with self._init_lock:
+                if self._embedding_function is None:
+                    # Use a lightweight model for local embedding
+                    from chromadb.utils import embedding_functions
+                    self._embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        return self._embedding_function
+
+    @property
+    def _collection_embedding_function(self):
+        """
+        What the collections are opened with: the embedding function if one was
+        given or already loaded, otherwise a stand-in that loads the model when
+        it is first called (see DeferredSentenceTransformer).
+        """
+        if self._embedding_function is not None:
+            return self._embedding_function
+        if self._deferred_embedding_function is None:
+            with self._init_lock:
+                if self._deferred_embedding_function is None:
+                    from app.services.deferred_embedding import DeferredSentenceTransformer
+                    self._deferred_embedding_function = DeferredSentenceTransformer(
+                        lambda: self.embedding_function, self.model_name
+                    )
+        return self._deferred_embedding_function
+
+    @property
+    def collection_base(self) -> str:
+        """
+        Name of the live generation's base collection: COLLECTION_NAME until
+        a rebuild switches to a versioned one (see reindexing.py).
+        """
+        if self._collection_base is None:
+            with self._init_lock:
+                if self._collection_base is None:
+                    try:
+                        with open(os.path.join(self.persist_directory, ALIAS_FILE), "r", encoding="utf-8") as f:
+                            self._collection_base = json.load(f)["collection"]
+                    except (FileNotFoundError, ValueError, KeyError):
+                        self._collection_base = config.COLLECTION_NAME
+        return self._collection_base
+
+    def storage_path(self, filename: str) -> str:
+        """Path of a file kept alongside the generation's collections (keyword index, manifest...)."""
+        if self.collection_base == config.COLLECTION_NAME:
+            return os.path.join(self.persist_directory, filename)
+        return os.path.join(self.persist_directory, self.collection_base, filename)
+
+    @property
+    def collection(self):
+        """The base knowledge base collection (the only shard with SHARD_BY=none), created if needed."""
+        if self._collection is None:
+            with self._init_lock:
+                if self._collection is None:
+                    self._collection = self.client.get_or_create_collection(
+                        name=self.collection_base,
+                        embedding_function=self._collection_embedding_function
+                    )
+        return self._collection
+
+    @property
+    def shards(self) -> Dict[str, object]:
+        """Collections by shard key: the base collection plus every shard found on first use."""
+        if self._shards is None:
+            with self._init_lock:
+                if self._shards is None:
+                    shards = {BASE_SHARD: self.collection}
+                    prefix = self.collection_base + SHARD_SEPARATOR
+                    for listed in self.client.list_collections():
+                        key = (listed.metadata or {}).get("shard_key")
+                        if listed.name.startswith(prefix) and key:
+                            shards[key] = self.client.get_collection(
+                                listed.name, embedding_function=self._collection_embedding_function
+                            )
+                    self._shards = shards
+        return self._shards
+
+    def shard(self, key: str, create: bool = True):
+        """The collection of a shard, created on first write; None if it doesn't exist and `create` is False."""
+        collection = self.shards.get(key)
+        if collection is None and create:
+            with self._init_lock:
+                collection = self._shards.get(key)
+                if collection is None:
+                    collection = self.client.get_or_create_collection(
+                        name=collection_name(key, self.collection_base),
+                        embedding_function=self._collection_embedding_function,
+                        metadata={"shard_key": key},
+                    )
+                    self._shards[key] = collection
+        return collection
+
+    def shard_key_for(self, source: Optional[str]) -> str:
+        """The shard chunks of `source` are stored in."""
+        return shard_key(source, self.shard_by)
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """
+        BM25 index over the stored chunks, backfilled from the collection on
+        first use. That can take a while, so async code reads it in a worker thread.
+        """
+        if self._lexical_index is None:
+            with self._init_lock:
+                if self._lexical_index is None:
+                    path = self.storage_path("lexical_index.sqlite3")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    index = LexicalIndex(path)
+                    # Collections indexed before the keyword index existed
+                    if index.count() == 0 and any(c.count() > 0 for c in self.shards.values()):
+                        self._backfill_lexical_index(index)
+                    self._lexical_index = index
+        return self._lexical_index
+
+    @property
+    def near_duplicates(self) -> NearDuplicateIndex:
+        """Signature index of chunks stored through sync_source (crawled pages)."""
+        if self._near_duplicates is None:
+            with self._init_lock:
+                if self._near_duplicates is None:
+                    self._near_duplicates = NearDuplicateIndex(
+                        self.storage_path("near_duplicates.sqlite3"),
+                        max_distance=config.NEAR_DUP_MAX_DISTANCE,
+                        min_words=config.NEAR_DUP_MIN_WORDS,
+                    )
+        return self._near_duplicates
+
+    def _backfill_lexical_index(self, index: LexicalIndex, page_size: int = 1000):
+        for key, collection in self.shards.items():
+            offset = 0
+            while True:
+                page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+                if not page["ids"]:
+                    break
+                index.upsert(page["ids"], page["documents"], page["metadatas"], [key] * len(page["ids"]))
+                offset += len(page["ids"])
+
+    @property
+    def openai_client(self) -> "AsyncOpenAI":
+        """Async OpenAI client (expects OPENAI_API_KEY in env), created on first use."""
+        if self._openai_client is None:
+            from openai import AsyncOpenAI
+            self._openai_client = AsyncOpenAI()
+        return self._openai_client
+
+    @openai_client.setter
+    def openai_client(self, client: "AsyncOpenAI"):
+        self._openai_client = client
+
+    def _embed_texts(self, texts: List[str]):
+        """Encodes one embedding pipeline batch (thread executor) in a single forward pass."""
+        from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import (
+            SentenceTransformerEmbeddingFunction,
+        )
+
+        function = self.embedding_function
+        if not isinstance(function, SentenceTransformerEmbeddingFunction):
+            return function(texts)
+        # Calling the function would re-split the batch into the model's default batches of 32,
+        # so EMBEDDING_BATCH_SIZE would only hold with the process executor
+        return function._model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=function.normalize_embeddings,
+        )
+
+    @property
+    def is_ready(self) -> bool:
+        """True once the collection and the embedding model are loaded."""
+        return self._collection is not None and self._embedding_function is not None
+
+    def _warmup_sync(self):
+        started = time.perf_counter()
+        _ = self.shards
+        _ = self.lexical_index
+        # One forward pass allocates the model's buffers before real traffic arrives
+        self.embedding_function(["warmup"])
+        self.warmup_seconds = time.perf_counter() - started
+
+    async def ensure_loaded(self, model: bool = True):
+        """
+        Opens the collections and loads the embedding model in a worker thread
+        if that hasn't happened yet. Async code awaits this before using them,
+        so a first request without warmup doesn't block the event loop. Paths
+        that never embed text (writes with precomputed vectors) pass
+        `model=False` and only open the collections.
+        """
+        if self._shards is None or (model and self._embedding_function is None):
+            await run_in_threadpool(lambda: (self.shards, self.embedding_function if model else None))
+
+    async def warmup(self) -> float:
+        """Loads the Chroma collection and the embedding model; returns how long it took."""
+        if self.warmup_seconds is None:
+            await run_in_threadpool(self._warmup_sync)
+        return self.warmup_seconds
+
+    def start_warmup(self):
+        """Starts warmup in the background unless it already ran or is running."""
+        if self.warmup_seconds is not None:
+            return
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_task = asyncio.ensure_future(self.warmup())
+
+    def readiness(self) -> dict:
+        """Reports which components are loaded."""
+        warmup_error = None
+        if self._warmup_task is not None and self._warmup_task.done() and not self._warmup_task.cancelled():
+            error = self._warmup_task.exception()
+            warmup_error = str(error) if error else None
+        return {
+            "ready": self.is_ready,
+            "chroma": self._collection is not None,
+            "embedding_model": self._embedding_function is not None,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_error": warmup_error,
+        }
+
+    def close(self):
+        """Releases worker pools and the keyword index connection."""
+        self.embedder.close()
+        if self._lexical_index is not None:
+            self._lexical_index.close()
+        if self._near_duplicates is not None:
+            self._near_duplicates.close()
+
+    def _collection_changed(self):
+        """Invalidates everything derived from the collection's contents."""
+        self._collection_generation += 1
+        self.retrieval_cache.clear()
+
+    @contextmanager
+    def _writing(self, sources: Iterable[Optional[str]] = (), deleted_ids: Iterable[str] = ()):
+        """
+        Marks a write in progress. While a rebuild is running, the sources it
+        touched and the IDs it deleted are logged once it is done.
+        """
+        self.writes_in_flight += 1
+        try:
+            yield
+        finally:
+            self.writes_in_flight -= 1
+            if self._changes is not None:
+                self._changes.sources.update(source for source in sources if source)
+                self._changes.deleted_ids.update(deleted_ids)
+
+    def track_changes(self):
+        """Starts logging writes for a rebuild (see take_changes)."""
+        self._changes = ChangeLog()
+
+    def take_changes(self) -> ChangeLog:
+        """Returns the writes logged since the last call and starts a new log."""
+        changes = self._changes or ChangeLog()
+        self._changes = ChangeLog()
+        return changes
+
+    def stop_tracking(self):
+        self._changes = None
+
+    def for_generation(self, collection_base: str) -> "RAGService":
+        """
+        Another generation of this knowledge base, stored in `collection_base`
+        and its shards. It shares the Chroma client, the models and the
+        embedding workers with this service.
+        """
+        generation = RAGService(self.persist_directory, self.embedding_function, self._openai_client)
+        generation.embedder.close()
+        generation.embedder = self.embedder
+        generation._client = self.client
+        generation._collection_base = collection_base
+        generation.shard_by = self.shard_by
+        return generation
+
+    def switch_generation(self, generation: "RAGService") -> "RAGService":
+        """
+        Makes another generation live: it is recorded in the alias file and
+        the next search uses its collections and indexes. Nothing is awaited,
+        so no query or write sees a mix of both.
+
+        Returns the previous generation, to be dropped once searches that
+        started before the switch are done.
+        """
+        previous = self.for_generation(self.collection_base)
+        previous._collection, previous._shards = self._collection, self._shards
+        previous._lexical_index, previous._near_duplicates = self._lexical_index, self._near_duplicates
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        path = os.path.join(self.persist_directory, ALIAS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"collection": generation.collection_base, "switched_at": time.time()}, f)
+        os.replace(path + ".tmp", path)
+
+        self._collection_base = generation.collection_base
+        self._collection = generation.collection
+        self._shards = generation.shards
+        self._lexical_index = generation.lexical_index
+        self._near_duplicates = generation.near_duplicates
+        self._collection_changed()
+        return previous
+
+    def cache_stats(self) -> dict:
+        """Returns hit/miss counters of the query and answer caches."""
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
+
+    async def load_and_chunk(self, file_path: str, chunk_size: int = config.CHUNK_SIZE) -> List[str]:
         """Reads a text file and splits it into chunks."""
         return await run_in_threadpool(self._load_and_chunk_sync, file_path, chunk_size)
 
-    def _load_and_chunk_sync(self, file_path: str, chunk_size: int = 1000) -> List[str]:
+    def _load_and_chunk_sync(self, file_path: str, chunk_size: int = config.CHUNK_SIZE) -> List[str]:
         """Synchronous implementation of load_and_chunk."""
+        return list(self.iter_chunks(file_path, chunk_size))
+
+    def iter_chunks(self, file_path: str, chunk_size: int = config.CHUNK_SIZE) -> Iterator[str]:
+        """
+        Yields the chunks of a text file as they are read.
+
+        Markdown is split by headers, other text into fixed-size chunks;
+        only the chunk being built is held in memory.
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
-            
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-            
-        if file_path.endswith(".md"):
-            return self.chunk_markdown(text, chunk_size)
-            
-        # Simple chunking by characters for demonstration
-        chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-        return chunks
+        return iter_file_chunks(file_path, chunk_size)
+
+    async def iter_chunk_batches(
+        self,
+        file_path: str,
+        batch_size: int = config.EMBEDDING_BATCH_SIZE,
+    ) -> AsyncIterator[List[str]]:
+        """Chunks a file in a worker thread, handing over `batch_size` chunks at a time."""
+        chunks = self.iter_chunks(file_path)
+        try:
+            while True:
+                with timed("chunk"):
+                    batch = await run_in_threadpool(lambda: list(islice(chunks, batch_size)))
+                if not batch:
+                    break
+                yield batch
+        finally:
+            chunks.close()
 
     def chunk_markdown(self, text: str, chunk_size: int) -> List[str]:
         """Splits Markdown text by headers to preserve semantic context."""
-        import re
-        # Split by headers (capture the header so we can keep it)
-        # Matches lines starting with 1-6 # followed by a space
-        headers_pattern = r'(^#{1,6}\s.+)'
-        splits = re.split(headers_pattern, text, flags=re.MULTILINE)
-        
-        chunks = []
-        current_chunk = ""
-        
-        for split in splits:
-            if not split.strip():
-                continue
-                
-            # If the split is a header (starts with #), start a new chunk
-            if re.match(headers_pattern, split, flags=re.MULTILINE):
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = split
-            else:
-                current_chunk += "\n" + split
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-            
-        return chunks
-
-
+        return chunk_markdown_text(text, chunk_size)
 
     async def embed_and_store(self, chunks: List[str], metadatas: List[dict] = None):
         """Embeds chunks and stores them in ChromaDB."""
@@ -80,82 +485,526 @@ class RAGService:
             return
             
         # Generate deterministic IDs based on content hash to avoid duplicates
-        import hashlib
-        ids = [hashlib.md5(chunk.encode()).hexdigest() for chunk in chunks]
+        ids = [chunk_id(chunk) for chunk in chunks]
         
-        # ChromaDB handles embedding generation automatically if we provide the function
-        # Run in threadpool because upsert is blocking
-        await run_in_threadpool(
-            self.collection.upsert,
-            documents=chunks,
-            ids=ids,
-            metadatas=metadatas
+        # Embed explicitly so chunks from concurrent calls share large batches,
+        # then hand the precomputed vectors to Chroma
+        with timed("embed_chunks"):
+            embeddings = await self.embedder.embed(chunks)
+        await self.store_embedded(ids, chunks, metadatas, embeddings)
+
+    async def store_embedded(self, ids: List[str], chunks: List[str], metadatas: Optional[List[dict]], embeddings):
+        """
+        Stores chunks whose embeddings are already computed (e.g. loaded from a
+        snapshot). Doesn't load the embedding model.
+        """
+        if not chunks:
+            return
+        await self.ensure_loaded(model=False)
+        # Route each chunk to the shard of its source
+        keys = [self.shard_key_for((metadata or {}).get("source")) for metadata in metadatas or [None] * len(chunks)]
+        groups: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+
+        # Run in threadpool because upsert is blocking; shards are written concurrently
+        sources = [(metadata or {}).get("source") for metadata in metadatas or []]
+        with self._writing(sources), timed("upsert"):
+            # Shards are created on first write
+            collections = await run_in_threadpool(lambda: {key: self.shard(key) for key in groups})
+            await asyncio.gather(*(
+                run_in_threadpool(
+                    collections[key].upsert,
+                    documents=[chunks[i] for i in positions],
+                    ids=[ids[i] for i in positions],
+                    metadatas=[metadatas[i] for i in positions] if metadatas else None,
+                    embeddings=[embeddings[i] for i in positions],
+                )
+                for key, positions in groups.items()
+            ))
+            await run_in_threadpool(lambda: self.lexical_index.upsert(ids, chunks, metadatas, keys))
+        self._collection_changed()
+
+    async def delete_by_source(self, source: str):
+        """Deletes every chunk that was stored for a source."""
+        await self.ensure_loaded()
+        with self._writing([source]):
+            collection = self.shard(self.shard_key_for(source), create=False)
+            if collection is not None:
+                await run_in_threadpool(collection.delete, where={"source": source})
+            await run_in_threadpool(lambda: self.lexical_index.delete_source(source))
+            await run_in_threadpool(self.near_duplicates.delete_source, source)
+        self._collection_changed()
+
+    async def sync_source(self, source: str, chunks: List[str], metadatas: List[dict]) -> dict:
+        """
+        Makes the stored chunks of a source match `chunks`, touching only what changed.
+
+        Chunks whose content hash is already stored for the source are kept
+        (their metadata is refreshed if it differs), new chunks are embedded
+        and stored, and chunks that disappeared are deleted. With
+        NEAR_DUP_FILTER on, new chunks that are near-copies of stored ones
+        (shared headers, footers, navigation) are skipped.
+        """
+        await self.ensure_loaded()
+        with self._writing([source]):
+            return await self._sync_source(source, chunks, metadatas)
+
+    async def _sync_source(self, source: str, chunks: List[str], metadatas: List[dict]) -> dict:
+        key = self.shard_key_for(source)
+        collection = await run_in_threadpool(self.shard, key)
+        existing = await run_in_threadpool(
+            collection.get,
+            where={"source": source},
+            include=["metadatas"]
         )
+        existing_metadata = dict(zip(existing["ids"], existing["metadatas"]))
 
-    async def query(self, question: str, n_results: int = 3) -> List[dict]:
-        """Queries the knowledge base for relevant chunks."""
-        # Retrieve more chunks initially to allow for re-ranking
-        initial_n_results = 50
-        
-        # Run in threadpool because query is blocking
-        results = await run_in_threadpool(
-            self.collection.query,
-            query_texts=[question],
-            n_results=initial_n_results
+        # Identical chunks within one source collapse into one ID
+        new_chunks: Dict[str, tuple] = {}
+        for chunk, metadata in zip(chunks, metadatas):
+            new_chunks.setdefault(chunk_id(chunk), (chunk, metadata))
+
+        added = [cid for cid in new_chunks if cid not in existing_metadata]
+        refreshed = [
+            cid for cid in new_chunks
+            if cid in existing_metadata and existing_metadata[cid] != new_chunks[cid][1]
+        ]
+        removed = [cid for cid in existing_metadata if cid not in new_chunks]
+
+        skipped = 0
+        if added and config.NEAR_DUP_FILTER:
+            # This source's outgoing chunks mustn't shadow their own new versions
+            kept = await run_in_threadpool(
+                self.near_duplicates.filter,
+                added,
+                [new_chunks[cid][0] for cid in added],
+                removed,
+                key,
+            )
+            skipped = len(added) - len(kept)
+            added = [added[i] for i in kept]
+            NEAR_DUPLICATES_SKIPPED.inc(skipped)
+
+        # Store new chunks before deleting old ones so the source never disappears
+        if added:
+            await self.embed_and_store(
+                [new_chunks[cid][0] for cid in added],
+                [new_chunks[cid][1] for cid in added]
+            )
+            if config.NEAR_DUP_FILTER:
+                await run_in_threadpool(
+                    self.near_duplicates.add,
+                    added,
+                    [new_chunks[cid][0] for cid in added],
+                    [source] * len(added),
+                    key,
+                )
+        if refreshed:
+            await run_in_threadpool(
+                collection.update,
+                ids=refreshed,
+                metadatas=[new_chunks[cid][1] for cid in refreshed]
+            )
+        await self.delete_ids(removed, shard=key)
+
+        return {
+            "added": len(added),
+            "removed": len(removed),
+            "unchanged": len(new_chunks) - len(added) - skipped,
+            "near_duplicates": skipped,
+        }
+
+    async def delete_ids(self, ids: List[str], shard: Optional[str] = None):
+        """Deletes chunks by ID from one shard, or from all of them."""
+        if not ids:
+            return
+        await self.ensure_loaded()
+        collections = [self.shard(shard, create=False)] if shard is not None else list(self.shards.values())
+        with self._writing(deleted_ids=ids):
+            await asyncio.gather(*(
+                run_in_threadpool(collection.delete, ids=list(ids)) for collection in collections if collection is not None
+            ))
+            await run_in_threadpool(lambda: self.lexical_index.delete(ids))
+            await run_in_threadpool(self.near_duplicates.delete, ids)
+        self._collection_changed()
+
+    async def embed_query(self, question: str) -> List[float]:
+        """Embeds a question, reusing the embedding of identical earlier questions."""
+        embedding = self.query_embedding_cache.get(question)
+        if embedding is None:
+            await self.ensure_loaded()
+            embeddings = await run_in_threadpool(self.embedding_function, [question])
+            embedding = [float(x) for x in embeddings[0]]
+            self.query_embedding_cache.set(question, embedding)
+        return embedding
+
+    async def query(self, question: str, n_results: int = 3, shard: Optional[str] = None) -> List[dict]:
+        """
+        Queries the knowledge base for relevant chunks.
+
+        Each result has the chunk `id`, its `text`, a fused relevance `score`
+        (higher is better) and its embedding `distance` (lower is better; None
+        if only the keyword index found it). All shards are searched unless `shard`
+        names one.
+        """
+        return (await self.search(question, n_results, shard=shard))["results"]
+
+    async def search(
+        self,
+        question: str,
+        n_results: int = 3,
+        budget_ms: Optional[float] = None,
+        shard: Optional[str] = None,
+    ) -> dict:
+        """
+        Like query, but also returns how the latency budget was spent.
+
+        Returns `results`, per-stage `timings` in milliseconds and the
+        `candidates` retrieved / `reranked` counts chosen for the budget.
+        """
+        budget_ms = budget_ms or config.LATENCY_BUDGET_MS
+        started = time.perf_counter()
+        cache_key = (question, n_results, budget_ms, shard)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            timings = {"cache": (time.perf_counter() - started) * 1000}
+            record_stage("cache", timings["cache"] / 1000)
+            return {**cached, "results": [dict(r) for r in cached["results"]], "timings": timings}
+
+        await self.ensure_loaded()
+        # Results computed against an older collection must not be cached
+        generation = self._collection_generation
+        shards = None if shard is None else (shard,)
+        self.searches_in_flight += 1
+        try:
+            outcome = await self._search_uncached(question, n_results, budget_ms / 1000, shards)
+        finally:
+            self.searches_in_flight -= 1
+        if generation == self._collection_generation:
+            self.retrieval_cache.set(cache_key, {**outcome, "results": [dict(r) for r in outcome["results"]]})
+        for stage, ms in outcome["timings"].items():
+            record_stage("retrieval" if stage == "total" else stage, ms / 1000)
+        return outcome
+
+    async def _vector_search(
+        self, question: str, n_results: int, timings: Dict[str, float], shards: Optional[Tuple[str, ...]] = None
+    ) -> List[dict]:
+        """Nearest chunks by embedding distance over the given shards (all by default), closest first."""
+        started = time.perf_counter()
+        batch = await self._query_batcher.submit((question, n_results, shards))
+        # "embed" and "vector" are the shared batch's stages; the rest was queueing
+        timings["embed"] = batch["embed"]
+        timings["vector"] = (time.perf_counter() - started) * 1000 - batch["embed"]
+        return batch["hits"]
+
+    async def _vector_search_batch(self, requests: List[tuple]) -> List[dict]:
+        """
+        Runs the vector search of several concurrent queries at once.
+
+        Questions missing from the embedding cache go through the model in a
+        single forward pass. Then every shard is queried concurrently, once,
+        with all the questions that search it, at the deepest depth requested
+        from it. Each caller gets the closest hits across its shards.
+        """
+        started = time.perf_counter()
+        questions = list(dict.fromkeys(question for question, _, _ in requests))
+        embeddings = {question: self.query_embedding_cache.get(question) for question in questions}
+        missing = [question for question, embedding in embeddings.items() if embedding is None]
+        if missing:
+            EMBEDDING_BATCH_SIZE.observe(len(missing), kind="queries")
+            # Run in threadpool because the model call is blocking
+            for question, embedding in zip(missing, await run_in_threadpool(self.embedding_function, missing)):
+                embeddings[question] = [float(x) for x in embedding]
+                self.query_embedding_cache.set(question, embeddings[question])
+        embed_ms = (time.perf_counter() - started) * 1000
+
+        # Per shard: the questions searching it and the depth they need
+        plans: Dict[str, Dict[str, int]] = {}
+        for question, n_results, shards in requests:
+            for key in self.shards if shards is None else shards:
+                depths = plans.setdefault(key, {})
+                depths[question] = max(depths.get(question, 0), n_results)
+
+        async def query_shard(key: str, depths: Dict[str, int]) -> Dict[str, List[dict]]:
+            collection = self.shard(key, create=False)
+            if collection is None:
+                return {}
+            shard_questions = list(depths)
+            results = await run_in_threadpool(
+                collection.query,
+                query_embeddings=[embeddings[question] for question in shard_questions],
+                n_results=max(depths.values()),
+                include=["documents", "distances"]
+            )
+            # results['ids'], ['documents'] and ['distances'] hold one list per question
+            if not (results['documents'] and results['distances']):
+                return {}
+            return {
+                question: [
+                    {"id": cid, "text": doc, "distance": dist}
+                    for cid, doc, dist in zip(results['ids'][i], results['documents'][i], results['distances'][i])
+                ]
+                for i, question in enumerate(shard_questions)
+            }
+
+        keys = list(plans)
+        shard_hits = dict(zip(keys, await asyncio.gather(*(query_shard(key, plans[key]) for key in keys))))
+
+        batch = []
+        for question, n_results, shards in requests:
+            # Every shard uses the same embedding model, so distances compare across shards
+            merged: Dict[str, dict] = {}
+            for key in self.shards if shards is None else shards:
+                for hit in shard_hits.get(key, {}).get(question, []):
+                    if hit["id"] not in merged or hit["distance"] < merged[hit["id"]]["distance"]:
+                        merged[hit["id"]] = hit
+            hits = sorted(merged.values(), key=lambda hit: hit["distance"])[:n_results]
+            batch.append({"hits": hits, "embed": embed_ms})
+        return batch
+
+    async def _lexical_search(
+        self, question: str, n_results: int, timings: Dict[str, float], shards: Optional[Tuple[str, ...]] = None
+    ) -> List[dict]:
+        """Best BM25 keyword matches over the given shards (all by default), best first."""
+        if not config.HYBRID_SEARCH:
+            return []
+        started = time.perf_counter()
+        # The first use of lexical_index may backfill it from the whole collection: keep it off the loop
+        matches = await run_in_threadpool(lambda: self.lexical_index.search(question, n_results, shards))
+        timings["lexical"] = (time.perf_counter() - started) * 1000
+        return [{"id": cid, "text": text, "bm25": score} for cid, text, score in matches]
+
+    @staticmethod
+    def _fuse(ranked_lists: List[List[dict]], k: int) -> List[dict]:
+        """
+        Reciprocal rank fusion: each chunk scores sum(1 / (k + rank)) over the
+        lists it appears in, so chunks ranked well by both retrievers win.
+        Vector hits keep their embedding `distance` (None for keyword-only hits).
+        """
+        fused: Dict[str, dict] = {}
+        for ranked in ranked_lists:
+            for rank, item in enumerate(ranked, start=1):
+                entry = fused.setdefault(
+                    item["id"], {"id": item["id"], "text": item["text"], "score": 0.0, "distance": None}
+                )
+                entry["score"] += 1.0 / (k + rank)
+                if "distance" in item:
+                    entry["distance"] = item["distance"]
+        return sorted(fused.values(), key=lambda r: r["score"], reverse=True)
+
+    async def _collection_size(self) -> int:
+        """Number of stored chunks in all shards, counted once per collection change."""
+        generation = self._collection_generation
+        if self._count_generation != generation:
+            collections = list(self.shards.values())
+            self._count = sum(await run_in_threadpool(lambda: [c.count() for c in collections]))
+            self._count_generation = generation
+        return self._count
+
+    async def _search_uncached(
+        self,
+        question: str,
+        n_results: int,
+        budget_seconds: float,
+        shards: Optional[Tuple[str, ...]] = None,
+    ) -> dict:
+        """Retrieves candidates sized to the budget, fuses vector and keyword hits and re-ranks."""
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        # Retrieve more chunks than requested to allow for re-ranking
+        depth = plan_candidate_depth(
+            n_results,
+            budget_seconds,
+            self._retrieval_seconds,
+            self.reranker,
+            await self._collection_size(),
         )
-        
-        final_results = []
-        
-        # results['documents'] is a list of lists (one list per query)
-        # results['distances'] is also a list of lists
-        if results['documents'] and results['distances']:
-            documents = results['documents'][0]
-            distances = results['distances'][0]
-            
-            # Create a list of dictionaries
-            all_results = [
-                {"text": doc, "score": dist}
-                for doc, dist in zip(documents, distances)
-            ]
-            
-            # Re-ranking logic for version numbers
-            import re
-            version_match = re.search(r'(\d+\.\d+\.\d+)', question)
-            if version_match:
-                version = version_match.group(1)
-                relevant_chunks = []
-                other_chunks = []
-                
-                for res in all_results:
-                    # Prioritize chunks that contain the version number
-                    if version in res['text']:
-                        relevant_chunks.append(res)
-                    else:
-                        other_chunks.append(res)
-                
-                # Combine: relevant first, then others
-                final_results = relevant_chunks + other_chunks
-            else:
-                final_results = all_results
-            
-            # Slice to the requested number of results
-            return final_results[:n_results]
-            
-        return []
-
-    async def get_all_documents(self):
-        """Returns all documents in the collection."""
-        # get() with no arguments returns all items (up to a limit, usually)
-        return await run_in_threadpool(
-            self.collection.get,
-            include=["documents"]
+
+        vector_results, lexical_results = await asyncio.gather(
+            self._vector_search(question, depth, timings, shards),
+            self._lexical_search(question, depth, timings, shards),
         )
+        fuse_started = time.perf_counter()
+        candidates = self._fuse([vector_results, lexical_results], config.RRF_K)
+        timings["fuse"] = (time.perf_counter() - fuse_started) * 1000
 
-    async def generate_answer(self, question: str, context_chunks: List[str]) -> str:
-        """Generates an answer using OpenAI based on the context."""
-        if not context_chunks:
-            return "I don't have enough information to answer that."
-            
+        retrieval_seconds = time.perf_counter() - started
+        self._retrieval_seconds = 0.8 * self._retrieval_seconds + 0.2 * retrieval_seconds
+
+        # Re-rank only candidates that could still reach the top n. A budgeted
+        # reranker also stops at what the rest of the budget allows, but still
+        # sees the top n when retrieval used it all up
+        window = rerank_window(candidates, n_results) if self.reranker.windowed else len(candidates)
+        if self.reranker.budgeted and self.reranker.seconds_per_candidate > 0:
+            remaining = max(budget_seconds - retrieval_seconds, 0)
+            window = min(window, max(int(remaining / self.reranker.seconds_per_candidate), n_results))
+        if window > 1:
+            rerank_started = time.perf_counter()
+            candidates = self.reranker.timed_rerank(question, candidates[:window]) + candidates[window:]
+            timings["rerank"] = (time.perf_counter() - rerank_started) * 1000
+        else:
+            window = 0
+
+        timings["total"] = (time.perf_counter() - started) * 1000
+        return {
+            "results": candidates[:n_results],
+            "timings": timings,
+            "candidates": len(candidates),
+            "reranked": window,
+        }
+
+    async def get_source_metadata(self, source: str) -> Optional[dict]:
+        """Returns the metadata stored with one chunk of a source, or None if it isn't indexed."""
+        await self.ensure_loaded()
+        collection = self.shard(self.shard_key_for(source), create=False)
+        if collection is None:
+            return None
+        result = await run_in_threadpool(
+            collection.get,
+            where={"source": source},
+            limit=1,
+            include=["metadatas"]
+        )
+        if result["metadatas"]:
+            return result["metadatas"][0]
+        return None
+
+    async def get_documents(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        source: Optional[str] = None,
+        fields: Sequence[str] = ("documents", "metadatas"),
+    ) -> dict:
+        """
+        Returns one page of stored chunks.
+
+        Without a source, shards are paged through one after the other (in
+        shard key order). `next_offset` is the offset of the following page,
+        or None on the last page. It is a plain offset rather than a cursor:
+        every page counts the shards before it and skips that many chunks, so
+        deep pages take time linear in their offset. Use iter_documents to read
+        everything.
+        """
+        await self.ensure_loaded()
+        collections = self._document_collections(source)
+        items = await run_in_threadpool(self._get_page, collections, limit, offset, source, list(fields))
+
+        return {
+            "items": items,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + len(items) if len(items) == limit else None,
+        }
+
+    async def get_all_documents(
+        self,
+        source: Optional[str] = None,
+        fields: Sequence[str] = ("documents", "metadatas"),
+    ) -> dict:
+        """
+        Returns every stored chunk in the shape of Chroma's get():
+        {ids, documents, metadatas}, with the fields not asked for set to None.
+        """
+        result = {
+            "ids": [],
+            "documents": [] if "documents" in fields else None,
+            "metadatas": [] if "metadatas" in fields else None,
+        }
+        async for item in self.iter_documents(source=source, fields=fields):
+            result["ids"].append(item["id"])
+            if result["documents"] is not None:
+                result["documents"].append(item["document"])
+            if result["metadatas"] is not None:
+                result["metadatas"].append(item["metadata"])
+        return result
+
+    def _document_collections(self, source: Optional[str]) -> list:
+        """Collections get_documents and iter_documents read, in paging order."""
+        if source:
+            collection = self.shard(self.shard_key_for(source), create=False)
+            return [collection] if collection is not None else []
+        return [self.shards[key] for key in sorted(self.shards)]
+
+    @staticmethod
+    def _get_page(collections: list, limit: int, offset: int, source: Optional[str], fields: List[str]) -> List[dict]:
+        items: List[dict] = []
+        for collection in collections:
+            if len(items) >= limit:
+                break
+            if not source and len(collections) > 1:
+                # Skip whole shards that lie before the offset
+                size = collection.count()
+                if offset >= size:
+                    offset -= size
+                    continue
+            result = collection.get(
+                where={"source": source} if source else None,
+                limit=limit - len(items),
+                offset=offset,
+                include=fields
+            )
+            offset = 0
+            for i, item_id in enumerate(result["ids"]):
+                item = {"id": item_id}
+                if "documents" in fields:
+                    item["document"] = result["documents"][i]
+                if "metadatas" in fields:
+                    item["metadata"] = result["metadatas"][i]
+                items.append(item)
+        return items
+
+    async def iter_documents(
+        self,
+        page_size: int = 500,
+        offset: int = 0,
+        source: Optional[str] = None,
+        fields: Sequence[str] = ("documents", "metadatas"),
+    ) -> AsyncIterator[dict]:
+        """
+        Yields stored chunks one by one, reading the collections a page at a time.
+
+        Chunks come in the same order as get_documents pages them, but the
+        position in the current shard is carried from one page to the next:
+        the shards before `offset` are counted once, and later pages don't
+        skip them again.
+        """
+        await self.ensure_loaded()
+        collections = self._document_collections(source)
+        fields = list(fields)
+        for collection in collections:
+            if offset and not source and len(collections) > 1:
+                size = await run_in_threadpool(collection.count)
+                if offset >= size:
+                    offset -= size
+                    continue
+            while True:
+                items = await run_in_threadpool(self._get_page, [collection], page_size, offset, source, fields)
+                for item in items:
+                    yield item
+                offset += len(items)
+                if len(items) < page_size:
+                    break
+            offset = 0
+
+    def prepare_context(self, question: str, context_chunks: List[str]) -> PackedContext:
+        """
+        Deduplicates and trims retrieved chunks to the context token budget
+        (see pack_context), recording the tokens sent and saved.
+        """
+        if not config.CONTEXT_PACKING:
+            tokens = estimate_tokens("\n\n".join(context_chunks))
+            return PackedContext(chunks=list(context_chunks), tokens=tokens, original_tokens=tokens)
+        with timed("pack"):
+            packed = pack_context(question, context_chunks, self.context_token_budget)
+        CONTEXT_TOKENS.inc(packed.tokens, kind="packed")
+        CONTEXT_TOKENS.inc(packed.saved_tokens, kind="saved")
+        return packed
+
+    def _build_messages(self, question: str, context_chunks: List[str]) -> List[dict]:
+        """Builds the chat messages sent to the LLM."""
         context = "\n\n".join(context_chunks)
         
         prompt = f"""
@@ -170,32 +1019,187 @@ class RAGService:
         Question:
         {question}
         """
-        
+        return [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _answer_key(self, question: str, context_chunks: List[str]) -> str:
+        """Cache key for an answer: the model, the question and the hashes of the exact context chunks."""
+        digest = hashlib.sha256()
+        digest.update(self.llm_model.encode())
+        digest.update(b"\0" + question.encode())
+        for chunk in context_chunks:
+            digest.update(b"\0" + hashlib.md5(chunk.encode()).digest())
+        return digest.hexdigest()
+
+    async def generate_answer(self, question: str, context_chunks: List[str], pack: bool = True) -> str:
+        """
+        Generates an answer using OpenAI based on the context.
+
+        The context is packed with prepare_context first, unless `pack` is
+        False because the caller already did. Answers are cached per question
+        and packed context. Identical requests that arrive while a completion
+        is still running wait for that completion instead of starting their own.
+        """
+        if pack and context_chunks:
+            context_chunks = self.prepare_context(question, context_chunks).chunks
+        if not context_chunks:
+            return "I don't have enough information to answer that."
+
+        key = self._answer_key(question, context_chunks)
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            return cached
+
+        in_flight = self._answers_in_flight.get(key)
+        if in_flight is None or in_flight.get_loop() is not asyncio.get_running_loop():
+            in_flight = asyncio.ensure_future(self._complete_answer(key, question, context_chunks))
+            self._answers_in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._answers_in_flight.pop(key, None))
+
         try:
-            response = await self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-            )
-            return response.choices[0].message.content
+            # Shield the shared call so one caller disconnecting doesn't cancel it for the others
+            return await asyncio.shield(in_flight)
         except Exception as e:
             return f"Error generating answer: {str(e)}"
 
-    async def reset_database(self):
-        """Resets the database by deleting and recreating the collection."""
+    async def stream_answer(
+        self, question: str, context_chunks: List[str], pack: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Generates an answer like generate_answer, yielding text deltas as the LLM produces them.
+
+        Cached answers, and answers already being generated for an identical
+        request, are yielded in one piece.
+        """
+        if pack and context_chunks:
+            context_chunks = self.prepare_context(question, context_chunks).chunks
+        if not context_chunks:
+            yield "I don't have enough information to answer that."
+            return
+
+        key = self._answer_key(question, context_chunks)
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        in_flight = self._answers_in_flight.get(key)
+        if in_flight is not None and in_flight.get_loop() is asyncio.get_running_loop():
+            try:
+                yield await asyncio.shield(in_flight)
+            except Exception as e:
+                yield f"Error generating answer: {str(e)}"
+            return
+
+        parts = []
+        usage = None
+        started = time.perf_counter()
+        try:
+            stream = await self.openai_client.chat.completions.create(
+                model=self.llm_model,
+                messages=self._build_messages(question, context_chunks),
+                stream=True,
+            )
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        record_stage("llm_first_token", time.perf_counter() - started)
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            yield f"Error generating answer: {str(e)}"
+            return
+        finally:
+            record_stage("llm", time.perf_counter() - started)
+
+        # Without usage in the stream, count one token per content delta
+        self._count_tokens(usage, completion_tokens=len(parts))
+
+        self.answer_cache.set(key, "".join(parts))
+
+    async def _complete_answer(self, key: str, question: str, context_chunks: List[str]) -> str:
+        """Calls the chat completion API once and caches the answer."""
+        with timed("llm"):
+            response = await self.openai_client.chat.completions.create(
+                model=self.llm_model,
+                messages=self._build_messages(question, context_chunks),
+            )
+        self._count_tokens(response.usage)
+        answer = response.choices[0].message.content
+        self.answer_cache.set(key, answer)
+        return answer
+
+    @staticmethod
+    def _count_tokens(usage, completion_tokens: int = 0):
+        """Adds an LLM call's token usage to the metrics."""
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+            completion_tokens = usage.completion_tokens or 0
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+    async def list_shards(self) -> List[dict]:
+        """Returns every shard's key, collection name and chunk count."""
+        await self.ensure_loaded()
+        shards = sorted(self.shards.items())
+        counts = await run_in_threadpool(lambda: [collection.count() for _, collection in shards])
+        return [
+            {"key": key, "collection": collection.name, "count": count}
+            for (key, collection), count in zip(shards, counts)
+        ]
+
+    async def reset_database(self, shard: Optional[str] = None) -> bool:
+        """
+        Resets the database by deleting and recreating the collection.
+
+        With `shard`, only that shard's collection is dropped (and its
+        keyword and near-duplicate entries removed); the other shards are
+        left alone. Returns False if the shard doesn't exist.
+        """
+        await self.ensure_loaded()
+        if shard is not None:
+            if shard != BASE_SHARD:
+                collection = self.shard(shard, create=False)
+                if collection is None:
+                    return False
+                await run_in_threadpool(self.client.delete_collection, collection.name)
+                self._shards.pop(shard, None)
+            else:
+                await self._recreate_base_collection()
+            await run_in_threadpool(lambda: self.lexical_index.delete_shard(shard))
+            await run_in_threadpool(self.near_duplicates.delete_shard, shard)
+            self._collection_changed()
+            return True
+
+        for key, collection in list(self.shards.items()):
+            if key != BASE_SHARD:
+                await run_in_threadpool(self.client.delete_collection, collection.name)
+        await self._recreate_base_collection()
+        self._shards = {BASE_SHARD: self._collection}
+        await run_in_threadpool(lambda: self.lexical_index.clear())
+        await run_in_threadpool(self.near_duplicates.clear)
+        self._collection_changed()
+        return True
+
+    async def _recreate_base_collection(self):
         try:
-            await run_in_threadpool(self.client.delete_collection, "knowledge_base")
+            await run_in_threadpool(self.client.delete_collection, self.collection_base)
         except ValueError:
             # Collection might not exist
             pass
-            
-        self.collection = await run_in_threadpool(
+
+        self._collection = await run_in_threadpool(
             self.client.get_or_create_collection,
-            name="knowledge_base",
-            embedding_function=self.embedding_function
+            name=self.collection_base,
+            embedding_function=self._collection_embedding_function
         )
+        if self._shards is not None:
+            self._shards[BASE_SHARD] = self._collection
 
 # Singleton instance
 rag_service = RAGService()
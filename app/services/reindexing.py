@@ -0,0 +1,315 @@
+"""
+Blue/green rebuilds of the knowledge base.
+
+A rebuild fills a new generation - a versioned set of collections
+(`knowledge_base_v2`, `knowledge_base_v2__<shard>`) with its own keyword
+index, near-duplicate index and manifest - while searches keep using the live
+one. Writes made to the live generation meanwhile are logged and replayed onto
+the new one. Once it has caught up, RAGService.switch_generation makes it live
+in one step (recording it in the alias file), and the previous generation is
+dropped after REINDEX_GC_DELAY seconds.
+"""
+import asyncio
+import os
+import re
+import shutil
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.services.indexing_service import IndexingService
+from app.services.ingestion_service import IngestionService, ingestion_service
+from app.services.rag_service import RAGService, rag_service
+from app.services.sharding import SHARD_SEPARATOR
+
+# Files a generation keeps next to its collections (see RAGService.storage_path)
+STORAGE_FILES = ("lexical_index.sqlite3", "near_duplicates.sqlite3", "index_manifest.json")
+
+_VERSIONED = re.compile(re.escape(config.COLLECTION_NAME) + r"_v(\d+)$")
+
+
+class RebuildInProgress(Exception):
+    """Raised when a rebuild is requested while another one is running."""
+
+
+def next_generation(collection_base: str) -> str:
+    """Base collection name of the generation after `collection_base` (knowledge_base -> knowledge_base_v1)."""
+    match = _VERSIONED.match(collection_base)
+    return f"{config.COLLECTION_NAME}_v{int(match.group(1)) + 1 if match else 1}"
+
+
+def generation_of(name: str) -> Optional[str]:
+    """Base collection name of the generation a collection belongs to, if it is one of ours."""
+    base = name.split(SHARD_SEPARATOR, 1)[0]
+    if base == config.COLLECTION_NAME or _VERSIONED.match(base):
+        return base
+    return None
+
+
+class RebuildThrottle:
+    """
+    Paces a rebuild's embedding batches so queries keep their latency.
+
+    One batch runs at a time. After a batch that took t seconds the next one
+    waits t * (1 - duty_cycle) / duty_cycle, so the rebuild gets at most
+    `duty_cycle` of the embedding model. A batch also waits while searches are
+    in flight, for at most `max_pause` seconds so that the rebuild still
+    progresses under constant traffic.
+    """
+
+    def __init__(
+        self,
+        service: RAGService,
+        duty_cycle: float = config.REINDEX_DUTY_CYCLE,
+        max_pause: float = config.REINDEX_MAX_PAUSE,
+    ):
+        self.service = service
+        self.duty_cycle = min(1.0, max(0.01, duty_cycle))
+        self.max_pause = max(0.0, max_pause)
+        self.paused_seconds = 0.0
+        self._lock = asyncio.Lock()
+        self._resume_at = 0.0
+
+    @asynccontextmanager
+    async def batch(self):
+        async with self._lock:
+            started = time.perf_counter()
+            if self._resume_at > started:
+                await asyncio.sleep(self._resume_at - started)
+            deadline = time.perf_counter() + self.max_pause
+            while self.service.searches_in_flight and time.perf_counter() < deadline:
+                await asyncio.sleep(0.005)
+            began = time.perf_counter()
+            self.paused_seconds += began - started
+            try:
+                yield
+            finally:
+                busy = time.perf_counter() - began
+                self._resume_at = time.perf_counter() + busy * (1 - self.duty_cycle) / self.duty_cycle
+
+
+class ThrottledEmbedder:
+    """Stand-in for a generation's EmbeddingPipeline that runs every batch through a RebuildThrottle."""
+
+    def __init__(self, embedder, throttle: RebuildThrottle):
+        self.embedder = embedder
+        self.throttle = throttle
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        async with self.throttle.batch():
+            return await self.embedder.embed(texts)
+
+    def close(self):
+        # The workers belong to the live service
+        pass
+
+
+async def copy_source(live: RAGService, target: RAGService, source: str) -> int:
+    """Makes the chunks of a source in `target` match the live ones, re-embedding them; returns how many."""
+    await target.delete_by_source(source)
+    collection = live.shard(live.shard_key_for(source), create=False)
+    if collection is None:
+        return 0
+    page = await run_in_threadpool(collection.get, where={"source": source}, include=["documents", "metadatas"])
+    if not page["ids"]:
+        return 0
+    await target.embed_and_store(page["documents"], page["metadatas"])
+    # Crawled pages keep their near-duplicate signatures
+    if config.NEAR_DUP_FILTER and urlsplit(source).scheme in ("http", "https"):
+        await run_in_threadpool(
+            target.near_duplicates.add,
+            page["ids"],
+            page["documents"],
+            [source] * len(page["ids"]),
+            target.shard_key_for(source),
+        )
+    return len(page["ids"])
+
+
+async def drop_generation(generation: RAGService):
+    """Deletes a generation's collections, keyword and near-duplicate indexes and manifest."""
+    base = generation.collection_base
+    listed = await run_in_threadpool(generation.client.list_collections)
+    for collection in listed:
+        if generation_of(collection.name) == base:
+            await run_in_threadpool(generation.client.delete_collection, collection.name)
+
+    # Not generation.close(): the embedding workers are shared with the live service
+    for index in (generation._lexical_index, generation._near_duplicates):
+        if index is not None:
+            index.close()
+    if base != config.COLLECTION_NAME:
+        shutil.rmtree(os.path.join(generation.persist_directory, base), ignore_errors=True)
+        return
+    for filename in STORAGE_FILES:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(generation.storage_path(filename) + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class Reindexer:
+    """
+    Rebuilds the knowledge base into a new generation in the background.
+
+    Files of the data directory are chunked and embedded again; every other
+    source (crawled pages, imported snapshots) is copied from the live
+    generation and re-embedded, or crawled again with `recrawl` (falling back
+    to a copy when the page can't be fetched). Chunks stored without a source
+    are not carried over. Embedding goes through a RebuildThrottle, and
+    /rag/search keeps answering from the live generation until the switch.
+    """
+
+    def __init__(
+        self,
+        rag_service: RAGService = rag_service,
+        ingestion_service: IngestionService = ingestion_service,
+        gc_delay: float = config.REINDEX_GC_DELAY,
+        concurrency: int = config.INDEX_CONCURRENCY,
+    ):
+        self.rag_service = rag_service
+        self.ingestion_service = ingestion_service
+        self.gc_delay = gc_delay
+        self.concurrency = max(1, concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._active = False
+        self._status: dict = {"status": "idle"}
+
+    @property
+    def running(self) -> bool:
+        return self._active
+
+    def status(self) -> dict:
+        """State of the current or last rebuild."""
+        status = dict(self._status)
+        if self._active and "started_at" in status:
+            status["seconds"] = time.time() - status["started_at"]
+        return status
+
+    async def start(self, data_dir: str = "data", recrawl: bool = False) -> dict:
+        """Starts a rebuild in the background and returns its status."""
+        if self._active:
+            raise RebuildInProgress("A rebuild is already running")
+        self._task = asyncio.ensure_future(self.rebuild(data_dir, recrawl))
+        # Let it claim the rebuild before answering
+        await asyncio.sleep(0)
+        return self.status()
+
+    async def stop(self):
+        """Cancels a running rebuild; the live generation is left as it was."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def rebuild(
+        self,
+        data_dir: str = "data",
+        recrawl: bool = False,
+        throttle: Optional[RebuildThrottle] = None,
+    ) -> dict:
+        """Rebuilds the knowledge base into a new generation, switches to it and drops the old one."""
+        if self._active:
+            raise RebuildInProgress("A rebuild is already running")
+        self._active = True
+        live = self.rag_service
+        throttle = throttle or RebuildThrottle(live)
+        status = self._status = {"status": "building", "started_at": time.time(), "data_dir": data_dir}
+        target = None
+        try:
+            await live.ensure_loaded()
+            await self._drop_stale_generations()
+            target = live.for_generation(next_generation(live.collection_base))
+            target.embedder = ThrottledEmbedder(live.embedder, throttle)
+            status.update(generation=target.collection_base, previous_generation=live.collection_base)
+            live.track_changes()
+            try:
+                await self._fill(live, target, data_dir, recrawl, status)
+                status["status"] = "catching_up"
+                previous = await self._catch_up_and_switch(live, target, status)
+            finally:
+                live.stop_tracking()
+            target = None
+
+            status["status"] = "dropping_previous"
+            # Searches that started before the switch may still read the old collections
+            await asyncio.sleep(self.gc_delay)
+            await drop_generation(previous)
+            status["status"] = "completed"
+        except asyncio.CancelledError:
+            status["status"] = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Error rebuilding the knowledge base: {e}")
+            status.update(status="failed", error=str(e))
+            raise
+        finally:
+            if target is not None:
+                try:
+                    await drop_generation(target)
+                except Exception as e:
+                    print(f"Error dropping unfinished generation {target.collection_base}: {e}")
+            status.update(finished_at=time.time(), seconds=time.time() - status["started_at"])
+            status["paused_seconds"] = throttle.paused_seconds
+            self._active = False
+        return dict(status)
+
+    async def _fill(self, live: RAGService, target: RAGService, data_dir: str, recrawl: bool, status: dict):
+        files = set()
+        if os.path.isdir(data_dir):
+            summary = await IndexingService(target, concurrency=self.concurrency).index_directory(data_dir)
+            files = set(summary["indexed"])
+        status["files"] = len(files)
+
+        # lexical_index may backfill on first use, so it is resolved in the thread too
+        sources = await run_in_threadpool(lambda: live.lexical_index.sources())
+        sources = [source for source in sources if source not in files]
+        recrawled = set()
+        if recrawl:
+            urls = [source for source in sources if urlsplit(source).scheme in ("http", "https")]
+            ingestion = IngestionService(target, crawler=self.ingestion_service.crawler)
+            results = await ingestion.ingest_urls(urls, self.concurrency)
+            recrawled = {result["url"] for result in results if result["success"]}
+        status["recrawled"] = len(recrawled)
+
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def copy_one(source: str) -> int:
+            async with limit:
+                return await copy_source(live, target, source)
+
+        copied = await asyncio.gather(*(copy_one(source) for source in sources if source not in recrawled))
+        status["copied_sources"] = len(copied)
+        status["copied_chunks"] = sum(copied)
+
+    async def _catch_up_and_switch(self, live: RAGService, target: RAGService, status: dict) -> RAGService:
+        """Replays writes made to the live generation until none are pending, then switches in the same step."""
+        status["replayed_sources"] = 0
+        while True:
+            changes = live.take_changes()
+            if changes:
+                await target.delete_ids(sorted(changes.deleted_ids))
+                for source in sorted(changes.sources):
+                    await copy_source(live, target, source)
+                status["replayed_sources"] += len(changes.sources)
+                continue
+            if live.writes_in_flight:
+                await asyncio.sleep(0.05)
+                continue
+            # No await between the checks and the switch: no write can slip in
+            return live.switch_generation(target)
+
+    async def _drop_stale_generations(self):
+        """Drops generations left behind by a rebuild that was interrupted."""
+        live = self.rag_service
+        listed = await run_in_threadpool(live.client.list_collections)
+        stale = {generation_of(collection.name) for collection in listed} - {None, live.collection_base}
+        for base in sorted(stale):
+            await drop_generation(live.for_generation(base))
+
+
+reindexer = Reindexer()
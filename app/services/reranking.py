@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+from typing import List, Optional
+
+from app import config
+
+
+class Reranker:
+    """
+    Re-ranking stage applied to retrieved candidates.
+
+    Subclasses reorder candidates (dicts with at least `id`, `text`, `score`)
+    for a question. Every reranker tracks how long it takes per candidate so
+    RAGService can size the candidate pool to a latency budget.
+    """
+
+    name = "none"
+    # Model-based rerankers only need to see candidates close enough to the
+    # top n to overtake them (see rerank_window); rule-based ones see them all
+    windowed = False
+    # Model-based rerankers cost enough per candidate that the latency budget
+    # limits how many they score; rule-based ones always run
+    budgeted = False
+
+    def __init__(self, initial_seconds_per_candidate: float = 0.0):
+        self.seconds_per_candidate = initial_seconds_per_candidate
+
+    def rerank(self, question: str, candidates: List[dict]) -> List[dict]:
+        return candidates
+
+    def timed_rerank(self, question: str, candidates: List[dict]) -> List[dict]:
+        """Re-ranks and updates the per-candidate cost estimate (moving average)."""
+        if not candidates:
+            return candidates
+        started = time.perf_counter()
+        reranked = self.rerank(question, candidates)
+        cost = (time.perf_counter() - started) / len(candidates)
+        self.seconds_per_candidate = 0.8 * self.seconds_per_candidate + 0.2 * cost
+        return reranked
+
+
+class VersionBoostReranker(Reranker):
+    """Moves candidates containing the version number asked about (e.g. 1.0.23) to the front."""
+
+    name = "version"
+    version_pattern = re.compile(r'(\d+\.\d+\.\d+)')
+
+    def rerank(self, question: str, candidates: List[dict]) -> List[dict]:
+        version_match = self.version_pattern.search(question)
+        if not version_match:
+            return candidates
+        version = version_match.group(1)
+        relevant_chunks = [c for c in candidates if version in c["text"]]
+        other_chunks = [c for c in candidates if version not in c["text"]]
+        return relevant_chunks + other_chunks
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Scores (question, chunk) pairs with a cross-encoder on CPU.
+
+    All candidates are scored in a single batched forward pass; the version
+    boost is applied on top so exact version matches still come first.
+    """
+
+    name = "cross-encoder"
+    windowed = True
+    budgeted = True
+
+    def __init__(self, model_name: str = config.RERANK_MODEL):
+        # A MiniLM cross-encoder costs roughly a couple of ms per pair on CPU
+        super().__init__(initial_seconds_per_candidate=0.002)
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self._version_boost = VersionBoostReranker()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def rerank(self, question: str, candidates: List[dict]) -> List[dict]:
+        scores = self.model.predict(
+            [(question, c["text"]) for c in candidates],
+            batch_size=len(candidates),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        for candidate, score in zip(candidates, scores):
+            candidate["rerank_score"] = float(score)
+        ranked = sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)
+        return self._version_boost.rerank(question, ranked)
+
+
+RERANKERS = {
+    "none": Reranker,
+    "version": VersionBoostReranker,
+    "cross-encoder": CrossEncoderReranker,
+}
+
+
+def create_reranker(name: Optional[str] = None) -> Reranker:
+    """Builds the reranker configured by name (RERANKER setting by default)."""
+    name = name or config.RERANKER
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker {name!r}; expected one of {sorted(RERANKERS)}")
+    return RERANKERS[name]()
+
+
+def plan_candidate_depth(
+    n_results: int,
+    budget_seconds: float,
+    expected_retrieval_seconds: float,
+    reranker: Reranker,
+    collection_size: int,
+) -> int:
+    """
+    Number of candidates to retrieve for a query.
+
+    Starts from MAX_CANDIDATES, shrinks it to what the reranker can score in
+    the part of the budget retrieval doesn't use, and never goes below what
+    the caller asked for or above what the collection holds.
+    """
+    depth = config.MAX_CANDIDATES
+    remaining = budget_seconds - expected_retrieval_seconds
+    if reranker.seconds_per_candidate > 0:
+        depth = min(depth, int(max(remaining, 0) / reranker.seconds_per_candidate))
+    if expected_retrieval_seconds > budget_seconds > 0:
+        # Retrieval alone overruns the budget: fetch proportionally fewer candidates
+        depth = int(depth * budget_seconds / expected_retrieval_seconds)
+    depth = max(depth, config.MIN_CANDIDATES, n_results)
+    return max(1, min(depth, collection_size)) if collection_size else depth
+
+
+def rerank_window(candidates: List[dict], n_results: int, margin: float = config.RERANK_SPREAD_MARGIN) -> int:
+    """
+    How many of the (best-first) candidates are worth re-ranking.
+
+    Candidates scoring within `margin` (relative) of the n-th best could still
+    make the top n after re-ranking; when scores are well spread that is only
+    a handful, when they are flat it is the whole pool.
+    """
+    if len(candidates) <= n_results:
+        return len(candidates)
+    cutoff = candidates[n_results - 1]["score"] * (1 - margin)
+    window = n_results
+    while window < len(candidates) and candidates[window]["score"] >= cutoff:
+        window += 1
+    return window
@@ -0,0 +1,47 @@
+import hashlib
+import re
+from typing import Optional
+from urllib.parse import urlsplit
+
+from app import config
+
+# SHARD_BY values: one collection for everything, one per site, one per source
+SHARD_STRATEGIES = ("none", "domain", "source")
+# Shard of the base collection, and of sources without a domain under "domain"
+BASE_SHARD = ""
+LOCAL_SHARD = "local"
+# Shard collections are named <COLLECTION_NAME>__<slug>
+SHARD_SEPARATOR = "__"
+
+_UNSAFE = re.compile(r"[^a-zA-Z0-9._-]+")
+
+
+def shard_key(source: Optional[str], strategy: str) -> str:
+    """
+    The shard a chunk from `source` is stored in.
+
+    "domain" groups pages by host (`docs.example.com`) and puts files and
+    other sources without one in the `local` shard; "source" gives every
+    source its own shard; "none" keeps everything in the base collection.
+    """
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f"Unknown shard strategy {strategy!r}; expected one of {list(SHARD_STRATEGIES)}")
+    if strategy == "none" or not source:
+        return BASE_SHARD
+    if strategy == "domain":
+        return urlsplit(source).netloc.lower() or LOCAL_SHARD
+    return source
+
+
+def collection_name(key: str, base: str = config.COLLECTION_NAME) -> str:
+    """
+    Chroma collection name of a shard.
+
+    Keys are reduced to the characters Chroma accepts and suffixed with a
+    hash of the full key, so different keys never share a collection.
+    """
+    if key == BASE_SHARD:
+        return base
+    slug = _UNSAFE.sub("-", key).strip("-._")[:48]
+    digest = hashlib.md5(key.encode()).hexdigest()[:8]
+    return f"{base}{SHARD_SEPARATOR}{slug}-{digest}" if slug else f"{base}{SHARD_SEPARATOR}{digest}"
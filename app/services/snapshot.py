@@ -0,0 +1,324 @@
+"""
+Compact snapshots of the knowledge base, for bootstrapping replicas.
+
+A snapshot is one file:
+
+    bytes 0-4095   b"RAGSNAP1" + JSON header (space padded)
+    4096-...       embeddings: count x dimension little-endian float16, row-major
+    ...-EOF        records: one JSON object per line ({id, document, metadata, shard})
+
+Record i belongs to embedding row i. The embeddings block can be memory
+mapped, and importing stores the vectors directly, so the embedding model is
+never called.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.services.rag_service import RAGService
+
+MAGIC = b"RAGSNAP1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+DTYPE = np.dtype("<f2")
+# Largest difference between a live embedding and its float16 copy that still matches
+EMBEDDING_TOLERANCE = 1e-2
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is malformed or doesn't fit the target knowledge base."""
+
+
+def read_header(path: str) -> dict:
+    """Reads and checks the header of a snapshot file."""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+    if len(head) < HEADER_SIZE or not head.startswith(MAGIC):
+        raise SnapshotError(f"{path} is not a knowledge base snapshot")
+    try:
+        header = json.loads(head[len(MAGIC):].decode("utf-8"))
+    except ValueError as e:
+        raise SnapshotError(f"Corrupt snapshot header in {path}: {e}")
+    if header.get("version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {header.get('version')!r}")
+    return header
+
+
+def open_embeddings(path: str, header: dict) -> np.ndarray:
+    """Memory-maps the embeddings block (count x dimension float16)."""
+    if not header["count"]:
+        return np.zeros((0, header["dimension"]), dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode="r", offset=HEADER_SIZE, shape=(header["count"], header["dimension"]))
+
+
+def iter_records(path: str, header: dict) -> Iterator[dict]:
+    """Yields the snapshot's records in embedding row order."""
+    with open(path, "rb") as f:
+        f.seek(header["records_offset"])
+        for line in f:
+            yield json.loads(line)
+
+
+def check_integrity(path: str, header: dict) -> bool:
+    """True if the embeddings and records blocks match the checksums in the header."""
+    embeddings = hashlib.sha256()
+    records = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        remaining = header["records_offset"] - HEADER_SIZE
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                return False
+            embeddings.update(block)
+            remaining -= len(block)
+        for block in iter(lambda: f.read(1 << 20), b""):
+            records.update(block)
+    return embeddings.hexdigest() == header["embeddings_sha256"] and records.hexdigest() == header["records_sha256"]
+
+
+async def _record_batches(path: str, header: dict, batch_size: int):
+    """Yields (first row, records) batches, reading the file in a worker thread."""
+    records = iter_records(path, header)
+    row = 0
+    try:
+        while True:
+            batch = await run_in_threadpool(lambda: list(islice(records, batch_size)))
+            if not batch:
+                break
+            yield row, batch
+            row += len(batch)
+    finally:
+        records.close()
+
+
+async def export_snapshot(service: RAGService, path: str, page_size: int = 1000) -> dict:
+    """
+    Writes every shard of the knowledge base to a snapshot file and returns its header.
+
+    The collections are read a page at a time, so the knowledge base should
+    not be written to during the export. The file is written next to `path`
+    and moved into place once complete.
+    """
+    started = time.perf_counter()
+    tmp_path = path + ".tmp"
+    await service.ensure_loaded()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    try:
+        header = await _write_snapshot(service, tmp_path, page_size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+    return {**header, "seconds": time.perf_counter() - started}
+
+
+async def _write_snapshot(service: RAGService, tmp_path: str, page_size: int) -> dict:
+    embeddings_digest = hashlib.sha256()
+    records_digest = hashlib.sha256()
+    count = 0
+    dimension: Optional[int] = None
+    with open(tmp_path, "wb") as f, tempfile.TemporaryFile() as records:
+        f.write(b"\0" * HEADER_SIZE)
+        for key, collection in sorted(service.shards.items()):
+            offset = 0
+            while True:
+                page = await run_in_threadpool(
+                    collection.get,
+                    limit=page_size,
+                    offset=offset,
+                    include=["documents", "metadatas", "embeddings"],
+                )
+                if not page["ids"]:
+                    break
+                vectors = np.asarray(page["embeddings"], dtype=DTYPE)
+                if dimension is None:
+                    dimension = vectors.shape[1]
+                elif vectors.shape[1] != dimension:
+                    raise SnapshotError(f"Shard {key!r} has {vectors.shape[1]}-dimensional embeddings, not {dimension}")
+                data = np.ascontiguousarray(vectors).tobytes()
+                f.write(data)
+                embeddings_digest.update(data)
+                for cid, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    line = json.dumps(
+                        {"id": cid, "document": document, "metadata": metadata, "shard": key},
+                        ensure_ascii=False,
+                    ).encode("utf-8") + b"\n"
+                    records.write(line)
+                    records_digest.update(line)
+                count += len(page["ids"])
+                offset += len(page["ids"])
+
+        records_offset = f.tell()
+        records.seek(0)
+        shutil.copyfileobj(records, f)
+
+        header = {
+            "version": FORMAT_VERSION,
+            "created_at": time.time(),
+            "embedding_model": service.model_name,
+            "dimension": dimension or 0,
+            "dtype": "float16",
+            "count": count,
+            "shard_by": service.shard_by,
+            "records_offset": records_offset,
+            "embeddings_sha256": embeddings_digest.hexdigest(),
+            "records_sha256": records_digest.hexdigest(),
+        }
+        encoded = json.dumps(header).encode("utf-8")
+        if len(MAGIC) + len(encoded) > HEADER_SIZE:
+            raise SnapshotError("Snapshot header too large")
+        f.seek(0)
+        f.write(MAGIC + encoded.ljust(HEADER_SIZE - len(MAGIC), b" "))
+    return header
+
+
+async def import_snapshot(
+    service: RAGService,
+    path: str,
+    batch_size: int = 1000,
+    allow_other_model: bool = False,
+) -> dict:
+    """
+    Bulk-loads a snapshot into the knowledge base without calling the embedding model.
+
+    Chunks are routed to shards by the service's own SHARD_BY and upserted
+    with their stored vectors, so importing into a non-empty knowledge base
+    adds to it. Crawled pages get their near-duplicate signatures back (with
+    NEAR_DUP_FILTER on). Raises SnapshotError if the snapshot was made with
+    another embedding model, unless `allow_other_model`.
+    """
+    started = time.perf_counter()
+    header = await run_in_threadpool(read_header, path)
+    if header["embedding_model"] != service.model_name and not allow_other_model:
+        raise SnapshotError(
+            f"Snapshot embeddings come from {header['embedding_model']!r}, not {service.model_name!r}"
+        )
+    embeddings = open_embeddings(path, header)
+
+    imported = 0
+    async for row, batch in _record_batches(path, header, batch_size):
+        vectors = np.asarray(embeddings[row:row + len(batch)], dtype=np.float32)
+        await service.store_embedded(
+            [record["id"] for record in batch],
+            [record["document"] for record in batch],
+            [record["metadata"] for record in batch],
+            vectors,
+        )
+        if config.NEAR_DUP_FILTER:
+            await run_in_threadpool(_add_near_duplicate_signatures, service, batch)
+        imported += len(batch)
+
+    if imported != header["count"]:
+        raise SnapshotError(f"Snapshot holds {imported} records but its header says {header['count']}")
+    return {"imported": imported, "seconds": time.perf_counter() - started}
+
+
+def _add_near_duplicate_signatures(service: RAGService, records: List[dict]):
+    """Records the signatures sync_source would have kept for the crawled pages among `records`."""
+    by_shard: Dict[str, List[Tuple[dict, str]]] = {}
+    for record in records:
+        source = (record["metadata"] or {}).get("source")
+        if source and urlsplit(source).scheme in ("http", "https"):
+            by_shard.setdefault(service.shard_key_for(source), []).append((record, source))
+    for key, crawled in by_shard.items():
+        service.near_duplicates.add(
+            [record["id"] for record, _ in crawled],
+            [record["document"] for record, _ in crawled],
+            [source for _, source in crawled],
+            key,
+        )
+
+
+def _compare(records: List[dict], vectors: np.ndarray, live: dict) -> Tuple[int, int, float]:
+    """Counts records missing from / different in a live `collection.get` result."""
+    found = {
+        cid: (document, metadata, embedding)
+        for cid, document, metadata, embedding in zip(live["ids"], live["documents"], live["metadatas"], live["embeddings"])
+    }
+    missing = mismatched = 0
+    max_error = 0.0
+    for record, vector in zip(records, vectors):
+        if record["id"] not in found:
+            missing += 1
+            continue
+        document, metadata, embedding = found[record["id"]]
+        error = float(np.max(np.abs(np.asarray(embedding, dtype=np.float32) - vector))) if len(vector) else 0.0
+        max_error = max(max_error, error)
+        if document != record["document"] or metadata != record["metadata"] or error > EMBEDDING_TOLERANCE:
+            mismatched += 1
+    return missing, mismatched, max_error
+
+
+async def verify_snapshot(service: RAGService, path: str, batch_size: int = 1000) -> dict:
+    """
+    Checks a snapshot's checksums and compares it with the live knowledge base.
+
+    Reports records `missing` from the live collections, records whose text,
+    metadata or embedding differ (`mismatched`), and live chunks that are not
+    in the snapshot (`extra`). `ok` is True when they all are zero.
+    """
+    await service.ensure_loaded()
+    header = await run_in_threadpool(read_header, path)
+    intact = await run_in_threadpool(check_integrity, path, header)
+    embeddings = open_embeddings(path, header)
+
+    missing = mismatched = 0
+    max_error = 0.0
+    async for row, batch in _record_batches(path, header, batch_size):
+        vectors = np.asarray(embeddings[row:row + len(batch)], dtype=np.float32)
+        by_shard = {}
+        for position, record in enumerate(batch):
+            key = service.shard_key_for((record["metadata"] or {}).get("source"))
+            by_shard.setdefault(key, []).append(position)
+        for key, positions in by_shard.items():
+            records = [batch[i] for i in positions]
+            collection = service.shard(key, create=False)
+            if collection is None:
+                missing += len(records)
+                continue
+            live = await run_in_threadpool(
+                collection.get,
+                ids=[record["id"] for record in records],
+                include=["documents", "metadatas", "embeddings"],
+            )
+            shard_missing, shard_mismatched, shard_error = _compare(records, vectors[positions], live)
+            missing += shard_missing
+            mismatched += shard_mismatched
+            max_error = max(max_error, shard_error)
+
+    live_count = sum(await run_in_threadpool(lambda: [c.count() for c in service.shards.values()]))
+    extra = max(0, live_count - (header["count"] - missing))
+    return {
+        "ok": intact and missing == 0 and mismatched == 0 and extra == 0,
+        "intact": intact,
+        "count": header["count"],
+        "live_count": live_count,
+        "missing": missing,
+        "mismatched": mismatched,
+        "extra": extra,
+        "max_embedding_error": max_error,
+    }
+
+
+async def bootstrap_from_snapshot(service: RAGService, path: str) -> Optional[dict]:
+    """Imports a snapshot if the knowledge base is empty; returns the import stats, or None if skipped."""
+    if not os.path.exists(path):
+        return None
+    live_count = sum(await run_in_threadpool(lambda: [c.count() for c in service.shards.values()]))
+    if live_count:
+        return None
+    return await import_snapshot(service, path)
@@ -0,0 +1,122 @@
+"""
+Offline stand-ins for the external models, for tests and benchmarks.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from openai import AsyncOpenAI
+
+
+class FakeEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Deterministic bag-of-words embedding that needs no model download.
+
+    Each word is hashed into one of `dim` buckets and the counts are
+    L2-normalised, so texts sharing words end up close to each other.
+    """
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in re.findall(r"\w+", text.lower()):
+                bucket = int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % self.dim
+                vector[bucket] += 1.0
+            norm = np.linalg.norm(vector)
+            embeddings.append(vector / norm if norm else vector)
+        return embeddings
+
+    @staticmethod
+    def name() -> str:
+        return "fake_bag_of_words"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "FakeEmbeddingFunction":
+        return FakeEmbeddingFunction(dim=config["dim"])
+
+
+class StubOpenAI:
+    """
+    Local stand-in for the OpenAI chat completions API.
+
+    Serves `/v1/chat/completions` from an in-memory httpx transport, so the
+    real `AsyncOpenAI` client (and its request/response handling) is used
+    without any network access. Every call is recorded in `requests`.
+    """
+
+    def __init__(self, reply: str = "Stub answer.", delay: float = 0.0, status_code: int = 200):
+        self.reply = reply
+        self.delay = delay
+        self.status_code = status_code
+        self.requests: List[dict] = []
+        self.client = AsyncOpenAI(
+            api_key="sk-stub",
+            base_url="http://openai.stub/v1",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self._handle)),
+            max_retries=0,
+        )
+
+    @property
+    def calls(self) -> int:
+        return len(self.requests)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append(body)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status_code != 200:
+            return httpx.Response(self.status_code, json={
+                "error": {"message": "Stub failure", "type": "server_error", "code": None},
+            })
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=self._stream_events(body),
+            )
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-stub-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _stream_events(self, body: dict) -> bytes:
+        """Renders the reply as chat.completion.chunk events, one per word."""
+        words = re.findall(r"\S+\s*", self.reply)
+        events = []
+        for i, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-stub-{len(self.requests)}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": word} if i == 0 else {"content": word},
+                    "finish_reason": "stop" if i == len(words) - 1 else None,
+                }],
+            }
+            events.append(f"data: {json.dumps(chunk)}\n\n")
+        events.append("data: [DONE]\n\n")
+        return "".join(events).encode()
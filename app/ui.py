@@ -0,0 +1,49 @@
+"""
+Gradio chat UI, kept out of app.main so Gradio is only imported when the UI is enabled.
+"""
+from app.services.rag_service import rag_service
+
+
+def format_sources(results):
+    """Formats retrieved results as a Markdown list for the chat window."""
+    sources_text = "\n\n**Sources:**\n"
+    for i, res in enumerate(results):
+        score = res.get("score", 0)
+        text = res.get("text", "").strip()
+        # Truncate text if it's too long for display
+        display_text = text[:200] + "..." if len(text) > 200 else text
+        sources_text += f"{i+1}. (Relevance: {score:.4f}) {display_text}\n"
+    return sources_text
+
+async def predict(message, history):
+    """
+    Streams the answer to the user's message.
+
+    Runs retrieval and generation in-process on the event loop (no HTTP
+    round trip to the API), yielding the partial answer as tokens arrive,
+    then the answer with its sources.
+    """
+    try:
+        results = await rag_service.query(message)
+        context_chunks = [r["text"] for r in results]
+
+        answer = ""
+        async for token in rag_service.stream_answer(message, context_chunks):
+            answer += token
+            yield answer
+
+        yield (answer or "No answer found.") + format_sources(results)
+
+    except Exception as e:
+        yield f"An unexpected error occurred: {str(e)}"
+
+def mount_chat_ui(app, path: str = "/gradio"):
+    """Creates the Gradio Chat Interface and mounts it on the FastAPI app."""
+    import gradio as gr
+
+    demo = gr.ChatInterface(
+        fn=predict,
+        title="RAG Chatbot",
+        description="Ask questions about your knowledge base.",
+    )
+    return gr.mount_gradio_app(app, demo, path=path)
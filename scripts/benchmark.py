@@ -0,0 +1,291 @@
+"""
+Offline benchmarks for ingestion throughput and query latency.
+
+Everything runs against a throwaway Chroma directory with the deterministic
+fake embedding function and the stub OpenAI client from app.testing, on a
+synthetic changelog-like corpus, so numbers are comparable between runs and
+machines without network access or model downloads:
+
+    python scripts/benchmark.py --json bench.json              # run and save
+    python scripts/benchmark.py --sizes 1000,10000 --concurrency 1,8,32
+    python scripts/benchmark.py --json new.json --compare bench.json
+
+Measured:
+
+- `chunking`: streaming chunker throughput over the corpus files (MB/s, chunks/s)
+- `embed_and_store`: chunks embedded and written per second
+- `query`: `RAGService.query` latency percentiles (ms) and throughput for
+  every collection size x concurrency level
+- `search`: end-to-end `GET /rag/search` latency through the ASGI app
+
+`--compare` prints the relative change of every metric against an earlier
+run and exits with status 1 if a latency grew (or a throughput shrank) by
+more than `--threshold`.
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app's singleton service must use a scratch directory and no models
+SCRATCH = tempfile.mkdtemp(prefix="rag-bench-")
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+os.environ["CHROMA_PATH"] = os.path.join(SCRATCH, "app")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("ENABLE_GRADIO", "false")
+
+import numpy as np  # noqa: E402
+
+from app.services.chunking import iter_file_chunks  # noqa: E402
+from app.services.rag_service import RAGService  # noqa: E402
+from app.testing import FakeEmbeddingFunction, StubOpenAI  # noqa: E402
+
+WORDS = """
+agent api auth bash cache cli config context diff editor error file fix git hook
+image index install keybinding latency log mcp memory model network output
+permission plugin prompt proxy render request sandbox search server session
+settings shell startup status stream terminal theme token tool update vim window
+""".split()
+VERBS = ["Added", "Fixed", "Improved", "Removed", "Changed", "Reduced"]
+
+# Metrics where a bigger number is better; every other metric is a latency
+THROUGHPUT_SUFFIXES = ("_per_second", "qps")
+
+
+def make_corpus(n_entries: int, seed: int = 0) -> List[str]:
+    """Changelog-style Markdown sections: a version header and a few bullet points."""
+    rng = random.Random(seed)
+    sections = []
+    for i in range(n_entries):
+        version = f"{1 + i // 10_000}.{(i // 100) % 100}.{i % 100}"
+        bullets = [
+            f"- {rng.choice(VERBS)} {' '.join(rng.choices(WORDS, k=rng.randint(6, 18)))}"
+            for _ in range(rng.randint(2, 6))
+        ]
+        sections.append(f"## {version}\n\n" + "\n".join(bullets))
+    return sections
+
+
+def make_questions(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [f"how does the {' '.join(rng.choices(WORDS, k=3))} work" for _ in range(n)]
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def new_service(name: str) -> RAGService:
+    return RAGService(
+        persist_directory=os.path.join(SCRATCH, name),
+        embedding_function=FakeEmbeddingFunction(),
+        openai_client=StubOpenAI().client,
+    )
+
+
+def bench_chunking(sections: List[str], files: int = 8) -> dict:
+    """Writes the corpus to a few Markdown files and streams them through the chunker."""
+    directory = os.path.join(SCRATCH, "corpus")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"changelog_{i}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(sections[i::files]))
+        paths.append(path)
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+
+    started = time.perf_counter()
+    chunks = sum(1 for path in paths for _ in iter_file_chunks(path))
+    elapsed = time.perf_counter() - started
+    return {
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "mb_per_second": total_bytes / 1e6 / elapsed,
+        "chunks_per_second": chunks / elapsed,
+    }
+
+
+async def fill(service: RAGService, chunks: List[str], documents: int = 16) -> float:
+    """Stores chunks as several concurrent documents, like a sitemap ingest; returns the seconds taken."""
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        service.embed_and_store(chunks[i::documents], [{"source": f"doc-{i}"}] * len(chunks[i::documents]))
+        for i in range(documents)
+    ))
+    return time.perf_counter() - started
+
+
+async def bench_embed_and_store(chunks: List[str]) -> dict:
+    service = new_service("ingest")
+    try:
+        elapsed = await fill(service, chunks)
+    finally:
+        service.close()
+    return {"chunks": len(chunks), "seconds": elapsed, "chunks_per_second": len(chunks) / elapsed}
+
+
+async def run_queries(ask, questions: List[str], concurrency: int) -> dict:
+    """Runs every question with at most `concurrency` in flight; returns latency stats."""
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(question: str):
+        async with limit:
+            started = time.perf_counter()
+            await ask(question)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(question) for question in questions))
+    elapsed = time.perf_counter() - started
+    return {**percentiles(latencies), "qps": len(questions) / elapsed}
+
+
+async def bench_query(sections: List[str], sizes: List[int], levels: List[int], n_queries: int) -> dict:
+    results = {}
+    for size in sizes:
+        service = new_service(f"query-{size}")
+        try:
+            await fill(service, sections[:size])
+            for concurrency in levels:
+                # Fresh questions per run so the query caches don't hide the work
+                questions = make_questions(n_queries, seed=size * 1000 + concurrency)
+                results[f"n{size}_c{concurrency}"] = await run_queries(service.query, questions, concurrency)
+        finally:
+            service.close()
+    return results
+
+
+async def bench_search(sections: List[str], size: int, levels: List[int], n_queries: int) -> dict:
+    """End-to-end /rag/search through the ASGI app (retrieval, re-ranking and the stub LLM)."""
+    import httpx
+
+    from app.main import app
+    from app.services.rag_service import rag_service
+
+    rag_service._embedding_function = FakeEmbeddingFunction()
+    rag_service.openai_client = StubOpenAI().client
+    await fill(rag_service, sections[:size])
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def ask(question: str):
+            response = await client.get("/rag/search", params={"q": question})
+            response.raise_for_status()
+
+        for concurrency in levels:
+            questions = make_questions(n_queries, seed=concurrency + 7)
+            results[f"n{size}_c{concurrency}"] = await run_queries(ask, questions, concurrency)
+    rag_service.close()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, float):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Prints metric changes against a baseline run and returns the regressions."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for name in sorted(now.keys() & before.keys()):
+        if name.endswith(".seconds") or not before[name]:
+            continue
+        change = now[name] / before[name] - 1
+        higher_is_better = name.endswith(THROUGHPUT_SUFFIXES)
+        regressed = -change > threshold if higher_is_better else change > threshold
+        print(f"{name:>45}: {before[name]:10.3f} -> {now[name]:10.3f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args) -> dict:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    sections = make_corpus(max(sizes + [args.ingest]), seed=args.seed)
+
+    results = {"chunking": bench_chunking(sections[:args.ingest])}
+    results["embed_and_store"] = await bench_embed_and_store(sections[:args.ingest])
+    results["query"] = await bench_query(sections, sizes, levels, args.queries)
+    results["search"] = await bench_search(sections, max(sizes), levels, args.queries)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="collection sizes (chunks) for query latency")
+    parser.add_argument("--concurrency", default="1,8,32", help="concurrent queries in flight")
+    parser.add_argument("--queries", type=int, default=200, help="queries per size/concurrency pair")
+    parser.add_argument("--ingest", type=int, default=5000, help="chunks for the chunking and ingestion benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        },
+        "results": asyncio.run(run(args)),
+    }
+
+    for name, value in flatten(report["results"]).items():
+        print(f"{name:>45}: {value:.3f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline['meta'].get('commit')} ({args.compare}):")
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
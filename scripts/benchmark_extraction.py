@@ -0,0 +1,141 @@
+"""
+Compares the HTML text extractors used by the crawler on a saved corpus.
+
+    python scripts/benchmark_extraction.py                       # uses scripts/html_corpus/
+    python scripts/benchmark_extraction.py --fetch https://docs.example.com/a https://docs.example.com/b
+    python scripts/benchmark_extraction.py --json extraction.json
+
+The corpus is every *.html file in --corpus. `--fetch` downloads pages into
+it first, so later runs measure the same documents. When the corpus is empty,
+documentation-style pages (scripts, styles, navigation, sidebar, footer
+around the changelog in data/) are generated and saved there.
+
+For each extractor this reports pages/s, MB/s, the output size and how many
+Markdown headings survived extraction.
+"""
+import argparse
+import glob
+import html
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.extraction import EXTRACTORS  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(ROOT, "scripts", "html_corpus")
+
+
+def fetch(urls, corpus: str):
+    import httpx
+
+    os.makedirs(corpus, exist_ok=True)
+    with httpx.Client(follow_redirects=True, timeout=30) as client:
+        for url in urls:
+            response = client.get(url)
+            response.raise_for_status()
+            name = "".join(c if c.isalnum() else "_" for c in url.split("://", 1)[-1]).strip("_")[:120]
+            with open(os.path.join(corpus, name + ".html"), "wb") as f:
+                f.write(response.content)
+            print(f"saved {url} ({len(response.content)} bytes)")
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Just enough Markdown (headers, bullets, paragraphs) to build realistic pages."""
+    out, in_list = [], False
+    for line in markdown.splitlines():
+        if line.startswith("- ") and not in_list:
+            out.append("<ul>")
+            in_list = True
+        elif not line.startswith("- ") and in_list:
+            out.append("</ul>")
+            in_list = False
+        if line.startswith("#"):
+            level = min(len(line) - len(line.lstrip("#")), 6)
+            out.append(f"<h{level}>{html.escape(line.lstrip('#').strip())}</h{level}>")
+        elif line.startswith("- "):
+            out.append(f"<li><span class=\"bullet\">{html.escape(line[2:])}</span></li>")
+        elif line.strip():
+            out.append(f"<p>{html.escape(line)}</p>")
+    if in_list:
+        out.append("</ul>")
+    return "\n".join(out)
+
+
+def generate_corpus(corpus: str, copies=(1, 4, 16)):
+    with open(os.path.join(ROOT, "data", "claude_code_changelog.md"), "r", encoding="utf-8") as f:
+        body = markdown_to_html(f.read())
+    nav = "\n".join(f'<li><a href="/docs/page-{i}">Page {i}</a></li>' for i in range(300))
+    script = "<script>" + "window.__DATA__ = " + json.dumps({"items": list(range(5000))}) + ";</script>"
+    style = "<style>" + "\n".join(f".c{i} {{ margin: {i}px; }}" for i in range(2000)) + "</style>"
+
+    os.makedirs(corpus, exist_ok=True)
+    for n in copies:
+        page = (
+            f"<!doctype html><html><head><title>Changelog</title>{style}{script}</head><body>"
+            f'<header role="banner"><a href="/">Docs</a></header>'
+            f"<nav><ul>{nav}</ul></nav>"
+            f"<aside><h3>On this page</h3><ul>{nav[:5000]}</ul></aside>"
+            f"<main><article>{body * n}</article></main>"
+            f"<footer><p>Copyright</p>{script}</footer></body></html>"
+        )
+        with open(os.path.join(corpus, f"changelog_x{n}.html"), "w", encoding="utf-8") as f:
+            f.write(page)
+    print(f"generated {len(copies)} pages in {corpus}")
+
+
+def bench(pages, extract, repeat: int) -> dict:
+    total_bytes = sum(len(page) for page in pages)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        outputs = [extract(page) for page in pages]
+        best = min(best, time.perf_counter() - started)
+    return {
+        "seconds": best,
+        "pages_per_second": len(pages) / best,
+        "mb_per_second": total_bytes / 1e6 / best,
+        "output_chars": sum(len(text) for text in outputs),
+        "headings": sum(line.startswith("#") for text in outputs for line in text.splitlines()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="directory of saved .html pages")
+    parser.add_argument("--fetch", nargs="*", default=[], help="download these URLs into the corpus first")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per extractor; the fastest counts")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch(args.fetch, args.corpus)
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.html")))
+    if not paths:
+        generate_corpus(args.corpus)
+        paths = sorted(glob.glob(os.path.join(args.corpus, "*.html")))
+
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / 1e6:.2f} MB")
+
+    results = {name: bench(pages, extract, args.repeat) for name, extract in EXTRACTORS.items()}
+    for name, result in results.items():
+        print(
+            f"{name:>5}: {result['pages_per_second']:8.2f} pages/s {result['mb_per_second']:8.2f} MB/s"
+            f" {result['output_chars']:>10} chars {result['headings']:>6} headings"
+        )
+    print(f"speedup lxml/bs4: {results['bs4']['seconds'] / results['lxml']['seconds']:.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"pages": len(pages), "bytes": sum(map(len, pages)), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
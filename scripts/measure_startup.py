@@ -0,0 +1,79 @@
+"""
+Measures how long the API takes to import, start and warm up.
+
+Each phase runs in a fresh interpreter so module caches don't hide costs:
+
+    python scripts/measure_startup.py                 # human-readable
+    python scripts/measure_startup.py --json out.json # also write results
+    python scripts/measure_startup.py --no-warmup     # skip loading the model
+
+`import_seconds` is the cold `import app.main`; `startup_seconds` covers the
+FastAPI lifespan startup; `warmup_seconds` is the explicit model/Chroma load.
+`heavy_modules_at_import` lists expensive packages pulled in by the import,
+which should stay empty (apart from gradio when ENABLE_GRADIO is on).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "chromadb", "openai", "gradio"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    started_up = time.perf_counter()
+    result = {
+        "import_seconds": imported - started,
+        "startup_seconds": started_up - imported,
+        "heavy_modules_at_import": HEAVY,
+    }
+    if WARMUP:
+        result["warmup_seconds"] = client.post("/warmup").json()["warmup_seconds"]
+        result["ready_status"] = client.get("/ready").status_code
+print(json.dumps(result))
+"""
+
+
+def measure(warmup: bool) -> dict:
+    # Record heavy modules right after the import, before the lifespan runs
+    probe = PROBE.replace(
+        "imported = time.perf_counter()",
+        "imported = time.perf_counter()\nHEAVY = [m for m in %r if m in sys.modules]" % HEAVY_MODULES,
+    ).replace("WARMUP", repr(warmup))
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--no-warmup", action="store_true", help="don't load the embedding model")
+    args = parser.parse_args()
+
+    result = measure(warmup=not args.no_warmup)
+    result["enable_gradio"] = os.getenv("ENABLE_GRADIO", "true")
+
+    for key, value in result.items():
+        print(f"{key:>25}: {value:.3f}" if isinstance(value, float) else f"{key:>25}: {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Exports, imports and verifies knowledge base snapshots.
+
+    python scripts/snapshot.py export snapshots/kb.snap     # write every shard to a snapshot
+    python scripts/snapshot.py info snapshots/kb.snap       # print the header
+    python scripts/snapshot.py import snapshots/kb.snap     # bulk-load into CHROMA_PATH
+    python scripts/snapshot.py import snapshots/kb.snap --reset --verify
+    python scripts/snapshot.py verify snapshots/kb.snap     # compare with the live collections
+
+Snapshots hold chunk texts, metadata and float16 embeddings (see
+app/services/snapshot.py). Importing never loads the embedding model, so a
+new replica is ready as soon as the vectors are written. The same effect at
+startup: set SNAPSHOT_PATH and the API imports the snapshot when its
+knowledge base is empty.
+
+`verify` exits with status 1 if the snapshot is damaged or differs from the
+live knowledge base.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT, ".env"))
+
+from app.services.rag_service import rag_service  # noqa: E402
+from app.services.snapshot import export_snapshot, import_snapshot, read_header, verify_snapshot  # noqa: E402
+
+
+async def run(args) -> int:
+    if args.command == "info":
+        print(json.dumps(read_header(args.path), indent=2))
+        return 0
+
+    if args.command == "export":
+        header = await export_snapshot(rag_service, args.path, page_size=args.batch_size)
+        size = os.path.getsize(args.path)
+        print(f"exported {header['count']} chunks ({size / 1e6:.1f} MB) in {header['seconds']:.1f}s")
+        return 0
+
+    if args.command == "import":
+        if args.reset:
+            await rag_service.reset_database()
+        result = await import_snapshot(
+            rag_service, args.path, batch_size=args.batch_size, allow_other_model=args.allow_other_model
+        )
+        print(f"imported {result['imported']} chunks in {result['seconds']:.1f}s")
+        if not args.verify:
+            return 0
+
+    report = await verify_snapshot(rag_service, args.path, batch_size=args.batch_size)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import", "verify", "info"])
+    parser.add_argument("path", help="snapshot file")
+    parser.add_argument("--batch-size", type=int, default=1000, help="chunks read or written per batch")
+    parser.add_argument("--reset", action="store_true", help="import: empty the knowledge base first")
+    parser.add_argument("--verify", action="store_true", help="import: verify the result afterwards")
+    parser.add_argument(
+        "--allow-other-model", action="store_true", help="import: accept embeddings from another EMBEDDING_MODEL"
+    )
+    args = parser.parse_args()
+    try:
+        sys.exit(asyncio.run(run(args)))
+    finally:
+        rag_service.close()
+
+
+if __name__ == "__main__":
+    main()
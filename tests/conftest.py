@@ -0,0 +1,28 @@
+import pytest
+
+from app.services.rag_service import RAGService
+from app.testing import FakeEmbeddingFunction, StubOpenAI
+
+
+@pytest.fixture
+def stub():
+    return StubOpenAI()
+
+
+@pytest.fixture
+def make_service(stub):
+    """Builds RAGServices with the fake embedding function and the stub OpenAI client."""
+
+    def make(path, embedding_function=None) -> RAGService:
+        return RAGService(
+            persist_directory=str(path),
+            embedding_function=embedding_function or FakeEmbeddingFunction(),
+            openai_client=stub.client,
+        )
+
+    return make
+
+
+@pytest.fixture
+def service(make_service, tmp_path):
+    return make_service(tmp_path / "chroma")
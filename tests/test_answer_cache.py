@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.testing import StubOpenAI
+
+
+@pytest.fixture
+def stub():
+    return StubOpenAI(reply="Version 1.0.0 added hooks.", delay=0.05)
+
+
+def test_repeated_question_is_answered_from_cache(service, stub):
+    async def ask_twice():
+        first = await service.generate_answer("What changed?", ["## 1.0.0\nAdded hooks"])
+        second = await service.generate_answer("What changed?", ["## 1.0.0\nAdded hooks"])
+        return first, second
+
+    assert asyncio.run(ask_twice()) == ("Version 1.0.0 added hooks.", "Version 1.0.0 added hooks.")
+    assert stub.calls == 1
+    assert service.cache_stats()["answers"]["hits"] == 1
+
+
+def test_different_context_is_a_different_answer(service, stub):
+    async def ask():
+        await service.generate_answer("What changed?", ["## 1.0.0\nAdded hooks"])
+        await service.generate_answer("What changed?", ["## 1.0.1\nFixed hooks"])
+
+    asyncio.run(ask())
+    assert stub.calls == 2
+
+
+def test_concurrent_identical_requests_share_one_call(service, stub):
+    async def spike():
+        return await asyncio.gather(*(
+            service.generate_answer("What changed?", ["## 1.0.0\nAdded hooks"])
+            for _ in range(10)
+        ))
+
+    answers = asyncio.run(spike())
+    assert set(answers) == {"Version 1.0.0 added hooks."}
+    assert stub.calls == 1
+
+
+def test_failed_completions_are_not_cached(service, stub):
+    stub.status_code = 500
+
+    async def ask():
+        return await service.generate_answer("What changed?", ["## 1.0.0\nAdded hooks"])
+
+    assert asyncio.run(ask()).startswith("Error generating answer")
+    assert service.cache_stats()["answers"]["size"] == 0
+
+    stub.status_code = 200
+    assert asyncio.run(ask()) == "Version 1.0.0 added hooks."
@@ -0,0 +1,63 @@
+import io
+import tracemalloc
+
+import pytest
+
+from app.services.chunking import (
+    ChunkSplitter,
+    chunk_markdown_text,
+    iter_blocks,
+    iter_file_chunks,
+    iter_text_chunks,
+)
+
+
+def test_character_chunks_match_slicing_across_block_boundaries():
+    text = "".join(chr(ord("a") + i % 26) for i in range(10_007))
+    chunks = list(iter_text_chunks(iter_blocks(io.StringIO(text), block_size=333), size=1000, overlap=0, unit="chars"))
+    assert chunks == [text[i:i + 1000] for i in range(0, len(text), 1000)]
+
+
+def test_overlap_repeats_the_end_of_the_previous_chunk():
+    chunks = list(iter_text_chunks(["abcdefghij"], size=4, overlap=2, unit="chars"))
+    assert chunks == ["abcd", "cdef", "efgh", "ghij"]
+
+
+def test_token_chunks_do_not_split_words_across_feeds():
+    chunks = list(iter_text_chunks(["one two thr", "ee four five six"], size=2, overlap=1, unit="tokens"))
+    assert chunks == ["one two ", "two three ", "three four ", "four five ", "five six"]
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ChunkSplitter(10, overlap=10)
+    with pytest.raises(ValueError):
+        ChunkSplitter(10, unit="bytes")
+
+
+def test_markdown_sections_become_chunks():
+    text = "intro\n# A\nalpha\n## B\nbeta\n# C\n"
+    assert chunk_markdown_text(text, size=1000) == ["intro", "# A\n\nalpha", "## B\n\nbeta", "# C"]
+
+
+def test_oversized_markdown_sections_repeat_their_header():
+    text = "## 1.0.23\n" + "word " * 100
+    chunks = chunk_markdown_text(text, size=20, unit="tokens")
+    assert len(chunks) > 1
+    assert all(chunk.startswith("## 1.0.23\n\nword") for chunk in chunks)
+
+
+def test_streaming_a_large_file_keeps_memory_flat(tmp_path):
+    path = tmp_path / "changelog.md"
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(20_000):
+            f.write(f"## 1.0.{i}\n- fixed issue {i} in the editor\n- improved startup time\n\n")
+    assert path.stat().st_size > 1_000_000
+
+    tracemalloc.start()
+    count = sum(1 for _ in iter_file_chunks(str(path), size=1000))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == 20_000
+    assert peak < 500_000
@@ -0,0 +1,60 @@
+import asyncio
+
+from app.services.context_packing import estimate_tokens, pack_context
+
+OVERLAP = "Hooks can now block tool calls before they run."
+
+
+def test_small_context_is_only_normalised():
+    chunks = ["## 1.0.5\n\n-   Added   hooks   support.\n", "Fixed a crash when resuming a session."]
+    packed = pack_context("hooks", chunks, budget_tokens=1000)
+
+    assert packed.chunks == ["## 1.0.5\n- Added hooks support.", "Fixed a crash when resuming a session."]
+    assert packed.tokens < packed.original_tokens
+    assert packed.dropped_sentences == 0
+
+
+def test_overlapping_sentences_and_redundant_chunks_are_dropped():
+    chunks = [
+        f"## 1.0.5\nAdded the statusline command. {OVERLAP}",
+        f"{OVERLAP} Hook output is shown in the transcript.",
+        f"## 1.0.5\n{OVERLAP}",
+    ]
+    packed = pack_context("hooks", chunks, budget_tokens=1000)
+
+    assert packed.chunks == [
+        f"## 1.0.5\nAdded the statusline command. {OVERLAP}",
+        "Hook output is shown in the transcript.",
+    ]
+    assert (packed.dropped_chunks, packed.dropped_sentences) == (1, 2)
+
+
+def test_budget_keeps_the_sentences_about_the_question():
+    filler = " ".join(f"Improved startup performance in area {i}." for i in range(20))
+    chunks = [
+        f"## 1.0.7\n{filler} Added the --mcp-config flag for loading MCP servers. {filler}",
+        f"## 1.0.8\n{filler}",
+    ]
+    packed = pack_context("How do I load MCP servers from a config?", chunks, budget_tokens=40)
+
+    assert packed.chunks[0].startswith("## 1.0.7\n")
+    assert "--mcp-config flag" in packed.chunks[0]
+    assert packed.tokens <= 40
+    assert packed.saved_tokens == packed.original_tokens - packed.tokens
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("Added --verbose flag.") == 6
+
+
+def test_generate_answer_sends_packed_context(service, stub):
+    service.context_token_budget = 12
+    installer = " ".join(f"Installer detail number {i} changed." for i in range(20))
+    chunks = [f"{OVERLAP} {installer}", OVERLAP]
+
+    asyncio.run(service.generate_answer("Can hooks block tool calls?", chunks))
+
+    prompt = stub.requests[-1]["messages"][-1]["content"]
+    assert OVERLAP in prompt
+    assert prompt.count(OVERLAP) == 1
+    assert "Installer" not in prompt
@@ -0,0 +1,206 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from app.services.crawler import PageNotModified, WebCrawler
+
+PAGE = b"<html><head><script>var x = 1;</script></head><body>\n<h1>Title</h1>\n<p>Hello world</p>\n</body></html>"
+
+
+def make_crawler(handler) -> WebCrawler:
+    return WebCrawler(transport=httpx.MockTransport(handler))
+
+
+def test_crawl_extracts_text_and_validators():
+    def handler(request):
+        return httpx.Response(200, content=PAGE, headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+
+    page = asyncio.run(make_crawler(handler).crawl("http://example.com/page"))
+    assert page.text == "# Title\nHello world"
+    assert page.etag == '"v1"'
+    assert page.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_crawl_sends_validators_and_raises_on_304():
+    seen = {}
+
+    def handler(request):
+        seen.update(request.headers)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=PAGE)
+
+    crawler = make_crawler(handler)
+    with pytest.raises(PageNotModified):
+        asyncio.run(crawler.crawl("http://example.com/page", etag='"v1"', last_modified="yesterday"))
+    assert seen["if-modified-since"] == "yesterday"
+
+
+def test_crawl_returns_none_on_http_error():
+    page = asyncio.run(make_crawler(lambda request: httpx.Response(500)).crawl("http://example.com/page"))
+    assert page is None
+
+
+def test_per_host_connection_limit():
+    in_flight = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return httpx.Response(200, content=PAGE)
+
+    crawler = WebCrawler(max_connections_per_host=2, transport=httpx.MockTransport(handler))
+
+    async def crawl_many():
+        await asyncio.gather(*(crawler.crawl(f"http://example.com/{i}") for i in range(8)))
+
+    asyncio.run(crawl_many())
+    assert in_flight["peak"] == 2
+
+
+def test_get_sitemap_urls_follows_sitemap_index():
+    index = b"""<sitemapindex><sitemap><loc>http://example.com/a.xml</loc></sitemap></sitemapindex>"""
+    urlset = b"""<urlset><url><loc>http://example.com/page1</loc></url></urlset>"""
+
+    def handler(request):
+        return httpx.Response(200, content=index if request.url.path == "/sitemap.xml" else urlset)
+
+    urls = asyncio.run(make_crawler(handler).get_sitemap_urls("http://example.com/sitemap.xml"))
+    assert urls == ["http://example.com/page1"]
+
+
+def test_iter_sitemap_urls_streams_gzipped_nested_sitemaps():
+    ns = b' xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    index = b"<sitemapindex" + ns + b">" + b"".join(
+        b"<sitemap><loc>http://example.com/%d.xml.gz</loc></sitemap>" % i for i in range(3)
+    ) + b"<sitemap><loc>http://example.com/sitemap.xml</loc></sitemap></sitemapindex>"
+    in_flight = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        if request.url.path == "/sitemap.xml":
+            return httpx.Response(200, content=index)
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        n = request.url.path[1]
+        urlset = b"<urlset" + ns + b">" + b"".join(
+            b"<url><loc>http://example.com/%s/%d</loc><lastmod>2024-01-01</lastmod></url>" % (n.encode(), i)
+            for i in range(500)
+        ) + b"</urlset>"
+        return httpx.Response(200, content=gzip.compress(urlset), headers={"Content-Type": "application/x-gzip"})
+
+    async def collect():
+        return [url async for url in make_crawler(handler).iter_sitemap_urls("http://example.com/sitemap.xml")]
+
+    urls = asyncio.run(collect())
+    assert len(urls) == len(set(urls)) == 1500
+    assert "http://example.com/2/499" in urls
+    # The three nested sitemaps were fetched at once; the index listing itself wasn't read again
+    assert in_flight["peak"] == 3
+
+
+def test_iter_sitemap_urls_pauses_reading_while_the_consumer_is_slow():
+    served = {"chunks": 0}
+
+    async def body():
+        yield b"<urlset>"
+        for chunk in range(200):
+            served["chunks"] += 1
+            yield b"".join(b"<url><loc>http://example.com/%d/%d</loc></url>" % (chunk, i) for i in range(100))
+        yield b"</urlset>"
+
+    crawler = make_crawler(lambda request: httpx.Response(200, content=body()))
+
+    async def consume():
+        urls = crawler.iter_sitemap_urls("http://example.com/sitemap.xml", buffer_size=50)
+        first = await urls.__anext__()
+        await asyncio.sleep(0.1)
+        read_while_paused = served["chunks"]
+        rest = [url async for url in urls]
+        return first, read_while_paused, rest
+
+    first, read_while_paused, rest = asyncio.run(consume())
+    # 20,000 URLs in the sitemap, but reading stopped once 50 were waiting
+    assert first == "http://example.com/0/0"
+    assert read_while_paused <= 2
+    assert len(rest) == 19999
+
+
+def test_iter_sitemap_urls_skips_broken_sitemaps():
+    index = b"""<sitemapindex>
+        <sitemap><loc>http://example.com/missing.xml</loc></sitemap>
+        <sitemap><loc>http://example.com/bad.xml</loc></sitemap>
+        <sitemap><loc>http://example.com/good.xml</loc></sitemap>
+    </sitemapindex>"""
+
+    def handler(request):
+        path = request.url.path
+        if path == "/sitemap.xml":
+            return httpx.Response(200, content=index)
+        if path == "/bad.xml":
+            return httpx.Response(200, content=b"<urlset><url><loc>http://example.com/early</loc></url><url>")
+        if path == "/good.xml":
+            return httpx.Response(200, content=b"<urlset><url><loc>http://example.com/page</loc></url></urlset>")
+        return httpx.Response(404)
+
+    urls = asyncio.run(make_crawler(handler).get_sitemap_urls("http://example.com/sitemap.xml"))
+    # URLs parsed before a sitemap turned out to be truncated are kept
+    assert sorted(urls) == ["http://example.com/early", "http://example.com/page"]
+
+
+def test_lxml_extractor_drops_chrome_and_keeps_headings():
+    from app.services.extraction import extract_text
+
+    html = b"""
+    <html><body>
+      <nav><a href="/">Home</a> <a href="/docs">Docs</a></nav>
+      <main>
+        <h1>Hooks</h1>
+        <p>Hooks run <code>shell</code> commands.</p>
+        <h2>Events</h2>
+        <ul><li>PreToolUse</li><li>PostToolUse</li></ul>
+        <pre>{
+  "hooks": {}
+}</pre>
+      </main>
+      <footer>Copyright</footer>
+    </body></html>
+    """
+    assert extract_text(html) == (
+        '# Hooks\nHooks run shell commands.\n## Events\nPreToolUse\nPostToolUse\n{\n  "hooks": {}\n}'
+    )
+
+
+def test_lxml_extractor_keeps_pages_wrapped_in_a_form_and_asides():
+    from app.services.extraction import extract_text
+
+    # ASP.NET WebForms pages put the whole body inside one <form>
+    html = b"""
+    <html><body>
+      <form method="post" action="./hooks.aspx" id="form1">
+        <input type="hidden" name="__VIEWSTATE" value="dDwtMTA4MzE0MjEwNTs7Pg==" />
+        <h1>Hooks</h1>
+        <p>Hooks run shell commands.</p>
+        <aside class="note"><p>Note: hooks run with your permissions.</p></aside>
+        <label>Was this page helpful?</label>
+        <select name="rating"><option>Yes</option><option>No</option></select>
+        <textarea name="feedback">Tell us more</textarea>
+        <button type="submit">Send</button>
+      </form>
+    </body></html>
+    """
+    assert extract_text(html) == (
+        "# Hooks\nHooks run shell commands.\nNote: hooks run with your permissions.\nWas this page helpful?"
+    )
+
+
+def test_bs4_extractor_is_still_available():
+    crawler = WebCrawler(extractor="bs4")
+    assert crawler.extract_text(PAGE) == "Title\nHello world"
+    with pytest.raises(ValueError):
+        WebCrawler(extractor="regex")
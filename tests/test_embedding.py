@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.embedding_service import EmbeddingPipeline
+
+
+class RecordingEmbeddingFunction:
+    """Embeds a text as [len(text)] and records every batch it receives."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def test_embed_preserves_input_order():
+    ef = RecordingEmbeddingFunction()
+    pipeline = EmbeddingPipeline(ef, batch_size=2, workers=2, max_wait=0.001)
+    texts = ["ccc", "a", "bbbb", "dd", "eeeee"]
+
+    embeddings = asyncio.run(pipeline.embed(texts))
+
+    assert embeddings == [[3.0], [1.0], [4.0], [2.0], [5.0]]
+    pipeline.close()
+
+
+def test_batches_are_length_sorted_and_bounded():
+    ef = RecordingEmbeddingFunction()
+    pipeline = EmbeddingPipeline(ef, batch_size=2, workers=2, max_wait=0.001)
+
+    asyncio.run(pipeline.embed(["dddd", "a", "ccc", "bb"]))
+
+    assert sorted(ef.batches) == [["a", "bb"], ["ccc", "dddd"]]
+    pipeline.close()
+
+
+def test_concurrent_callers_share_batches():
+    ef = RecordingEmbeddingFunction()
+    pipeline = EmbeddingPipeline(ef, batch_size=8, workers=1, max_wait=0.05)
+
+    async def ingest_many_documents():
+        return await asyncio.gather(*(pipeline.embed([f"doc {i} chunk"]) for i in range(6)))
+
+    results = asyncio.run(ingest_many_documents())
+
+    assert [r[0][0] for r in results] == [float(len(f"doc {i} chunk")) for i in range(6)]
+    assert len(ef.batches) == 1
+    pipeline.close()
+
+
+def test_errors_reach_every_caller():
+    def broken(texts):
+        raise RuntimeError("model crashed")
+
+    pipeline = EmbeddingPipeline(broken, batch_size=4, workers=1, max_wait=0.001)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        asyncio.run(pipeline.embed(["a", "b"]))
+    pipeline.close()
+
+
+def test_thread_executor_encodes_each_batch_in_one_pass(make_service, tmp_path):
+    from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import (
+        SentenceTransformerEmbeddingFunction,
+    )
+
+    class RecordingModel:
+        def __init__(self):
+            self.batch_sizes = []
+
+        def encode(self, texts, batch_size=32, **kwargs):
+            self.batch_sizes.append(batch_size)
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+    # Chroma's function without loading a real model
+    ef = SentenceTransformerEmbeddingFunction.__new__(SentenceTransformerEmbeddingFunction)
+    ef.model_name, ef.device, ef.normalize_embeddings, ef.kwargs = "recorded", "cpu", False, {}
+    ef._model = RecordingModel()
+    service = make_service(tmp_path, ef)
+    service.embedder.batch_size = 100
+
+    chunks = [f"Chunk number {i} of the batch" for i in range(50)]
+    asyncio.run(service.embedder.embed(chunks))
+    assert ef._model.batch_sizes == [50]
+    service.close()
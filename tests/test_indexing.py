@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.services.indexing_service import IndexingService
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "data"
+    path.mkdir()
+    (path / "a.md").write_text("# A\nalpha section\n# Shared\nsame text in both files")
+    (path / "b.md").write_text("# B\nbeta section\n# Shared\nsame text in both files")
+    (path / "ignored.csv").write_text("not indexed")
+    return path
+
+
+def stored_documents(service):
+    return sorted(service.collection.get()["documents"])
+
+
+def test_first_run_indexes_every_file(service, data_dir):
+    summary = asyncio.run(IndexingService(service).index_directory(str(data_dir)))
+    assert [p.rsplit("/", 1)[-1] for p in summary["indexed"]] == ["a.md", "b.md"]
+    assert service.collection.count() == 3
+
+
+def test_noop_reindex_touches_nothing(service, data_dir):
+    indexer = IndexingService(service)
+    asyncio.run(indexer.index_directory(str(data_dir)))
+
+    summary = asyncio.run(indexer.index_directory(str(data_dir)))
+    assert summary["indexed"] == []
+    assert summary["chunks"] == 0
+    assert len(summary["unchanged"]) == 2
+
+
+def test_modified_and_deleted_files_are_synced(service, data_dir):
+    indexer = IndexingService(service)
+    asyncio.run(indexer.index_directory(str(data_dir)))
+
+    (data_dir / "a.md").write_text("# A\nalpha section, revised\n# Shared\nsame text in both files")
+    (data_dir / "b.md").unlink()
+    summary = asyncio.run(indexer.index_directory(str(data_dir)))
+
+    assert [p.rsplit("/", 1)[-1] for p in summary["indexed"]] == ["a.md"]
+    assert [p.rsplit("/", 1)[-1] for p in summary["removed"]] == ["b.md"]
+    documents = stored_documents(service)
+    assert len(documents) == 2
+    assert "alpha section, revised" in documents[0]
+    assert "same text in both files" in documents[1]
+
+
+def test_reset_invalidates_manifest(service, data_dir):
+    indexer = IndexingService(service)
+    asyncio.run(indexer.index_directory(str(data_dir)))
+    asyncio.run(service.reset_database())
+
+    summary = asyncio.run(indexer.index_directory(str(data_dir)))
+    assert len(summary["indexed"]) == 2
+    assert service.collection.count() == 3
+
+
+def test_modified_file_only_embeds_new_chunks(service, data_dir):
+    indexer = IndexingService(service)
+    asyncio.run(indexer.index_directory(str(data_dir)))
+
+    (data_dir / "a.md").write_text("# A\nalpha section, revised\n# Shared\nsame text in both files")
+    summary = asyncio.run(indexer.index_directory(str(data_dir)))
+    assert summary["chunks"] == 2
+    assert summary["embedded_chunks"] == 1
+
+
+def test_sync_source_only_touches_changed_chunks(service):
+    source = "http://example.com/page"
+    first = ["intro paragraph", "details paragraph", "footer paragraph"]
+    asyncio.run(service.sync_source(source, first, [{"source": source, "etag": "v1"}] * 3))
+
+    embedded = []
+    original_embed = service.embedder.embed
+
+    async def recording_embed(texts):
+        embedded.extend(texts)
+        return await original_embed(texts)
+
+    service.embedder.embed = recording_embed
+    second = ["intro paragraph", "details paragraph, updated", "footer paragraph"]
+    stats = asyncio.run(service.sync_source(source, second, [{"source": source, "etag": "v2"}] * 3))
+
+    assert stats == {"added": 1, "removed": 1, "unchanged": 2, "near_duplicates": 0}
+    assert embedded == ["details paragraph, updated"]
+    stored = service.collection.get(where={"source": source})
+    assert sorted(stored["documents"]) == sorted(second)
+    # Unchanged chunks get the new validators without being re-embedded
+    assert {m["etag"] for m in stored["metadatas"]} == {"v2"}
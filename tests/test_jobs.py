@@ -0,0 +1,147 @@
+import asyncio
+
+from app.services.jobs import IngestionJobQueue, JobQueueFull, JobStore
+
+
+class FakeIngestion:
+    """Ingests URLs instantly (or once `gate` is set); URLs containing 'broken' fail."""
+
+    def __init__(self, urls, gate=None):
+        self.urls = urls
+        self.gate = gate
+        self.ingested = []
+
+    async def iter_urls(self, sitemap_url, filter_pattern=None):
+        for url in self.urls:
+            if not filter_pattern or filter_pattern in url:
+                yield url
+
+    async def ingest_urls(self, urls, concurrency, on_result=None):
+        if not hasattr(urls, "__aiter__"):
+            urls = self._aiter(urls)
+        results = []
+        async for url in urls:
+            if self.gate is not None:
+                await self.gate.wait()
+            self.ingested.append(url)
+            result = {"url": url, "success": "broken" not in url, "error": "boom" if "broken" in url else None}
+            await on_result(result)
+            results.append(result)
+        return results
+
+    @staticmethod
+    async def _aiter(urls):
+        for url in urls:
+            yield url
+
+
+async def wait_for(jobs, job_id, *statuses):
+    for _ in range(200):
+        status = await jobs.status(job_id)
+        if status["status"] in statuses:
+            return status
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stayed {status['status']}")
+
+
+def test_job_runs_in_background_and_reports_progress(tmp_path):
+    ingestion = FakeIngestion(["http://x/a", "http://x/b", "http://x/broken"])
+    jobs = IngestionJobQueue(ingestion, JobStore(str(tmp_path / "jobs.sqlite3")))
+
+    async def run():
+        job_id = await jobs.submit("http://x/sitemap.xml")
+        status = await wait_for(jobs, job_id, "completed")
+        await jobs.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert status["total"] == 3
+    assert (status["done"], status["failed"], status["pending"]) == (2, 1, 0)
+    assert status["failures"] == [{"url": "http://x/broken", "error": "boom"}]
+
+
+def test_queue_limit_applies_backpressure(tmp_path):
+    gate = asyncio.Event()
+    jobs = IngestionJobQueue(FakeIngestion(["http://x/a"], gate), JobStore(str(tmp_path / "jobs.sqlite3")),
+                             workers=1, max_queued=1)
+
+    async def run():
+        first = await jobs.submit("http://x/1")
+        await wait_for(jobs, first, "running")
+        await jobs.submit("http://x/2")
+        try:
+            await jobs.submit("http://x/3")
+        except JobQueueFull:
+            return True
+        finally:
+            await jobs.stop()
+        return False
+
+    assert asyncio.run(run())
+
+
+def test_cancel_keeps_remaining_urls_pending(tmp_path):
+    gate = asyncio.Event()
+    ingestion = FakeIngestion(["http://x/a", "http://x/b"], gate)
+    jobs = IngestionJobQueue(ingestion, JobStore(str(tmp_path / "jobs.sqlite3")))
+
+    async def run():
+        job_id = await jobs.submit("http://x/sitemap.xml")
+        await wait_for(jobs, job_id, "running")
+        status = await jobs.cancel(job_id)
+        await jobs.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert status["status"] == "cancelled"
+    assert status["pending"] == 2
+    assert ingestion.ingested == []
+
+
+def test_unfinished_jobs_resume_with_pending_urls_only(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    job_id = store.create("http://x/sitemap.xml", None, 4)
+    store.add_urls(job_id, ["http://x/a", "http://x/b", "http://x/c"])
+    store.mark_discovered(job_id)
+    store.record_result(job_id, {"url": "http://x/a", "success": True, "error": None})
+    store.set_status(job_id, "running")
+    store.close()
+
+    # A new process: the job is picked up again on start
+    ingestion = FakeIngestion([])
+    jobs = IngestionJobQueue(ingestion, JobStore(path))
+
+    async def run():
+        await jobs.start()
+        status = await wait_for(jobs, job_id, "completed")
+        await jobs.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert ingestion.ingested == ["http://x/b", "http://x/c"]
+    assert status["done"] == 3
+
+
+def test_job_interrupted_during_discovery_reads_sitemap_again(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    job_id = store.create("http://x/sitemap.xml", None, 4)
+    # Stopped after the first URLs were found and one was ingested
+    assert store.add_urls(job_id, ["http://x/a", "http://x/b"]) == ["http://x/a", "http://x/b"]
+    store.record_result(job_id, {"url": "http://x/a", "success": True, "error": None})
+    store.set_status(job_id, "running")
+    store.close()
+
+    ingestion = FakeIngestion(["http://x/a", "http://x/b", "http://x/c", "http://x/b"])
+    jobs = IngestionJobQueue(ingestion, JobStore(path))
+
+    async def run():
+        await jobs.start()
+        status = await wait_for(jobs, job_id, "completed")
+        await jobs.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert ingestion.ingested == ["http://x/b", "http://x/c"]
+    assert (status["total"], status["done"]) == (3, 3)
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+from app.services.lexical_index import LexicalIndex, build_match_query
+
+
+def make_index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    index.upsert(
+        ["v1", "v2", "flag"],
+        [
+            "## 1.0.23\n- Fixed a crash when resuming sessions",
+            "## 1.0.24\n- Improved startup time",
+            "Use --dangerously-skip-permissions only in sandboxes",
+        ],
+        [{"source": "changelog"}, {"source": "changelog"}, {"source": "docs"}],
+    )
+    return index
+
+
+def test_match_query_quotes_tokens_and_drops_stopwords():
+    assert build_match_query("What is new in 1.0.23?") == '"new" OR "1.0.23"'
+    assert build_match_query("the of a") is None
+
+
+def test_exact_version_and_flag_lookup(tmp_path):
+    index = make_index(tmp_path)
+    assert [cid for cid, _, _ in index.search("what changed in 1.0.23")] == ["v1"]
+    assert [cid for cid, _, _ in index.search("--dangerously-skip-permissions")] == ["flag"]
+
+
+def test_deletes_keep_index_in_sync(tmp_path):
+    index = make_index(tmp_path)
+    index.delete(["v1"])
+    assert index.search("1.0.23") == []
+    index.delete_source("docs")
+    assert index.count() == 1
+    index.clear()
+    assert index.count() == 0
+
+
+def test_hybrid_query_finds_exact_version_outside_vector_candidates(service):
+    filler = [f"release notes entry {i} about improvements to the editor" for i in range(80)]
+    target = "## 2.3.17\n- Hooks now receive the session id"
+
+    async def run():
+        await service.embed_and_store(filler + [target], [{"source": "changelog"}] * 81)
+        return await service.query("release notes entry about improvements 2.3.17", n_results=3)
+
+    results = asyncio.run(run())
+    assert results[0]["text"] == target
+
+
+def test_backfill_of_an_existing_collection_runs_off_the_event_loop(service):
+    service.collection.add(ids=["v1"], documents=["## 1.0.23\n- Fixed a crash"], metadatas=[{"source": "changelog"}])
+    backfilled_on = []
+    backfill = service._backfill_lexical_index
+    service._backfill_lexical_index = lambda index: (backfilled_on.append(threading.current_thread()), backfill(index))
+
+    results = asyncio.run(service.query("1.0.23"))
+    assert results[0]["id"] == "v1"
+    assert backfilled_on and backfilled_on[0] is not threading.main_thread()
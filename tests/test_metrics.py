@@ -0,0 +1,51 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.metrics import Registry, ServerTimingMiddleware, timed
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("demo_requests_total", "Requests", ["status"])
+    latency = registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(status="200")
+    requests.inc(2, status="500")
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{status="500"} 2' in lines
+    assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in lines
+    assert "demo_seconds_count 2" in lines
+
+
+def test_metrics_endpoint_reports_search_stages():
+    client = TestClient(app)
+    client.post("/rag/index")
+    client.get("/rag/search", params={"q": "which stages are measured"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    for stage in ("vector", "lexical", "fuse", "retrieval", "llm"):
+        assert f'rag_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'rag_cache_requests_total{cache="retrieval",result="miss"}' in body
+
+
+def test_server_timing_header_lists_stages():
+    demo = FastAPI()
+    demo.add_middleware(ServerTimingMiddleware)
+
+    @demo.get("/")
+    async def handler():
+        with timed("work"):
+            pass
+        return {}
+
+    header = TestClient(demo).get("/").headers["server-timing"]
+    assert header.startswith("work;dur=")
+    assert "total;dur=" in header
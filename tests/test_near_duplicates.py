@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app import config
+from app.services.near_duplicates import NearDuplicateIndex, hamming, simhash
+
+FOOTER = (
+    "Acme Docs is maintained by the developer relations team. Found a mistake on this page? Open an issue on "
+    "GitHub or send a pull request with the fix. Join our community forum to ask questions, share what you have "
+    "built and get help from other developers. Subscribe to the newsletter for release announcements, migration "
+    "guides and security advisories. Copyright 2024 Acme Corporation. All rights reserved. Privacy policy, terms "
+    "of service and cookie settings."
+)
+EDITED_FOOTER = FOOTER.replace("GitHub", "GitLab")
+
+
+def article(topic: str) -> str:
+    return " ".join(f"{topic} paragraph {i} explains how {topic} behaves in practice" for i in range(12))
+
+
+@pytest.fixture(autouse=True)
+def near_dup_filter(monkeypatch):
+    monkeypatch.setattr(config, "NEAR_DUP_FILTER", True)
+
+
+def test_simhash_is_close_for_near_copies_only():
+    assert hamming(simhash(FOOTER), simhash(EDITED_FOOTER)) <= 3
+    assert hamming(simhash(FOOTER), simhash(article("hooks"))) > 10
+
+
+def test_filter_skips_stored_and_repeated_near_copies(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "sig.sqlite3"))
+    index.add(["footer"], [FOOTER], ["http://a"])
+
+    texts = [article("hooks"), EDITED_FOOTER, article("hooks") + " extra"]
+    assert index.filter(["1", "2", "3"], texts) == [0]
+    # Excluded signatures (chunks about to be deleted) don't count
+    assert index.filter(["2"], [texts[1]], exclude=["footer"]) == [0]
+
+
+def test_sync_source_skips_boilerplate_shared_between_pages(service):
+    async def ingest():
+        first = await service.sync_source("http://x/a", [article("hooks"), FOOTER], [{"source": "http://x/a"}] * 2)
+        second = await service.sync_source(
+            "http://x/b", [article("plugins"), EDITED_FOOTER], [{"source": "http://x/b"}] * 2
+        )
+        return first, second
+
+    first, second = asyncio.run(ingest())
+    assert first["added"] == 2
+    assert (second["added"], second["near_duplicates"]) == (1, 1)
+    assert service.collection.count() == 3
+
+
+def test_updated_page_is_not_shadowed_by_its_old_version(service):
+    async def ingest():
+        await service.sync_source("http://x/a", [article("hooks")], [{"source": "http://x/a"}])
+        return await service.sync_source("http://x/a", [article("hooks") + " now"], [{"source": "http://x/a"}])
+
+    result = asyncio.run(ingest())
+    assert (result["added"], result["removed"], result["near_duplicates"]) == (1, 1, 0)
@@ -1,9 +1,10 @@
+import httpx
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from app.main import app
 from app.services.rag_service import rag_service
-from app.services.crawler import WebCrawler
+from app.services.crawler import CrawledPage, WebCrawler
 
 client = TestClient(app)
 
@@ -12,7 +13,16 @@ def mock_crawler():
     # Patch WebCrawler in ingestion_service, not rag_service
     with patch("app.services.ingestion_service.WebCrawler") as MockCrawler:
         instance = MockCrawler.return_value
-        instance.crawl.return_value = "Mocked web content for testing."
+        instance.crawl = AsyncMock(
+            side_effect=lambda url, **kwargs: CrawledPage(url=url, text="Mocked web content for testing.")
+        )
+        instance.get_sitemap_urls = AsyncMock(return_value=[])
+
+        async def iter_sitemap_urls(sitemap_url):
+            for url in await instance.get_sitemap_urls(sitemap_url):
+                yield url
+
+        instance.iter_sitemap_urls = iter_sitemap_urls
         
         # We need to patch the instance on the ingestion_service singleton
         from app.services.ingestion_service import ingestion_service
@@ -25,15 +35,27 @@ def test_ingest_url(mock_crawler):
     response = client.post("/ingest/url", json={"url": "http://example.com"})
     assert response.status_code == 200
     assert "Successfully ingested" in response.json()["message"]
-    mock_crawler.crawl.assert_called_with("http://example.com")
+    mock_crawler.crawl.assert_called_with("http://example.com", etag=None, last_modified=None)
 
 def test_ingest_sitemap(mock_crawler):
     # We want to test the XML parsing logic in get_sitemap_urls, so we need a real WebCrawler instance
     # but we want to mock the network calls.
     from app.services.crawler import WebCrawler
     from app.services.ingestion_service import ingestion_service
-    
-    real_crawler = WebCrawler()
+
+    sitemap_xml = b"""
+        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+            <url>
+                <loc>http://example.com/page1</loc>
+            </url>
+            <url>
+                <loc>http://example.com/page2</loc>
+            </url>
+        </urlset>
+        """
+    # Serve the sitemap from an in-memory transport instead of the network
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=sitemap_xml))
+    real_crawler = WebCrawler(transport=transport)
     
     # Temporarily replace the crawler in the service with our real (but partially mocked) one
     # The fixture will restore the original mock after the test, but we should be careful.
@@ -50,27 +72,12 @@ def test_ingest_sitemap(mock_crawler):
     
     ingestion_service.crawler = real_crawler
 
-    # Mock requests.get to return XML content
-    with patch("requests.get") as mock_get:
-        mock_response = MagicMock()
-        mock_response.content = b"""
-        <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-            <url>
-                <loc>http://example.com/page1</loc>
-            </url>
-            <url>
-                <loc>http://example.com/page2</loc>
-            </url>
-        </urlset>
-        """
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-        
-        # We also need to mock crawl() because ingest_sitemap calls it
-        with patch.object(real_crawler, 'crawl', return_value="Mocked content"):
-            response = client.post("/ingest/sitemap", json={"sitemap_url": "http://example.com/sitemap.xml"})
-            assert response.status_code == 200
-            assert "Successfully ingested 2 URLs" in response.json()["message"]
+    # We also need to mock crawl() because ingest_sitemap calls it
+    crawl = AsyncMock(side_effect=lambda url, **kwargs: CrawledPage(url=url, text="Mocked content"))
+    with patch.object(real_crawler, 'crawl', crawl):
+        response = client.post("/ingest/sitemap", json={"sitemap_url": "http://example.com/sitemap.xml"})
+        assert response.status_code == 200
+        assert "Successfully ingested 2 URLs" in response.json()["message"]
 
 def test_ingest_sitemap_with_filter(mock_crawler):
     # Mock sitemap URLs
@@ -92,10 +99,10 @@ def test_ingest_sitemap_with_filter(mock_crawler):
     assert "Successfully ingested 1 URLs" in response.json()["message"]
     
     # Verify crawl was called only for the filtered URL
-    mock_crawler.crawl.assert_called_with("http://example.com/docs/en/page1")
+    mock_crawler.crawl.assert_called_with("http://example.com/docs/en/page1", etag=None, last_modified=None)
     
     with pytest.raises(AssertionError):
-        mock_crawler.crawl.assert_called_with("http://example.com/docs/ko/page1")
+        mock_crawler.crawl.assert_called_with("http://example.com/docs/ko/page1", etag=None, last_modified=None)
 
 def test_search_after_ingestion(mock_crawler):
     # Ingest data
@@ -109,3 +116,43 @@ def test_search_after_ingestion(mock_crawler):
     # but we can check if the request was successful.
     # To be more rigorous, we could mock the embedding/querying too, but this verifies the API wiring.
     assert isinstance(results, list)
+
+def test_ingest_sitemap_reports_per_url_results(mock_crawler):
+    mock_crawler.get_sitemap_urls.return_value = [
+        "http://example.com/ok",
+        "http://example.com/broken",
+    ]
+    mock_crawler.crawl.side_effect = (
+        lambda url, **kwargs: None if url.endswith("broken") else CrawledPage(url=url, text="Mocked content")
+    )
+
+    response = client.post("/ingest/sitemap", json={
+        "sitemap_url": "http://example.com/sitemap.xml",
+        "concurrency": 2,
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["succeeded"] == 1
+    assert data["failed"] == 1
+    by_url = {r["url"]: r for r in data["results"]}
+    assert by_url["http://example.com/ok"]["success"] is True
+    assert by_url["http://example.com/broken"]["success"] is False
+
+def test_sitemap_job_returns_immediately_and_completes(mock_crawler):
+    import time
+
+    mock_crawler.get_sitemap_urls.return_value = ["http://example.com/a", "http://example.com/b"]
+    mock_crawler.aclose = AsyncMock()
+    with TestClient(app) as background_client:
+        response = background_client.post("/ingest/jobs", json={"sitemap_url": "http://example.com/sitemap.xml"})
+        assert response.status_code == 202
+        status_url = response.json()["status_url"]
+
+        for _ in range(100):
+            status = background_client.get(status_url).json()
+            if status["status"] == "completed":
+                break
+            time.sleep(0.05)
+    assert status["status"] == "completed"
+    assert status["done"] == 2
+    assert client.get("/ingest/jobs/unknown").status_code == 404
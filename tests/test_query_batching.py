@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.testing import FakeEmbeddingFunction
+
+
+class CountingEmbeddingFunction(FakeEmbeddingFunction):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def __call__(self, input):
+        self.batches.append(list(input))
+        return super().__call__(input)
+
+
+@pytest.fixture
+def embedder():
+    return CountingEmbeddingFunction()
+
+
+@pytest.fixture
+def service(make_service, tmp_path, embedder):
+    service = make_service(tmp_path, embedder)
+    topics = ["hooks", "plugins", "themes", "sandbox", "telemetry", "keybindings", "memory", "agents"]
+    chunks = [f"## {topic}\nEverything about {topic} settings" for topic in topics]
+    asyncio.run(service.embed_and_store(chunks, [{"source": "docs"}] * len(chunks)))
+    embedder.batches.clear()
+    # A generous window keeps the tests independent of thread scheduling
+    service._query_batcher.max_wait = 0.2
+    return service
+
+
+def test_concurrent_searches_share_one_forward_pass(service, embedder):
+    topics = ["hooks", "plugins", "themes", "sandbox", "telemetry", "keybindings", "memory", "agents"]
+
+    async def burst():
+        return await asyncio.gather(*(service.query(f"{topic} settings", n_results=2) for topic in topics))
+
+    results = asyncio.run(burst())
+    assert len(embedder.batches) == 1
+    assert sorted(embedder.batches[0]) == sorted(f"{topic} settings" for topic in topics)
+    # Every caller still gets the results of its own question
+    for topic, hits in zip(topics, results):
+        assert len(hits) == 2
+        assert hits[0]["text"].startswith(f"## {topic}")
+
+
+def test_batched_queries_keep_their_own_depth(service):
+    async def burst():
+        return await asyncio.gather(
+            service._vector_search("hooks", 1, {}),
+            service._vector_search("themes", 5, {}),
+        )
+
+    shallow, deep = asyncio.run(burst())
+    assert len(shallow) == 1
+    assert len(deep) == 5
+
+
+def test_cached_query_embeddings_are_not_recomputed(service, embedder):
+    async def search_twice():
+        await service._vector_search("hooks", 3, {})
+        await asyncio.gather(service._vector_search("hooks", 3, {}), service._vector_search("themes", 3, {}))
+
+    asyncio.run(search_twice())
+    assert embedder.batches == [["hooks"], ["themes"]]
@@ -28,3 +28,108 @@ def test_rag_flow():
     results = response.json()["results"]
     assert len(results) > 0
     assert any("version" in r["text"] for r in results)
+
+def test_search_uses_retrieval_cache_until_collection_changes():
+    client.post("/rag/index")
+
+    before = client.get("/rag/cache/stats").json()["retrieval"]["hits"]
+    client.get("/rag/search?q=cached question")
+    client.get("/rag/search?q=cached question")
+    stats = client.get("/rag/cache/stats").json()
+    assert stats["retrieval"]["hits"] == before + 1
+
+    # Resetting changes the collection, so cached results are dropped
+    client.post("/rag/reset")
+    assert client.get("/rag/cache/stats").json()["retrieval"]["size"] == 0
+    client.post("/rag/index")
+
+def test_search_stream_sends_sources_then_tokens():
+    from app.testing import StubOpenAI
+
+    stub = StubOpenAI(reply="Claude Code streams answers.")
+    original_client = rag_service.openai_client
+    rag_service.openai_client = stub.client
+    try:
+        client.post("/rag/index")
+        with client.stream("GET", "/rag/search/stream", params={"q": "How are answers streamed?"}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+    finally:
+        rag_service.openai_client = original_client
+
+    events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+    assert events[0] == "event: sources"
+    assert events[-1] == "event: done"
+    assert events.count("event: token") == 4
+    assert stub.requests[0]["stream"] is True
+
+def test_inspect_paginates_and_filters():
+    client.post("/rag/index")
+    source = "data/claude_code_changelog.md"
+
+    first = client.get("/rag/inspect", params={"limit": 2, "source": source}).json()
+    assert len(first["items"]) == 2
+    assert first["next_offset"] == 2
+    assert all(item["metadata"]["source"] == source for item in first["items"])
+
+    second = client.get("/rag/inspect", params={"limit": 2, "offset": 2, "source": source, "fields": "metadatas"}).json()
+    assert "document" not in second["items"][0]
+    assert {item["id"] for item in second["items"]}.isdisjoint(item["id"] for item in first["items"])
+
+
+def test_inspect_without_paging_keeps_the_unpaged_shape():
+    client.post("/rag/index")
+    total = rag_service.collection.count()
+
+    data = client.get("/rag/inspect").json()
+    assert set(data) == {"ids", "documents", "metadatas"}
+    assert len(data["ids"]) == len(set(data["ids"])) == len(data["documents"]) == total
+
+    only_ids = client.get("/rag/inspect", params={"fields": "metadatas"}).json()
+    assert only_ids["documents"] is None and len(only_ids["metadatas"]) == total
+
+
+def test_inspect_ndjson_streams_every_chunk():
+    import json
+
+    client.post("/rag/index")
+    total = rag_service.collection.count()
+
+    response = client.get("/rag/inspect", params={"limit": 7, "format": "ndjson", "fields": "documents"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == total
+    assert len({line["id"] for line in lines}) == total
+
+def test_search_reports_stage_timings():
+    client.post("/rag/index")
+    response = client.get("/rag/search", params={"q": "timings per stage", "budget_ms": 500})
+    assert response.status_code == 200
+    data = response.json()
+    assert {"embed", "vector", "fuse", "total", "llm"} <= set(data["timings"])
+    assert data["candidates"] >= len(data["results"])
+    # score is the fused relevance (higher is better); distance stays the embedding distance
+    scores = [r["score"] for r in data["results"]]
+    assert scores == sorted(scores, reverse=True)
+    assert all(r["distance"] is None or r["distance"] >= 0 for r in data["results"])
+
+def test_chat_ui_streams_in_process():
+    import asyncio
+    from app.testing import StubOpenAI
+    from app.ui import predict
+
+    async def chat():
+        return [partial async for partial in predict("Does the chat window stream?", [])]
+
+    stub = StubOpenAI(reply="Answers are streamed.")
+    original_client = rag_service.openai_client
+    rag_service.openai_client = stub.client
+    try:
+        client.post("/rag/index")
+        outputs = asyncio.run(chat())
+    finally:
+        rag_service.openai_client = original_client
+
+    assert outputs[:3] == ["Answers ", "Answers are ", "Answers are streamed."]
+    assert outputs[-1].startswith("Answers are streamed.\n\n**Sources:**\n1. ")
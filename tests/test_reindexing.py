@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.indexing_service import IndexingService
+from app.services.reindexing import Reindexer, RebuildThrottle, next_generation
+
+PAGE = "https://docs.example.com/hooks"
+NEW_PAGE = "https://docs.example.com/statusline"
+
+
+@pytest.fixture
+def data_dir(tmp_path, service):
+    path = tmp_path / "data"
+    path.mkdir()
+    (path / "notes.md").write_text("# Notes\nThe old wording of the notes")
+
+    async def populate():
+        await IndexingService(service).index_directory(str(path))
+        await service.sync_source(PAGE, ["Hooks run shell commands on tool events."], [{"source": PAGE}])
+
+    asyncio.run(populate())
+    # Edited on disk after indexing: the rebuild reads the new version
+    (path / "notes.md").write_text("# Notes\nThe rewritten notes mention checkpoints")
+    return path
+
+
+def texts(service, question):
+    return [r["text"] for r in asyncio.run(service.query(question, n_results=5))]
+
+
+class GatedThrottle(RebuildThrottle):
+    """Holds the rebuild's first embedding batch until `gate` is set."""
+
+    def __init__(self, service):
+        super().__init__(service, duty_cycle=1.0, max_pause=0)
+        self.gate = asyncio.Event()
+        self.waiting = asyncio.Event()
+
+    @asynccontextmanager
+    async def batch(self):
+        self.waiting.set()
+        await self.gate.wait()
+        async with super().batch():
+            yield
+
+
+def test_next_generation_names():
+    assert next_generation("knowledge_base") == "knowledge_base_v1"
+    assert next_generation("knowledge_base_v1") == "knowledge_base_v2"
+
+
+def test_rebuild_switches_to_a_new_generation_and_drops_the_old_one(make_service, service, data_dir):
+    old_lexical_index = service.storage_path("lexical_index.sqlite3")
+    result = asyncio.run(Reindexer(service, gc_delay=0).rebuild(str(data_dir)))
+
+    assert (result["status"], result["generation"], result["files"], result["copied_sources"]) == (
+        "completed", "knowledge_base_v1", 1, 1,
+    )
+    assert service.collection_base == "knowledge_base_v1"
+    assert [c.name for c in service.client.list_collections()] == ["knowledge_base_v1"]
+    assert not os.path.exists(old_lexical_index)
+    assert any("checkpoints" in text for text in texts(service, "checkpoints in the notes"))
+    assert not any("old wording" in text for text in texts(service, "old wording of the notes"))
+    assert any("Hooks" in text for text in texts(service, "shell commands for hooks"))
+
+    # A restarted process follows the alias to the same generation
+    restarted = make_service(service.persist_directory)
+    assert restarted.collection_base == "knowledge_base_v1"
+    assert restarted.collection.count() == service.collection.count() == 2
+    assert asyncio.run(IndexingService(restarted).index_directory(str(data_dir)))["embedded_chunks"] == 0
+
+
+def test_searches_use_the_live_generation_and_writes_are_carried_over(service, data_dir):
+    throttle = GatedThrottle(service)
+
+    async def run():
+        rebuild = asyncio.ensure_future(Reindexer(service, gc_delay=0).rebuild(str(data_dir), throttle=throttle))
+        await throttle.waiting.wait()
+
+        during = await service.query("shell commands for hooks")
+        await service.sync_source(NEW_PAGE, ["The statusline command shows the model."], [{"source": NEW_PAGE}])
+        await service.delete_by_source(PAGE)
+
+        throttle.gate.set()
+        return during, await rebuild
+
+    during, result = asyncio.run(run())
+    assert any("Hooks" in r["text"] for r in during)
+    assert result["status"] == "completed" and result["replayed_sources"] == 2
+    assert any("statusline" in text for text in texts(service, "statusline command"))
+    assert service.collection.get(where={"source": PAGE})["ids"] == []
+    assert [source for source in service.lexical_index.sources() if source.startswith("http")] == [NEW_PAGE]
+
+
+def test_throttle_yields_to_searches_and_keeps_its_duty_cycle():
+    searches = SimpleNamespace(searches_in_flight=1)
+    throttle = RebuildThrottle(searches, duty_cycle=0.5, max_pause=0.05)
+
+    async def run():
+        async with throttle.batch():
+            await asyncio.sleep(0.02)
+        searches.searches_in_flight = 0
+        started = time.perf_counter()
+        async with throttle.batch():
+            pass
+        return time.perf_counter() - started
+
+    # The first batch waited out max_pause, the second as long as the first one ran
+    assert asyncio.run(run()) >= 0.015
+    assert throttle.paused_seconds >= 0.065
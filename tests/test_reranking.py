@@ -0,0 +1,67 @@
+import asyncio
+
+from app import config
+from app.services.reranking import (
+    Reranker,
+    VersionBoostReranker,
+    create_reranker,
+    plan_candidate_depth,
+    rerank_window,
+)
+
+
+def candidates(*scores):
+    return [{"id": str(i), "text": f"chunk {i}", "score": s} for i, s in enumerate(scores)]
+
+
+def test_version_boost_moves_exact_matches_first():
+    results = [
+        {"id": "a", "text": "## 1.0.22", "score": 0.9},
+        {"id": "b", "text": "## 1.0.23", "score": 0.5},
+    ]
+    reranked = VersionBoostReranker().rerank("what changed in 1.0.23", results)
+    assert [r["id"] for r in reranked] == ["b", "a"]
+
+
+def test_depth_shrinks_to_what_the_reranker_can_afford():
+    slow = Reranker(initial_seconds_per_candidate=0.01)
+    # 100ms budget, 20ms spent retrieving: 8 candidates affordable, but never below MIN_CANDIDATES
+    assert plan_candidate_depth(3, 0.1, 0.02, slow, collection_size=10_000) == 10
+    assert plan_candidate_depth(3, 1.0, 0.0, slow, collection_size=10_000) == 50
+
+
+def test_depth_is_capped_by_collection_size():
+    assert plan_candidate_depth(3, 0.3, 0.0, Reranker(), collection_size=7) == 7
+
+
+def test_window_is_small_when_scores_are_spread():
+    spread = candidates(1.0, 0.9, 0.8, 0.3, 0.2, 0.1)
+    flat = candidates(1.0, 0.99, 0.98, 0.97, 0.96, 0.95)
+    assert rerank_window(spread, n_results=3) == 3
+    assert rerank_window(flat, n_results=3) == 6
+
+
+def test_version_boost_still_runs_when_retrieval_overruns_the_budget(service, monkeypatch):
+    monkeypatch.setattr(config, "HYBRID_SEARCH", False)
+    service.reranker = VersionBoostReranker()
+    filler = [f"What changed in the hooks release {i}? The hooks changed." for i in range(8)]
+    target = "## 1.2.3\n- Fixed a crash in the statusline"
+    asyncio.run(service.embed_and_store(filler + [target], [{"source": "changelog"}] * 9))
+
+    question = "What changed in hooks 1.2.3?"
+    # The first search measures the reranker's cost
+    assert asyncio.run(service.search(question, n_results=3))["results"][0]["text"] == target
+    assert service.reranker.seconds_per_candidate > 0
+
+    outcome = asyncio.run(service.search(question, n_results=3, budget_ms=0.01))
+    assert outcome["results"][0]["text"] == target
+    assert outcome["reranked"] == outcome["candidates"]
+
+
+def test_unknown_reranker_is_rejected():
+    try:
+        create_reranker("bogus")
+    except ValueError as e:
+        assert "bogus" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
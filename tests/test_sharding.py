@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from app.services.indexing_service import IndexingService
+from app.services.sharding import collection_name, shard_key
+
+DOCS = "https://docs.example.com/hooks"
+BLOG = "https://blog.example.com/launch"
+
+
+@pytest.fixture
+def service(service):
+    service.shard_by = "domain"
+    return service
+
+
+def ingest(service):
+    async def run():
+        await service.sync_source(DOCS, ["Hooks run shell commands on tool events."], [{"source": DOCS}])
+        await service.sync_source(BLOG, ["We launched hooks for every plan today."], [{"source": BLOG}])
+        await service.embed_and_store(["Changelog: hooks gained a timeout setting."], [{"source": "data/changelog.md"}])
+
+    asyncio.run(run())
+
+
+def test_shard_keys_and_collection_names():
+    assert shard_key(DOCS, "domain") == "docs.example.com"
+    assert shard_key("data/changelog.md", "domain") == "local"
+    assert shard_key(DOCS, "source") == DOCS
+    assert shard_key(DOCS, "none") == ""
+    with pytest.raises(ValueError):
+        shard_key(DOCS, "tenant")
+
+    assert collection_name("", base="kb") == "kb"
+    name = collection_name(DOCS, base="kb")
+    assert name.startswith("kb__https-docs.example.com-hooks-")
+    assert name != collection_name(DOCS + "/", base="kb")
+
+
+def test_chunks_are_routed_to_their_shard(make_service, service):
+    ingest(service)
+
+    counts = {shard["key"]: shard["count"] for shard in asyncio.run(service.list_shards())}
+    assert counts == {"": 0, "blog.example.com": 1, "docs.example.com": 1, "local": 1}
+
+    # Shards are found again by a new service over the same directory
+    reopened = make_service(service.persist_directory)
+    assert set(reopened.shards) == set(counts)
+
+
+def test_queries_fan_out_unless_scoped(service):
+    ingest(service)
+
+    everywhere = asyncio.run(service.query("hooks", n_results=5))
+    assert len(everywhere) == 3
+
+    scoped = asyncio.run(service.query("hooks", n_results=5, shard="docs.example.com"))
+    assert [r["text"] for r in scoped] == ["Hooks run shell commands on tool events."]
+    assert asyncio.run(service.query("hooks", shard="missing.example.com")) == []
+
+
+def test_resetting_one_shard_leaves_the_others(service):
+    ingest(service)
+
+    assert asyncio.run(service.reset_database("blog.example.com")) is True
+    assert asyncio.run(service.reset_database("blog.example.com")) is False
+
+    texts = {r["text"] for r in asyncio.run(service.query("hooks launched", n_results=5))}
+    assert texts == {"Hooks run shell commands on tool events.", "Changelog: hooks gained a timeout setting."}
+    assert service.lexical_index.search("launched") == []
+
+
+def test_documents_page_across_shards(service):
+    ingest(service)
+
+    first = asyncio.run(service.get_documents(limit=2))
+    second = asyncio.run(service.get_documents(limit=2, offset=first["next_offset"]))
+    ids = [item["id"] for item in first["items"] + second["items"]]
+    assert len(ids) == len(set(ids)) == 3
+    assert second["next_offset"] is None
+
+
+class CountingCollection:
+    """Wraps a collection, recording the offsets it is read from."""
+
+    def __init__(self, collection, reads):
+        self.collection = collection
+        self.reads = reads
+
+    def count(self):
+        self.reads.append("count")
+        return self.collection.count()
+
+    def get(self, **kwargs):
+        self.reads.append(kwargs["offset"])
+        return self.collection.get(**kwargs)
+
+
+def test_iterating_documents_keeps_its_place_in_each_shard(service):
+    ingest(service)
+    asyncio.run(service.embed_and_store([f"Release note {i}" for i in range(4)], [{"source": "data/notes.md"}] * 4))
+    expected = [item["id"] for item in asyncio.run(service.get_documents(limit=100))["items"]]
+
+    reads = []
+    service._shards = {key: CountingCollection(c, reads) for key, c in service.shards.items()}
+
+    async def collect(offset):
+        return [item["id"] async for item in service.iter_documents(page_size=2, offset=offset)]
+
+    assert asyncio.run(collect(0)) == expected
+    # Each shard is read from where the previous page stopped, without counting any
+    assert reads == [0, 0, 0, 0, 2, 4]
+
+    reads.clear()
+    assert asyncio.run(collect(3)) == expected[3:]
+    assert reads == ["count"] * 4 + [1, 3, 5]
+
+
+def test_reset_shard_invalidates_manifest_of_its_files(service, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "notes.txt").write_text("Hooks can block tool calls.")
+    indexing = IndexingService(service, manifest_path=str(tmp_path / "manifest.json"))
+
+    asyncio.run(indexing.index_directory(str(data_dir)))
+    asyncio.run(service.reset_database("local"))
+    summary = asyncio.run(indexing.index_directory(str(data_dir)))
+
+    assert summary["embedded_chunks"] == 1
+    assert service.shard("local").count() == 1
+
+
+def test_manifest_checks_do_not_create_shards(service, tmp_path):
+    service.shard_by = "source"
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.md").write_text("# A\nalpha section")
+    (data_dir / "b.md").write_text("# B\nbeta section")
+    indexing = IndexingService(service, manifest_path=str(tmp_path / "manifest.json"))
+    asyncio.run(indexing.index_directory(str(data_dir)))
+
+    # b.md's shard is dropped and the file deleted: nothing should bring the shard back
+    asyncio.run(service.reset_database(str(data_dir / "b.md")))
+    (data_dir / "b.md").unlink()
+    summary = asyncio.run(indexing.index_directory(str(data_dir)))
+
+    # b.md's entry went with its shard, so the file isn't reported as removed either
+    assert (summary["unchanged"], summary["removed"]) == ([str(data_dir / "a.md")], [])
+    assert [s["key"] for s in asyncio.run(service.list_shards())] == ["", str(data_dir / "a.md")]
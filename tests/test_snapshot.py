@@ -0,0 +1,123 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app import config
+from app.services.rag_service import RAGService
+from app.services.snapshot import (
+    HEADER_SIZE,
+    SnapshotError,
+    export_snapshot,
+    import_snapshot,
+    open_embeddings,
+    read_header,
+    verify_snapshot,
+)
+from app.testing import FakeEmbeddingFunction
+
+CHUNKS = [
+    "## 1.0.5\n- Hooks can block tool calls",
+    "## 1.0.6\n- Added the statusline command",
+    "Crawled page about MCP servers",
+]
+METADATAS = [{"source": "data/changelog.md"}, {"source": "data/changelog.md"}, {"source": "https://docs.example.com/mcp"}]
+
+
+class NoModelEmbeddingFunction(FakeEmbeddingFunction):
+    """Fails if anything tries to embed text."""
+
+    def __call__(self, input):
+        raise AssertionError("the embedding model must not be called")
+
+
+@pytest.fixture
+def snapshot(make_service, tmp_path):
+    source = make_service(tmp_path / "source")
+    source.shard_by = "domain"
+    asyncio.run(source.embed_and_store(CHUNKS, METADATAS))
+    path = str(tmp_path / "kb.snap")
+    asyncio.run(export_snapshot(source, path))
+    return source, path
+
+
+def test_export_writes_header_and_float16_embeddings(snapshot):
+    source, path = snapshot
+    header = read_header(path)
+
+    assert (header["count"], header["dimension"], header["dtype"]) == (3, 64, "float16")
+    assert header["records_offset"] == HEADER_SIZE + 3 * 64 * 2
+    embeddings = open_embeddings(path, header)
+    assert embeddings.dtype == np.float16 and embeddings.shape == (3, 64)
+
+
+def test_import_restores_search_without_embedding_chunks(make_service, snapshot, tmp_path):
+    _, path = snapshot
+    replica = make_service(tmp_path / "replica", NoModelEmbeddingFunction())
+    replica.shard_by = "domain"
+
+    assert asyncio.run(import_snapshot(replica, path))["imported"] == 3
+    assert {s["key"]: s["count"] for s in asyncio.run(replica.list_shards())} == {
+        "": 0, "docs.example.com": 1, "local": 2,
+    }
+    report = asyncio.run(verify_snapshot(replica, path))
+    assert report["ok"], report
+    assert report["max_embedding_error"] < 1e-2
+
+    # Keyword search works straight away; vector search needs only the query embedded
+    assert [cid for cid, _, _ in replica.lexical_index.search("statusline")]
+
+
+def test_import_does_not_load_the_embedding_model(snapshot, stub, tmp_path, monkeypatch):
+    from chromadb.utils import embedding_functions
+    from chromadb.utils.embedding_functions.sentence_transformer_embedding_function import (
+        SentenceTransformerEmbeddingFunction,
+    )
+
+    loaded = []
+
+    def load_model(model_name):
+        loaded.append(model_name)
+        return FakeEmbeddingFunction()
+
+    monkeypatch.setattr(embedding_functions, "SentenceTransformerEmbeddingFunction", load_model)
+    # Chroma also builds the function from its config when it opens a collection
+    monkeypatch.setattr(
+        SentenceTransformerEmbeddingFunction, "__init__", lambda self, model_name, **kwargs: load_model(model_name)
+    )
+    monkeypatch.setattr(config, "NEAR_DUP_FILTER", True)
+    monkeypatch.setattr(config, "NEAR_DUP_MIN_WORDS", 1)
+    _, path = snapshot
+    replica = RAGService(persist_directory=str(tmp_path / "replica"), openai_client=stub.client)
+
+    assert asyncio.run(import_snapshot(replica, path))["imported"] == 3
+    assert loaded == []
+    # The crawled page keeps its near-duplicate signature, like a copied source
+    assert replica.near_duplicates.count() == 1
+
+    # The model is loaded once something needs to embed text
+    assert asyncio.run(replica.query("MCP servers"))
+    assert loaded == [replica.model_name]
+
+
+def test_verify_reports_differences_and_damage(snapshot, tmp_path):
+    source, path = snapshot
+    asyncio.run(source.embed_and_store(["A chunk added after the export"], [{"source": "data/notes.md"}]))
+    asyncio.run(source.delete_ids([asyncio.run(source.get_documents(limit=1))["items"][0]["id"]]))
+
+    report = asyncio.run(verify_snapshot(source, path))
+    assert (report["ok"], report["missing"], report["extra"]) == (False, 1, 1)
+
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + 10)
+        f.write(b"\xff")
+    assert asyncio.run(verify_snapshot(source, path))["intact"] is False
+
+
+def test_import_rejects_other_embedding_model(make_service, snapshot, tmp_path):
+    _, path = snapshot
+    replica = make_service(tmp_path / "replica")
+    replica.model_name = "another-model"
+
+    with pytest.raises(SnapshotError):
+        asyncio.run(import_snapshot(replica, path))
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from app.services.rag_service import RAGService
+from app.testing import FakeEmbeddingFunction, StubOpenAI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_modules_after(statement: str, **env) -> list:
+    probe = (
+        f"import sys; {statement}; import json; "
+        "print(json.dumps([m for m in ('torch', 'sentence_transformers', 'chromadb', 'openai', 'gradio') if m in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_importing_the_app_loads_no_models():
+    assert imported_modules_after("import app.main", ENABLE_GRADIO="false") == []
+
+
+def test_gradio_is_only_imported_when_enabled():
+    assert imported_modules_after("import app.main", ENABLE_GRADIO="true") == ["gradio"]
+
+
+def test_warmup_makes_service_ready(service):
+    assert service.readiness()["ready"] is False
+
+    seconds = asyncio.run(service.warmup())
+    status = service.readiness()
+    assert status["ready"] is True
+    assert status["warmup_seconds"] == seconds
+
+
+def test_first_search_without_warmup_loads_the_model_off_the_event_loop(tmp_path, monkeypatch):
+    from chromadb.utils import embedding_functions
+
+    loaded_on = []
+
+    def load_model(model_name):
+        loaded_on.append(threading.current_thread())
+        return FakeEmbeddingFunction()
+
+    monkeypatch.setattr(embedding_functions, "SentenceTransformerEmbeddingFunction", load_model)
+    service = RAGService(persist_directory=str(tmp_path), openai_client=StubOpenAI().client)
+
+    asyncio.run(service.query("anything"))
+    assert len(loaded_on) == 1 and loaded_on[0] is not threading.main_thread()
+    assert service.readiness()["ready"] is True